@@ -65,14 +65,27 @@
 #### Fixed Inferencing Time ####
 import torch
 import re
+import asyncio
+import queue
+import sys
+import threading
 from fastapi import FastAPI, Request
-from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteria, StoppingCriteriaList
+from fastapi.responses import StreamingResponse
+from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
 from peft import PeftModel
 import uvicorn
+import time
+from pathlib import Path
+
+# tracing.py lives at the repo root (one copy for the orchestrator and every service)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from tracing import Tracer, current_trace_id
 
 BASE_MODEL_ID = "microsoft/phi-2"
 # TUNED_MODEL_PATH = "models/phi2_retail_native_bf16_c6e0c0"
 TUNED_MODEL_PATH = "models/phi2_retail_native_bf16_38f4a5"
+# Relative to this file, so the service also loads in-process (orchestrator monolith mode)
+TUNED_MODEL_PATH = str(Path(__file__).resolve().parent / TUNED_MODEL_PATH)
 
 # -----------------------------
 # Stopper: stop at <END_OF_RESPONSE>
@@ -93,6 +106,26 @@ class StopOnTokens(StoppingCriteria):
         return input_ids[0, -n:].tolist() == self.stop_ids
 
 
+class FirstTokenTimer(StoppingCriteria):
+    """Never stops; notes when the first new token exists (end of prefill)."""
+    def __init__(self):
+        self.first_token_at = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> bool:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        return False
+
+
+class CancelOnEvent(StoppingCriteria):
+    """Stops generation as soon as the event is set (barge-in / client went away)."""
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> bool:
+        return self.event.is_set()
+
+
 # -----------------------------
 # Model load
 # -----------------------------
@@ -145,33 +178,121 @@ SYSTEM_PROMPT = (
 )
 
 app = FastAPI()
+TRACER = Tracer("LLM")
+TRACER.install(app)
 
-@app.post("/chat")
-async def chat(request: Request):
-    data = await request.json()
-    context = data.get("context", "N/A")
-    query = data.get("query", "")
 
-    prompt = (
+@app.get("/ready")
+def ready():
+    # Models load at import time, before uvicorn binds the port: answering means warm
+    return {"service": "LLM", "ready": True}
+
+# One GPU, one model: generations (blocking /chat and streamed /chat_stream) take turns.
+GENERATE_LOCK = threading.Lock()
+# Longest a streamed reply may go without a new piece (includes waiting for GENERATE_LOCK)
+STREAM_TIMEOUT_S = 120.0
+
+# trace id -> cancel flag of generations that are queued or running (see /cancel)
+ACTIVE_GENERATIONS: dict[str, threading.Event] = {}
+
+
+def register_generation(trace_id) -> threading.Event:
+    event = threading.Event()
+    if trace_id:
+        ACTIVE_GENERATIONS[trace_id] = event
+    return event
+
+
+def release_generation(trace_id, event: threading.Event):
+    if trace_id and ACTIVE_GENERATIONS.get(trace_id) is event:
+        del ACTIVE_GENERATIONS[trace_id]
+
+
+def build_prompt(context: str, query: str) -> str:
+    return (
         f"### Instruction:\n{SYSTEM_PROMPT}\n\n"
         f"### Context:\n{context}\n\n"
         f"### User Query:\n{query}\n\n"
         f"### Response:\n"
     )
 
-    inputs = tokenizer(prompt, return_tensors="pt")
-    inputs = {k: v.to(model.device) for k, v in inputs.items()}
 
-    with torch.inference_mode():
-        outputs = model.generate(
-            **inputs,
-            max_new_tokens=256,                 # safe ceiling; should stop early now
-            do_sample=False,
-            pad_token_id=tokenizer.eos_token_id,
-            eos_token_id=tokenizer.eos_token_id,
-            stopping_criteria=STOPPING,
-            repetition_penalty=1.05,            # mild anti-looping (optional)
-        )
+def generation_kwargs(prompt: str, stopping=STOPPING, **extra) -> dict:
+    with TRACER.span("tokenize"):
+        inputs = tokenizer(prompt, return_tensors="pt")
+        inputs = {k: v.to(model.device) for k, v in inputs.items()}
+    return dict(
+        **inputs,
+        max_new_tokens=256,                 # safe ceiling; should stop early now
+        do_sample=False,
+        pad_token_id=tokenizer.eos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        stopping_criteria=stopping,
+        repetition_penalty=1.05,            # mild anti-looping (optional)
+        **extra,
+    )
+
+
+def traced_generate(kwargs: dict, timer: FirstTokenTimer, trace_id=None, cancel: threading.Event = None):
+    """model.generate under the GPU lock, split into prefill / decode spans."""
+    with GENERATE_LOCK, torch.inference_mode():
+        if cancel is not None and cancel.is_set():
+            # Cancelled while waiting for the GPU: don't even prefill
+            streamer = kwargs.get("streamer")
+            if streamer is not None:
+                streamer.end()
+            TRACER.record("model.generate.skipped", 0.0, trace_id)
+            return None
+        t0 = time.perf_counter()
+        try:
+            outputs = model.generate(**kwargs)
+        except BaseException:
+            # OOM / bad input: generate never reached streamer.end(), so unblock the reader
+            streamer = kwargs.get("streamer")
+            if streamer is not None:
+                streamer.end()
+            raise
+        t1 = time.perf_counter()
+    first = timer.first_token_at or t1
+    TRACER.record("model.generate.prefill", (first - t0) * 1000.0, trace_id)
+    TRACER.record("model.generate.decode", (t1 - first) * 1000.0, trace_id)
+    TRACER.record("model.generate", (t1 - t0) * 1000.0, trace_id)
+    if cancel is not None and cancel.is_set():
+        TRACER.record("model.generate.cancelled", (t1 - t0) * 1000.0, trace_id)
+    return outputs
+
+
+def _next_piece(streamer, trace_id=None):
+    """Next streamed piece, None at the end; a stalled generation surfaces as TimeoutError."""
+    try:
+        return next(streamer, None)
+    except queue.Empty:
+        TRACER.record("model.generate.stalled", STREAM_TIMEOUT_S * 1000.0, trace_id)
+        raise TimeoutError(f"no tokens from model.generate for {STREAM_TIMEOUT_S:.0f}s") from None
+
+
+def _split_stop_prefix(text: str) -> tuple[str, str]:
+    """Split off a trailing partial "<END_OF_RESPONSE>" so it is never streamed out."""
+    for k in range(min(len(STOP_STR) - 1, len(text)), 0, -1):
+        if STOP_STR.startswith(text[-k:]):
+            return text[:-k], text[-k:]
+    return text, ""
+
+
+async def generate_reply(context: str, query: str, trace_id=None) -> dict:
+    """Full (non-streamed) reply: {"response": ...}. Used by /chat and in-process callers."""
+    prompt = build_prompt(context, query)
+    cancel = register_generation(trace_id)
+    timer = FirstTokenTimer()
+    kwargs = generation_kwargs(prompt, stopping=StoppingCriteriaList([*STOPPING, timer, CancelOnEvent(cancel)]))
+
+    # Off the event loop so a streamed response can keep flushing meanwhile
+    try:
+        outputs = await asyncio.to_thread(traced_generate, kwargs, timer, trace_id, cancel)
+    finally:
+        release_generation(trace_id, cancel)
+    if cancel.is_set():
+        return {"response": "", "cancelled": True}
 
     raw_output = tokenizer.decode(outputs[0], skip_special_tokens=False)
 
@@ -183,5 +304,95 @@ async def chat(request: Request):
 
     return {"response": response_text}
 
+
+def stream_reply(context: str, query: str, trace_id=None):
+    """
+    Start generating and return an async iterator over the reply text.
+    Closing the iterator early (client gone, barge-in) stops model.generate.
+    """
+    cancel = register_generation(trace_id)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=False, timeout=STREAM_TIMEOUT_S)
+    timer = FirstTokenTimer()
+    kwargs = generation_kwargs(
+        build_prompt(context, query),
+        stopping=StoppingCriteriaList([*STOPPING, timer, CancelOnEvent(cancel)]),
+        streamer=streamer,
+    )
+
+    threading.Thread(target=traced_generate, args=(kwargs, timer, trace_id, cancel), daemon=True).start()
+
+    async def token_stream():
+        # Pull from the streamer off-loop so a disconnect (orchestrator barge-in)
+        # lands here as cancellation and the finally below stops model.generate.
+        held = ""
+        started = False
+        finished = False
+        try:
+            while (piece := await asyncio.to_thread(_next_piece, streamer, trace_id)) is not None:
+                if cancel.is_set():
+                    return
+                held += piece
+                if STOP_STR in held:
+                    out = held.split(STOP_STR, 1)[0]
+                    if not started:
+                        out = out.lstrip()
+                    if out:
+                        yield out
+                    finished = True
+                    return
+                out, held = _split_stop_prefix(held)
+                if not started:
+                    out = out.lstrip()
+                if out:
+                    started = True
+                    yield out
+            held = re.sub(r"<END_OF_RESPONSE.*", "", held, flags=re.DOTALL)
+            if held.strip() and not cancel.is_set():
+                yield held.rstrip()
+            finished = True
+        finally:
+            if not finished:
+                # Stop decoding once nobody is listening (also frees GENERATE_LOCK sooner)
+                cancel.set()
+            release_generation(trace_id, cancel)
+
+    return token_stream()
+
+
+def cancel_by_trace(trace_id) -> bool:
+    """Barge-in: stop the generation started for `trace_id` (queued or mid-decode)."""
+    event = ACTIVE_GENERATIONS.get(trace_id)
+    if event is None:
+        return False
+    event.set()
+    print(f"Cancelled generation {trace_id}")
+    return True
+
+
+@app.post("/chat")
+async def chat(request: Request):
+    data = await request.json()
+    context = data.get("context", "N/A")
+    query = data.get("query", "")
+    return await generate_reply(context, query, current_trace_id())
+
+
+@app.post("/chat_stream")
+async def chat_stream(request: Request):
+    """
+    Same prompt/decoding as /chat, but response text is streamed (text/plain)
+    as tokens are decoded so the orchestrator can hand finished sentences to
+    TTS while Phi-2 is still generating.
+    """
+    data = await request.json()
+    context = data.get("context", "N/A")
+    query = data.get("query", "")
+    return StreamingResponse(stream_reply(context, query, current_trace_id()), media_type="text/plain")
+
+@app.post("/cancel")
+async def cancel_generation(request: Request):
+    data = await request.json()
+    return {"status": "cancelled" if cancel_by_trace(data.get("trace_id")) else "not_found"}
+
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8001)
@@ -1,49 +1,281 @@
 import chromadb
+import hashlib
+import json
 import numpy as np
+import threading
 import time
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.core import VectorStoreIndex, StorageContext, Settings
-from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.core.retrievers import VectorIndexRetriever
-from sentence_transformers import CrossEncoder
-from langchain_community.retrievers import BM25Retriever
-from langchain.schema import Document
+import torch
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from sentence_transformers import CrossEncoder, SentenceTransformer
+from bm25_index import open_for_collection
+from asin_finder import ASINFinder
+from micro_batch import MicroBatcher
+from catalog_docs import PRODUCT_PREFIX
+import exact_index
+import passage_tokens
+from passage_tokens import PassageTokenCache
+
+# Largest collection served by exact search; above it the HNSW retriever is used
+EXACT_SEARCH_MAX = exact_index.EXACT_SEARCH_MAX
+
+EMBED_MODEL = "BAAI/bge-small-en-v1.5"
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L6-v2"
+# What llama-index's HuggingFaceEmbedding prepended to bge queries; queries are now encoded
+# without it (embed_query), query_instruction_check.py measures the difference
+BGE_QUERY_INSTRUCTION = "Represent this question for searching relevant passages: "
+
+# Documents query() hands back per intent (see _select); sizes the rerank budget
+RETURN_COUNTS = {"product": 5, "retail_qna": 1}
+
+# Rerank budget settings written by experiment_metric/reranker_metric/rerank_budget_eval.py
+RERANK_BUDGET_PATH = Path(__file__).resolve().parent / "rerank_budget.json"
+
+
+def load_rerank_budget(path=RERANK_BUDGET_PATH):
+    """
+    Budget settings from the last parity run ({"per_result", "min", "max", ...}),
+    or None when there is none, it found no setting at parity with the full
+    rerank, or it was run with other models than the ones loaded here.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            settings = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not settings.get("enabled") or settings.get("models") != {"embed": EMBED_MODEL, "rerank": RERANK_MODEL}:
+        return None
+    return settings
 
 class DatabaseRouting:
-    def __init__(self, db_path="db", verbose=False, use_length_sorting=True):
-        self.db_client = chromadb.PersistentClient(path=db_path)
+    def __init__(self, db_path="db", verbose=False, use_length_sorting=True, tracer=None, bm25_path=None,
+                 token_cache_path=None, exact_search_max=EXACT_SEARCH_MAX, exact_index_path=None,
+                 rerank_budget=None, rrf_k=None, rerank_per_result=None, rerank_min=None, rerank_max=None,
+                 rerank_margin_ref=None, startup=None, micro_batch_ms=0.0, micro_batch_max_pairs=160,
+                 semantic_cache=None):
+        self.db_path = db_path
+        # Persisted BM25 postings, one folder per collection (next to the Chroma db by default)
+        self.bm25_path = bm25_path or str(Path(db_path).parent / "bm25_index")
+        # Cross-encoder token ids of every passage, one folder per collection
+        self.token_cache_path = token_cache_path or str(Path(db_path).parent / "rerank_tokens")
+        # Collections up to this size are searched exactly from an mmap'd matrix instead of
+        # llama-index + Chroma HNSW (crossover: experiment_metric/vector_search_metric)
+        self.exact_search_max = exact_search_max
+        self.exact_index_path = exact_index_path or str(Path(db_path).parent / "exact_index")
         self.verbose = verbose
         self.use_length_sorting = use_length_sorting    
-
-        self.product_prefix = "Product information for users looking for or interested in "
-        
-        # Define Embedding model
-        self.embed_model = HuggingFaceEmbedding(model_name="BAAI/bge-small-en-v1.5")
-        Settings.embed_model = self.embed_model
-        Settings.llm = None
+        self.tracer = tracer  # tracing.Tracer; records per-stage spans when set
+        self.startup = startup  # startup.StartupReport; records boot phases when set
+
+        # Reciprocal rank fusion of the dense + BM25 lists, then only the top-K fused
+        # candidates go to the cross-encoder (rerank_budget=False: all of them). By default
+        # the budget is on only with settings rerank_budget_eval.py found at parity with the
+        # full rerank (rerank_budget.json); explicit arguments override them
+        tuned = load_rerank_budget() or {}
+        pick = lambda value, key, default: value if value is not None else tuned.get(key, default)
+        self.rerank_budget = rerank_budget if rerank_budget is not None else bool(tuned)
+        self.rrf_k = pick(rrf_k, "rrf_k", 60)
+        self.rerank_per_result = pick(rerank_per_result, "per_result", 6)
+        self.rerank_min = pick(rerank_min, "min", 8)
+        self.rerank_max = pick(rerank_max, "max", 40)
+        self.rerank_margin_ref = pick(rerank_margin_ref, "margin_ref", 0.5)
+        if self.rerank_budget:
+            self._log(f"Rerank budget on: per_result={self.rerank_per_result} min={self.rerank_min} "
+                      f"max={self.rerank_max} ({'rerank_budget.json' if tuned else 'arguments'})")
+
+        self.product_prefix = PRODUCT_PREFIX
+
+        # semantic_cache.SemanticCache: paraphrases of a recent query (same collection) get
+        # its reranked results back without retrieval or the cross-encoder
+        self.semantic_cache = semantic_cache
         
-        self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L6-v2')
+        # The two models are independent: load them on parallel threads while this
+        # one opens the Chroma store. The encoder is shared with the semantic router.
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="rag-load") as pool:
+            encoder = pool.submit(self._load_encoder)
+            reranker = pool.submit(self._load_reranker)
+            with self._phase("chromadb.PersistentClient"):
+                self.db_client = chromadb.PersistentClient(path=db_path)
+            self.encoder = encoder.result()
+            self.reranker = reranker.result()
+        self.rerank_batch_size = 20
+        # Inputs are assembled from cached passage ids only for BERT-style pair templates
+        self.pretokenize = passage_tokens.supports(self.reranker.tokenizer)
+        # Cumulative padding accounting for reranker batches (see rerank_stats)
+        self._rerank_stats = {"queries": 0, "pairs": 0, "batches": 0, "real_tokens": 0, "padded_tokens": 0}
+        self._rerank_stats_lock = threading.Lock()
+
+        # Concurrent requests (FastAPI's thread pool) share encoder / cross-encoder calls:
+        # each call waits up to micro_batch_ms for others to join (0 = call the models directly)
+        self._embed_batcher = self._rerank_batcher = None
+        if micro_batch_ms > 0:
+            self._embed_batcher = MicroBatcher(self._encode, max_wait_ms=micro_batch_ms, max_items=64,
+                                               name="embed-batch")
+            self._rerank_batcher = MicroBatcher(self._rerank_jobs, max_wait_ms=micro_batch_ms,
+                                                max_items=micro_batch_max_pairs, name="rerank-batch",
+                                                size_of=lambda job: len(job[1]))
+
+        # Retriever registry: collection + llama-index retriever built once per
+        # collection, dropped when the Chroma store changes on disk
+        self._registry = {}
+        self._registry_lock = threading.Lock()
+        self._store_sig = self._store_signature()
+        self.warm_registry()
 
     def _log(self, message):
         if self.verbose:
             print(f"[VERBOSE] {message}")
 
+    def _span(self, stage):
+        return self.tracer.span(stage) if self.tracer else nullcontext()
+
+    def _phase(self, name):
+        return self.startup.phase(name) if self.startup else nullcontext()
+
+    # --- Models ---
+    def _load_encoder(self):
+        with self._phase(f"load {EMBED_MODEL}"):
+            return SentenceTransformer(EMBED_MODEL)
+
+    def _load_reranker(self):
+        with self._phase(f"load {RERANK_MODEL}"):
+            reranker = CrossEncoder(RERANK_MODEL)
+            reranker.model.eval()
+            return reranker
+
+    def _llama_retriever(self, collection):
+        """
+        llama-index retriever over Chroma's HNSW, only for collections above
+        exact_search_max; llama-index is imported the first time one is needed.
+        """
+        from llama_index.core import VectorStoreIndex, StorageContext
+        from llama_index.core.embeddings import BaseEmbedding
+        from llama_index.core.retrievers import VectorIndexRetriever
+        from llama_index.vector_stores.chroma import ChromaVectorStore
+
+        encode = self._encode
+
+        class SharedEncoderEmbedding(BaseEmbedding):
+            # The already-loaded bge-small, encoding queries exactly like embed_query, so
+            # llama-index needs no model of its own (_get_vector_results passes the embedding anyway)
+            def _get_query_embedding(self, query):
+                return encode([query])[0].tolist()
+
+            async def _aget_query_embedding(self, query):
+                return self._get_query_embedding(query)
+
+            def _get_text_embedding(self, text):
+                return encode([text])[0].tolist()
+
+        vector_store = ChromaVectorStore(chroma_collection=collection)
+        storage_context = StorageContext.from_defaults(vector_store=vector_store)
+        index = VectorStoreIndex.from_vector_store(vector_store, storage_context=storage_context,
+                                                   embed_model=SharedEncoderEmbedding(model_name=EMBED_MODEL))
+        return VectorIndexRetriever(index=index, similarity_top_k=50)
+
+    # --- Retriever registry ---
+    def _store_signature(self):
+        """Chroma write-log position + collection ids (exact_index.store_signature); one read-only sqlite query."""
+        return exact_index.store_signature(self.db_path)
+
+    def _build_handle(self, name):
+        with self._span("retriever_registry.build"):
+            collection = self.db_client.get_collection(name)
+            count = collection.count()
+            retriever = exact = None
+            if count <= self.exact_search_max:
+                # Snapshot is reused across restarts and worker processes until the store is written
+                exact = exact_index.open_for_collection(self.exact_index_path, collection, self._store_sig,
+                                                        verbose=self.verbose)
+            else:
+                retriever = self._llama_retriever(collection)
+        with self._span("bm25_index.open"):
+            # Loads (or builds / id-syncs) the on-disk index instead of re-tokenizing per query
+            bm25 = open_for_collection(self.bm25_path, collection)
+        data = collection.get(include=["documents", "metadatas"])
+        with self._span("asin_index.build"):
+            # ASIN -> raw + preformatted product text: exit lookups and carousel formatting are dict hits
+            asins = ASINFinder.from_documents(data["documents"], data["metadatas"], formatter=self._format_product_text)
+        tokens = None
+        if self.pretokenize:
+            with self._span("rerank_tokens.warm"):
+                tokens = PassageTokenCache(self.reranker.tokenizer, Path(self.token_cache_path) / name,
+                                           max_length=self.reranker.max_length)
+                tokens.warm(data["documents"])
+        self._log(f"Registry: built {'exact' if exact is not None else 'HNSW'} retriever for '{name}' ({count} docs)")
+        return {"collection": collection, "retriever": retriever, "exact": exact, "bm25": bm25, "tokens": tokens,
+                "asins": asins}
+
+    def warm_registry(self, names=None):
+        """Build handles for every collection (or `names`) up front, at startup."""
+        names = names or [c.name for c in self.db_client.list_collections()]
+        for name in names:
+            with self._phase(f"registry: {name}"):
+                self._get_handle(name)
+
+    def _get_handle(self, name):
+        """Cached {"collection", "retriever" | "exact", "bm25", "tokens", "asins"} for a collection, or None if it doesn't exist."""
+        sig = self._store_signature()
+        with self._registry_lock:
+            if sig != self._store_sig:
+                self._log("Registry: Chroma store changed on disk, rebuilding retrievers")
+                self._registry.clear()
+                self._store_sig = sig
+            handle = self._registry.get(name)
+            if handle is None:
+                try:
+                    handle = self._registry[name] = self._build_handle(name)
+                except Exception as e:
+                    self._log(f"Registry: no collection '{name}': {e}")
+                    return None
+        return handle
+
+    def collection_version(self) -> str:
+        """
+        Short fingerprint of the Chroma store: per-collection document counts
+        plus the store signature (write-log position), which moves on every
+        add/update/delete. Callers cache answers under it so re-ingestion
+        invalidates them; it is the same in every worker and across restarts.
+        """
+        parts = []
+        for col in sorted(self.db_client.list_collections(), key=lambda c: c.name):
+            parts.append(f"{col.name}:{col.count()}")
+        parts.extend(str(m) for m in self._store_signature())
+        return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:12]
+
     # --- NEW: Direct ASIN Lookup (Replaces product.json) ---
     def get_product_by_asin(self, asin: str) -> str:
         """Fetch specific product content by ASIN for Gesture Exit context."""
         try:
-            collection = self.db_client.get_collection("product")
-            # Query metadata for exact ASIN match
-            result = collection.get(where={"asins": asin}, limit=1)
-            
-            if result["documents"] and len(result["documents"]) > 0:
-                return result["documents"][0]
-            
-            return "Product details not found."
+            handle = self._get_handle("product")
+            if handle is None:
+                return "Product details not found."
+            # O(1) hit in the ASIN index built with the handle (refreshed when the store changes)
+            return handle["asins"].get_content_by_asin(asin)
         except Exception as e:
             self._log(f"Error fetching ASIN {asin}: {e}")
             return "Product details not found."
 
+    def embed_query(self, text: str) -> np.ndarray:
+        """
+        The one query embedding per request (L2-normalized, no BGE query instruction):
+        fed to ClusterSemanticRouter.route and to the Chroma vector search.
+        """
+        with self._span("embed_query"):
+            if self._embed_batcher is not None:
+                return self._embed_batcher.submit(text)
+            return self._encode([text])[0]
+
+    def embed_queries(self, texts) -> np.ndarray:
+        """embed_query for many texts in one encoder call: (n, dim)."""
+        with self._span("embed_queries"):
+            return self._encode(list(texts))
+
+    def _encode(self, texts) -> np.ndarray:
+        return self.encoder.encode(texts, convert_to_numpy=True, normalize_embeddings=True,
+                                   show_progress_bar=False)
+
     def _strip_product_prefix(self, text: str) -> str:
         if text.startswith(self.product_prefix):
             return text[len(self.product_prefix):].strip()
@@ -60,29 +292,33 @@ class DatabaseRouting:
             return first + rest[len(expected_prefix):]
         return s
 
+    def _format_product_text(self, text: str, strip_prefix: bool = True) -> str:
+        if strip_prefix:
+            text = self._strip_product_prefix(text)
+        return self._dedupe_leading_name(text)
+
     def format_product_list(self, results, strip_prefix: bool = True, max_items: int = 5) -> str:
         """
         Modified to handle the new result format (list of dicts).
         """
+        handle = self._get_handle("product") if strip_prefix else None
+        asin_index = handle["asins"] if handle else None
         cleaned = []
         # results is now a list of {"content": "...", "asin": "..."}
         for item in results[:max_items]:
-            text = item["content"]
-            if strip_prefix:
-                text = self._strip_product_prefix(text)
-            text = self._dedupe_leading_name(text)
+            text = asin_index.get_formatted(item["asin"], item["content"]) if asin_index else None
+            if text is None:
+                text = self._format_product_text(item["content"], strip_prefix)
             cleaned.append(text)
 
         return "\n".join(f"{i}. {doc}" for i, doc in enumerate(cleaned, start=1))
 
     # --- UPDATED: Return Content + Metadata ---
-    def _get_vector_results(self, collection, query):
-        vector_store = ChromaVectorStore(chroma_collection=collection)
-        storage_context = StorageContext.from_defaults(vector_store=vector_store)
-        index = VectorStoreIndex.from_vector_store(vector_store, storage_context=storage_context)
-        
-        retriever = VectorIndexRetriever(index=index, similarity_top_k=50)
-        nodes = retriever.retrieve(query)
+    def _get_vector_results(self, retriever, query, query_embedding):
+        from llama_index.core.schema import QueryBundle
+
+        # Precomputed embedding: llama-index skips its own encode of the query
+        nodes = retriever.retrieve(QueryBundle(query_str=query, embedding=query_embedding.tolist()))
         
         # Pack content AND asin into a dict
         results = []
@@ -95,61 +331,152 @@ class DatabaseRouting:
         self._log(f"Vector Retrieval: Found {len(results)} docs.")
         return results
 
-    def _get_bm25_results(self, collection, query):
-        all_docs = collection.get() # Warning: heavy if DB is huge
-        if not all_docs['documents']:
-            return []
-            
-        # Pass metadata to Document so we don't lose the ASIN
-        langchain_docs = []
-        for text, meta in zip(all_docs['documents'], all_docs['metadatas']):
-            langchain_docs.append(Document(page_content=text, metadata=meta))
+    def _get_exact_results(self, exact, query_embedding):
+        results = exact.search(query_embedding, k=50)
+        self._log(f"Vector Retrieval (exact): Found {len(results)} docs.")
+        return results
+
+    def _get_bm25_results(self, bm25, query):
+        # Same BM25Okapi scores as the old per-query BM25Retriever, from the persisted index
+        packed_results = [{"content": hit["content"], "asin": hit["asin"]} for hit in bm25.search(query, k=50)]
 
-        bm25_retriever = BM25Retriever.from_documents(documents=langchain_docs, k=50)
-        results = bm25_retriever.invoke(query)
-        
-        # Pack content AND asin
-        packed_results = []
-        for d in results:
-            packed_results.append({
-                "content": d.page_content,
-                "asin": d.metadata.get("asins", None)
-            })
-            
         self._log(f"BM25 Retrieval: Found {len(packed_results)} docs.")
         return packed_results
 
-    def query(self, user_query, database_name=None):
+    # --- Length-aware reranking ---
+    def _pair_lengths(self, queries, texts):
+        """Token count of each [CLS] query [SEP] passage [SEP] input, as the cross-encoder truncates it."""
+        encoded = self.reranker.tokenizer([[q, t] for q, t in zip(queries, texts)], truncation=True, padding=False)
+        return np.fromiter((len(ids) for ids in encoded["input_ids"]), dtype=np.int64, count=len(texts))
+
+    def _predict_pretokenized(self, tokens, pairs):
+        """CrossEncoder.predict for one batch, from token ids instead of text."""
+        batch = tokens.build_batch(pairs)
+        device = self.reranker.model.device
+        features = {k: torch.from_numpy(v).to(device) for k, v in batch.items()}
+        with torch.inference_mode():
+            logits = self.reranker.activation_fn(self.reranker.model(**features, return_dict=True).logits)
+        return logits[:, 0].float().cpu().numpy()
+
+    def _rerank(self, query, texts, tokens=None):
+        """
+        Cross-encoder logits for (query, text) pairs, in input order.
+
+        With use_length_sorting, pairs are sorted by token length before being
+        cut into batches, so each batch pads to a similar length (the PROPOSED
+        strategy from experiment_metric/reranker_metric/eval.ipynb), and the
+        scores are scattered back to the original order afterwards.
+
+        With a PassageTokenCache (`tokens`) only the query is tokenized; passage
+        ids come from the cache and the pair lengths are exact without a pass
+        through the tokenizer.
+        """
+        if self._rerank_batcher is not None:
+            return self._rerank_batcher.submit((query, texts, tokens))
+        return self._rerank_pairs([query] * len(texts), texts, [tokens] * len(texts), n_queries=1)
+
+    def _rerank_jobs(self, jobs):
+        """Logits for several (query, texts, tokens) jobs, reranked together in shared batches."""
+        queries, texts, caches = [], [], []
+        for query, job_texts, tokens in jobs:
+            queries += [query] * len(job_texts)
+            texts += list(job_texts)
+            caches += [tokens] * len(job_texts)
+        logits = self._rerank_pairs(queries, texts, caches, n_queries=len(jobs))
+        out, start = [], 0
+        for _, job_texts, _ in jobs:
+            out.append(logits[start:start + len(job_texts)])
+            start += len(job_texts)
+        return out
+
+    def _rerank_pairs(self, queries, texts, caches, n_queries):
+        """
+        _rerank over pairs that may belong to different queries / collections
+        (query_batch): every pair goes into the same length-sorted batches.
+        caches[i] is the PassageTokenCache of texts[i]'s collection (or None).
+        """
+        pretokenized = all(c is not None for c in caches)
+        if pretokenized:
+            query_ids = {}
+            for q, c in zip(queries, caches):
+                if q not in query_ids:
+                    query_ids[q] = c.query_ids(q)
+            pairs = [(query_ids[q], c.passage_ids([t])[0]) for q, t, c in zip(queries, texts, caches)]
+            lengths = caches[0].pair_lengths(pairs)
+        else:
+            lengths = self._pair_lengths(queries, texts)
+        order = np.argsort(lengths, kind="stable") if self.use_length_sorting else np.arange(len(texts))
+
+        bs = self.rerank_batch_size
+        if pretokenized:
+            # Same reranker tokenizer for every collection, so any cache can assemble a batch
+            sorted_logits = np.concatenate([
+                self._predict_pretokenized(caches[0], [pairs[i] for i in order[s:s + bs]])
+                for s in range(0, len(order), bs)
+            ])
+        else:
+            sorted_pairs = [(queries[i], texts[i]) for i in order]
+            sorted_logits = self.reranker.predict(sorted_pairs, batch_size=bs, show_progress_bar=False)
+        logits = np.empty(len(texts), dtype=np.float32)
+        logits[order] = sorted_logits
+
+        # Padding waste of the batches just run (each is padded to its longest pair)
+        ordered = lengths[order]
+        batches = [ordered[i:i + bs] for i in range(0, len(ordered), bs)]
+        real = int(ordered.sum())
+        padded = int(sum(b.max() * len(b) for b in batches))
+        with self._rerank_stats_lock:
+            st = self._rerank_stats
+            st["queries"] += n_queries
+            st["pairs"] += len(texts)
+            st["batches"] += len(batches)
+            st["real_tokens"] += real
+            st["padded_tokens"] += padded
+        self._log(f"Rerank: {len(texts)} pairs ({n_queries} queries) in {len(batches)} batches, "
+                  f"padding waste {100.0 * (padded - real) / max(padded, 1):.1f}%")
+        return logits
+
+    def rerank_stats(self) -> dict:
+        """Cumulative reranker batching / padding numbers since startup."""
+        with self._rerank_stats_lock:
+            st = dict(self._rerank_stats)
+        padded = st["padded_tokens"]
+        st["length_sorting"] = self.use_length_sorting
+        st["batch_size"] = self.rerank_batch_size
+        st["padding_waste_pct"] = round(100.0 * (padded - st["real_tokens"]) / padded, 2) if padded else 0.0
+        st["avg_padded_len"] = round(padded / st["pairs"], 1) if st["pairs"] else 0.0
+        st["avg_real_len"] = round(st["real_tokens"] / st["pairs"], 1) if st["pairs"] else 0.0
+        if self._rerank_batcher is not None:
+            st["micro_batch"] = {"embed": self._embed_batcher.stats(), "rerank": self._rerank_batcher.stats()}
+        return st
+
+    def query(self, user_query, database_name=None, query_embedding=None, use_cache=True):
+        """Routed, fused and reranked results; use_cache=False bypasses the semantic cache (warmup, evals)."""
         self._log("-" * 30)
+        if query_embedding is None:
+            query_embedding = self.embed_query(user_query)
         
         # 1. Routing
         target_db = database_name
         if target_db is None and getattr(self, "semantic_router", None):
-            predicted_db, confidence = self.semantic_router.route(user_query)
+            predicted_db, confidence = self.semantic_router.route(user_query, embedding=query_embedding)
             if predicted_db == "OOD":
                 return [] # Return empty list, not string
             target_db = predicted_db
 
-        try:
-            collection = self.db_client.get_collection(target_db)
-        except Exception:
+        handle = self._get_handle(target_db)
+        if handle is None:
             return []
 
-        # 2. Retrieval (Now returns lists of dicts)
-        vector_res = self._get_vector_results(collection, user_query)
-        keyword_res = self._get_bm25_results(collection, user_query)
-        
-        # 3. Fusion (Deduplicate based on content)
-        seen_content = set()
-        fused_docs = []
-        
-        for item in vector_res + keyword_res:
-            if item["content"] not in seen_content:
-                fused_docs.append(item)
-                seen_content.add(item["content"])
+        cached = self._cache_get(query_embedding, target_db) if use_cache else None
+        if cached is not None:
+            return cached
 
+        # 2-3. Retrieval + fusion, cut to the rerank budget
+        fused_docs, rrf_scores = self._fuse(handle, user_query, query_embedding)
         if not fused_docs:
             return []
+        fused_docs = fused_docs[:self._budget(target_db, rrf_scores)]
 
         # 4. Reranking Setup
         # Extract just the text for the reranker
@@ -157,12 +484,116 @@ class DatabaseRouting:
 
         self._log(f"Starting Reranking on {len(fused_docs)} documents...")
 
-        # (Simplified Reranking Logic for brevity - keeping your core logic)
-        pairs = [(user_query, doc_text) for doc_text in docs_text_only]
-        
-        # Predict scores
-        logits = self.reranker.predict(pairs, batch_size=20, show_progress_bar=False)
+        # Predict scores (length-bucketed batches when use_length_sorting is on)
+        with self._span("reranker.predict"):
+            logits = self._rerank(user_query, docs_text_only, handle["tokens"])
         
+        results = self._select(target_db, fused_docs, logits)
+        if use_cache:
+            self._cache_put(query_embedding, target_db, results)
+        return results
+
+    def query_batch(self, user_queries, database_names, query_embeddings):
+        """
+        query() for many already-routed queries (database_names[i] may be "OOD"
+        or None -> []). Retrieval runs per query against its collection's cached
+        handle; all (query, doc) pairs are then reranked together in shared
+        length-sorted cross-encoder batches.
+        """
+        self._log("-" * 30)
+        jobs = []  # (position, target_db, query, fused_docs, tokens)
+        results = [[] for _ in user_queries]
+        for i, (user_query, target_db, emb) in enumerate(zip(user_queries, database_names, query_embeddings)):
+            if target_db in (None, "OOD"):
+                continue
+            handle = self._get_handle(target_db)
+            if handle is None:
+                continue
+            cached = self._cache_get(emb, target_db)
+            if cached is not None:
+                results[i] = cached
+                continue
+            fused_docs, rrf_scores = self._fuse(handle, user_query, emb)
+            if fused_docs:
+                fused_docs = fused_docs[:self._budget(target_db, rrf_scores)]
+                jobs.append((i, target_db, user_query, fused_docs, handle["tokens"]))
+
+        if not jobs:
+            return results
+
+        self._log(f"Starting batched Reranking on {sum(len(j[3]) for j in jobs)} pairs for {len(jobs)} queries...")
+        with self._span("reranker.predict_batch"):
+            logits = self._rerank_jobs([(q, [d["content"] for d in docs], tokens) for _, _, q, docs, tokens in jobs])
+
+        for (i, target_db, _, fused_docs, _), job_logits in zip(jobs, logits):
+            results[i] = self._select(target_db, fused_docs, job_logits)
+            self._cache_put(query_embeddings[i], target_db, results[i])
+        return results
+
+    def _cache_get(self, query_embedding, target_db):
+        # Keyed on the store signature collection_version() is built from (refreshed by
+        # _get_handle just before), so any write to Chroma drops every cached result
+        if self.semantic_cache is None:
+            return None
+        with self._span("semantic_cache.get"):
+            cached = self.semantic_cache.get(query_embedding, target_db, self._store_sig)
+        if cached is not None:
+            self._log(f"Semantic cache hit for '{target_db}' ({len(cached)} results)")
+        return cached
+
+    def _cache_put(self, query_embedding, target_db, results):
+        if self.semantic_cache is not None:
+            self.semantic_cache.put(query_embedding, target_db, self._store_sig, results)
+
+    def _fuse(self, handle, user_query, query_embedding):
+        """
+        Vector + BM25 candidates for one query, deduplicated on content and
+        ordered by reciprocal rank fusion: sum of 1 / (rrf_k + rank) over the
+        lists a document appears in. Returns (docs, rrf_scores), best first.
+        """
+        # 2. Retrieval (Now returns lists of dicts)
+        with self._span("vector_search"):
+            if handle["exact"] is not None:
+                vector_res = self._get_exact_results(handle["exact"], query_embedding)
+            else:
+                vector_res = self._get_vector_results(handle["retriever"], user_query, query_embedding)
+        with self._span("bm25_search"):
+            keyword_res = self._get_bm25_results(handle["bm25"], user_query)
+
+        # 3. Fusion (Deduplicate based on content, RRF order)
+        fused = {}
+        for results in (vector_res, keyword_res):
+            for rank, item in enumerate(results, start=1):
+                entry = fused.setdefault(item["content"], [item, 0.0])
+                entry[1] += 1.0 / (self.rrf_k + rank)
+
+        ranked = sorted(fused.values(), key=lambda e: e[1], reverse=True)
+        return [item for item, _ in ranked], [score for _, score in ranked]
+
+    def _budget(self, target_db, rrf_scores):
+        """
+        How many fused candidates to cross-encode. Starts at rerank_per_result x
+        the documents we return for this intent (5 products / 1 QnA answer),
+        clamped to [rerank_min, rerank_max], and grows up to 2x when the fused
+        ranking is flat: i.e. when the RRF margin between the last returnable
+        position and the budget edge is small relative to the top score, so the
+        cross-encoder has more to arbitrate.
+        """
+        n = len(rrf_scores)
+        if not self.rerank_budget or n == 0:
+            return n
+        keep = RETURN_COUNTS.get(target_db, 5)
+        base = min(max(keep * self.rerank_per_result, self.rerank_min), self.rerank_max)
+        if n <= base:
+            return n
+        margin = (rrf_scores[min(keep, n) - 1] - rrf_scores[base - 1]) / rrf_scores[0]
+        k = int(round(base * (2.0 - min(1.0, margin / self.rerank_margin_ref))))
+        k = min(k, self.rerank_max, n)
+        self._log(f"Rerank budget: {k}/{n} candidates (margin {margin:.2f})")
+        return k
+
+    def _select(self, target_db, fused_docs, logits):
+        """Threshold / order reranked candidates and cut to what the intent needs."""
         # 5. Sort based on scores
         # Zip the FULL dictionary (with ASIN) with the score
         scored_docs = sorted(
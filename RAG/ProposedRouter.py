@@ -1,8 +1,6 @@
 import numpy as np
-from sentence_transformers import SentenceTransformer
-model = SentenceTransformer("BAAI/bge-small-en-v1.5")
-
-import numpy as np
+# The bge-small encoder is no longer loaded here: DatabaseRouting owns the only
+# instance and computes one query embedding per request for routing + retrieval.
 
 class ClusterSemanticRouter:
     def __init__(self, anchors_path="teleoracle_v2_anchors.npz", threshold=0.7):
@@ -15,6 +13,17 @@ class ClusterSemanticRouter:
         unique_owners, counts = np.unique(self.owners, return_counts=True)
         total_anchors = len(self.owners)
         self.biases = {o: 1 + (1 - (c / total_anchors)) for o, c in zip(unique_owners, counts)}
+
+        # --- PRECOMPUTED OWNER GROUPS ---
+        # Anchors reordered so each owner's centroids are contiguous: per-owner
+        # maxima become one np.maximum.reduceat over the similarity matrix.
+        self.owner_names = [str(o) for o in unique_owners]
+        self._owner_labels = np.array(self.owner_names + ["OOD"], dtype=object)
+        order = np.argsort(self.owners, kind="stable")
+        self._P_grouped = np.ascontiguousarray(self.P_all[order])
+        self._owners_grouped = self.owners[order]
+        self._group_starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        self._bias_vec = np.array([self.biases[o] for o in unique_owners], dtype=np.float64)
                     
     def _l2_normalize(self, vector):
         norm = np.linalg.norm(vector)
@@ -25,74 +34,83 @@ class ClusterSemanticRouter:
         scale = (v**2) / (1.0 + v**2 + eps)
         return scale
 
-    def route(self, query_embedding, iterations=2, use_bias=True, verbose=False):
-        if verbose: 
-            mode = "BIASED" if use_bias else "UNBIASED"
-            print(f"\n{'='*20} QUANTITATIVE {mode} ROUTING {'='*20}")
-        
-        # 1. Normalize Query
-        q = self._l2_normalize(query_embedding)
-        
-        # 2. Get Raw Similarities
-        raw_S = np.dot(self.P_all, q) 
-        
-        if verbose:
-            indexed_scores = sorted(zip(raw_S, self.owners), key=lambda x: x[0], reverse=True)
-            print(f"[STEP 2] Top 5 Raw Matches:")
-            for i, (score, owner) in enumerate(indexed_scores[:5]):
-                print(f"   {i+1}. Score: {score:.4f} | DB: {owner}")
+    def _scores(self, Q, iterations=2, use_bias=True):
+        """
+        Routing math for a (n, d) matrix of query embeddings, all as array ops.
+        Returns raw similarities (n, anchors; grouped order), the biased per-owner
+        peaks (n, owners) and the normalized squashed probabilities (n, owners).
+        """
+        Q = np.atleast_2d(np.asarray(Q))
+        if not np.issubdtype(Q.dtype, np.floating):
+            Q = Q.astype(np.float64)  # float32 encoder output stays float32, as in the one-query path
+        # 1. Normalize Queries
+        Q = Q / np.maximum(np.sqrt(np.einsum("ij,ij->i", Q, Q))[:, None], 1e-12)
 
-        # 3. Iterative Refinement
+        # 2. Raw Similarities
+        raw_S = Q @ self._P_grouped.T
+
+        # 3. Iterative Refinement (softmax over all anchors, per query)
         refined_S = raw_S.copy()
-        for i in range(iterations):
-            weights = np.exp(refined_S * 10) / np.sum(np.exp(refined_S * 10))
-            refined_S = raw_S * weights 
-
-        # 4. Pick Winner with Toggleable Bias
-        db_final_scores = {}
-        squashed_confidences = {}
-
-        for db_name in np.unique(self.owners):
-            mask = (self.owners == db_name)
-            peak_refined = np.max(refined_S[mask])
-            
-            # --- TOGGLE BIAS LOGIC ---
-            multiplier = self.biases.get(db_name, 1.0) if use_bias else 1.0
-            biased_value = peak_refined * multiplier
-            db_final_scores[db_name] = biased_value
-            
-            squashed_confidences[db_name] = self._squash(biased_value)
-            
-            if verbose:
-                print(f"[STEP 4] DB '{db_name}' Peak: {peak_refined:.4f} | Biased: {biased_value:.4f} (x{multiplier:.2f})")
-        
-        # Normalize squashed confidences
-        total_conf = sum(squashed_confidences.values()) + 1e-12
-        db_probabilities = {k: v / total_conf for k, v in squashed_confidences.items()}
-        
-        best_db = max(db_probabilities, key=db_probabilities.get)
-        winning_prob = db_probabilities[best_db]
+        for _ in range(iterations):
+            e = np.exp(refined_S * 10)
+            refined_S = raw_S * (e / e.sum(axis=1, keepdims=True))
 
-        # 5. FINAL POLICY CHECKS
-        max_raw_similarity = np.max(raw_S)
-        
-        if verbose:
-            print(f"[STEP 4.5] Winning Probability (Normalized Squash): {winning_prob:.4f}")
-            print(f"[STEP 5] Final Winner Candidate: {best_db}")
-            print(f"[STEP 5] Global Max Raw Similarity: {max_raw_similarity:.4f}")
+        # 4. Per-owner peaks, bias, squash, normalize
+        peaks = np.maximum.reduceat(refined_S, self._group_starts, axis=1)
+        biased = peaks * self._bias_vec if use_bias else peaks
+        squashed = self._squash(biased)
+        probs = squashed / (squashed.sum(axis=1, keepdims=True) + 1e-12)
+        return raw_S, biased, probs
+
+    def route_batch(self, Q, iterations=2, use_bias=True):
+        """
+        Route many queries at once. Q: (n, d) query embeddings.
+        Returns (labels, confidences): n owner names or "OOD", and n floats with
+        the same meaning as route()'s second value.
+        """
+        raw_S, _, probs = self._scores(Q, iterations, use_bias)
+        best = probs.argmax(axis=1)
+        winning_prob = probs[np.arange(len(best)), best]
+        max_raw = raw_S.max(axis=1)
 
-        # Condition 1: Raw S Maximum check
-        if max_raw_similarity < self.threshold:
-            if verbose: print(f"{'='*15} RESULT: OOD (Low Raw Similarity) {'='*15}\n")
-            return "OOD", max_raw_similarity
+        # 5. FINAL POLICY CHECKS (raw similarity first, then winning probability)
+        low_raw = max_raw < self.threshold
+        ood = low_raw | (winning_prob < self.threshold)
+        labels = self._owner_labels[np.where(ood, len(self.owner_names), best)]
+        confidences = np.where(low_raw, max_raw, winning_prob)
+        return labels.tolist(), confidences.tolist()
+
+    def route(self, query_embedding, iterations=2, use_bias=True, verbose=False):
+        if not verbose:
+            labels, confidences = self.route_batch(query_embedding, iterations, use_bias)
+            return labels[0], confidences[0]
 
-        # Condition 2: Winning Probability Squash check
-        if winning_prob < self.threshold:
-            if verbose: print(f"{'='*15} RESULT: OOD (Low Winning Probability) {'='*15}\n")
-            return "OOD", winning_prob
-            
-        if verbose: print(f"{'='*15} RESULT: {best_db} {'='*15}\n")
-        return best_db, winning_prob
+        mode = "BIASED" if use_bias else "UNBIASED"
+        print(f"\n{'='*20} QUANTITATIVE {mode} ROUTING {'='*20}")
+        raw_S, biased, probs = self._scores(query_embedding, iterations, use_bias)
+        raw_S, biased, probs = raw_S[0], biased[0], probs[0]
+
+        top = np.argsort(raw_S)[::-1][:5]
+        print(f"[STEP 2] Top 5 Raw Matches:")
+        for i, j in enumerate(top):
+            print(f"   {i+1}. Score: {raw_S[j]:.4f} | DB: {self._owners_grouped[j]}")
+        for k, db_name in enumerate(self.owner_names):
+            multiplier = self._bias_vec[k] if use_bias else 1.0
+            print(f"[STEP 4] DB '{db_name}' Peak: {biased[k] / multiplier:.4f} | Biased: {biased[k]:.4f} (x{multiplier:.2f})")
+
+        best = int(probs.argmax())
+        print(f"[STEP 4.5] Winning Probability (Normalized Squash): {probs[best]:.4f}")
+        print(f"[STEP 5] Final Winner Candidate: {self.owner_names[best]}")
+        print(f"[STEP 5] Global Max Raw Similarity: {raw_S.max():.4f}")
+
+        label, confidence = self.route_batch(query_embedding, iterations, use_bias)
+        label, confidence = label[0], confidence[0]
+        if label == "OOD":
+            reason = "Low Raw Similarity" if raw_S.max() < self.threshold else "Low Winning Probability"
+            print(f"{'='*15} RESULT: OOD ({reason}) {'='*15}\n")
+        else:
+            print(f"{'='*15} RESULT: {label} {'='*15}\n")
+        return label, confidence
 
 
 class ProposedRouterWrapper:
@@ -100,13 +118,24 @@ class ProposedRouterWrapper:
         self.router = cluster_router
         self.model = embedding_model
 
-    def route(self, text):
-        # 1. Convert text to embedding and DISABLE the progress bar
-        embedding = self.model.encode(
-            text, 
-            convert_to_numpy=True, 
-            show_progress_bar=False
-        )
+    def route(self, text, embedding=None):
+        # 1. Convert text to embedding (unless the caller already did) and DISABLE the progress bar
+        if embedding is None:
+            embedding = self.model.encode(
+                text, 
+                convert_to_numpy=True, 
+                show_progress_bar=False
+            )
         
         # 2. Call the original route method
-        return self.router.route(embedding, verbose=False)
\ No newline at end of file
+        return self.router.route(embedding, verbose=False)
+
+    def route_batch(self, texts, embeddings=None):
+        """Route several queries with one encode call and one matrix product."""
+        if embeddings is None:
+            embeddings = self.model.encode(
+                list(texts),
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+        return self.router.route_batch(embeddings)
\ No newline at end of file
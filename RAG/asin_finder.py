@@ -2,8 +2,13 @@ import json
 import os
 
 class ASINFinder:
-    def __init__(self, json_path="product.json"):
+    def __init__(self, json_path="product.json", products=None):
         self.products = {}
+        # Preformatted product text (prefix stripped, leading name de-duplicated), same keys
+        self.formatted = {}
+        if products is not None:
+            self.products = dict(products)
+            return
         # Load the JSON and create a dictionary for O(1) lookup
         if os.path.exists(json_path):
             with open(json_path, 'r', encoding='utf-8') as f:
@@ -13,6 +18,32 @@ class ASINFinder:
         else:
             print(f"Warning: {json_path} not found.")
 
+    @classmethod
+    def from_documents(cls, documents, metadatas, formatter=None):
+        """
+        Build the index straight from a Chroma collection's documents/metadatas
+        (ASIN in the "asins" metadata key) instead of a separate JSON export.
+        formatter(text) -> str precomputes the carousel/LLM text for each product.
+        """
+        products = {}
+        for text, meta in zip(documents, metadatas):
+            asin = (meta or {}).get("asins")
+            if asin and asin not in products:
+                products[asin] = text
+        finder = cls(products=products)
+        if formatter is not None:
+            finder.formatted = {asin: formatter(text) for asin, text in products.items()}
+        return finder
+
+    def __len__(self):
+        return len(self.products)
+
     def get_content_by_asin(self, asin: str) -> str:
         """Returns the content string for the LLM context, or a default message."""
-        return self.products.get(asin, "Product details not found.")
\ No newline at end of file
+        return self.products.get(asin, "Product details not found.")
+
+    def get_formatted(self, asin: str, content: str = None):
+        """Preformatted text for `asin`, or None (unknown ASIN, or `content` is not that product's text)."""
+        if content is not None and self.products.get(asin) != content:
+            return None
+        return self.formatted.get(asin)
@@ -0,0 +1,565 @@
+"""
+Persistent BM25 index per Chroma collection (replaces rebuilding a LangChain
+BM25Retriever from `collection.get()` on every query).
+
+Scores are BM25Okapi with the LangChain retriever's parameters (rank_bm25:
+k1=1.5, b=0.75, epsilon=0.25 floor for negative IDF, whitespace tokens), but
+the candidate list is not the same: search() returns only documents with a
+positive score, best first, so a query sharing no terms with the collection
+gets fewer than k hits (possibly none). The retriever always padded its top-k
+with zero-score documents; those are not added here, and fusion sees only
+real keyword matches.
+
+Layout under <index_root>/<collection>/:
+
+    CURRENT                 name of the live segment directory
+    LOCK                    held by whichever process is writing (file lock)
+    seg-000001-<pid>/
+        meta.json           params, doc count, avgdl, ids fingerprint
+        vocab.json          term list (position = term id)
+        ids.json            Chroma ids (position = row)
+        post_indptr.npy     CSC postings by term: rows + raw tf
+        post_doc.npy / post_tf.npy
+        fwd_indptr.npy      CSR terms by row (to retract a replaced doc's df)
+        fwd_term.npy / fwd_tf.npy
+        doc_len.npy
+        docs.jsonl          {"content", "asin"} per row, mmap'd and read by offset
+        docs_offsets.npy
+        delta.jsonl         upserts/deletes since the segment was written
+
+The arrays are np.load(mmap_mode="r"), so startup cost and resident memory
+do not grow with the catalog. Upserts go to an in-memory delta segment (and
+are appended to delta.jsonl so they survive restarts); once the delta grows
+past `compact_ratio` of the base the whole segment is rewritten.
+
+Several processes (RAG workers, ingest_catalog.py) share one index. Writes
+take the LOCK file and first catch up with what other processes wrote; a
+new segment is written to a private temp folder and renamed in, and CURRENT
+is the only switch. Readers follow CURRENT and delta.jsonl on every search,
+and everything they read is mapped, so a replaced segment being deleted
+does not break them.
+"""
+import hashlib
+import json
+import math
+import mmap
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+FORMAT_VERSION = 1
+
+
+def default_tokenize(text: str) -> list[str]:
+    # Same as LangChain BM25Retriever's default_preprocessing_func
+    return text.split()
+
+
+def ids_fingerprint(ids) -> str:
+    h = hashlib.sha1()
+    for doc_id in sorted(ids):
+        h.update(doc_id.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+# ==========================================
+# SEGMENT WRITER
+# ==========================================
+
+def write_segment(seg_dir: Path, ids, contents, asins, tokenize=default_tokenize,
+                  k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+    """Build a fresh base segment from full documents."""
+    seg_dir.mkdir(parents=True, exist_ok=True)
+    vocab = {}
+    fwd_indptr = [0]
+    fwd_term, fwd_tf, doc_len = [], [], []
+    for text in contents:
+        tokens = tokenize(text)
+        counts = Counter(tokens)
+        for term, tf in counts.items():
+            fwd_term.append(vocab.setdefault(term, len(vocab)))
+            fwd_tf.append(tf)
+        fwd_indptr.append(len(fwd_term))
+        doc_len.append(len(tokens))
+
+    fwd_indptr = np.asarray(fwd_indptr, dtype=np.int64)
+    fwd_term = np.asarray(fwd_term, dtype=np.int32)
+    fwd_tf = np.asarray(fwd_tf, dtype=np.int32)
+    rows = np.repeat(np.arange(len(contents), dtype=np.int32), np.diff(fwd_indptr))
+
+    # CSR (row -> terms) to CSC (term -> rows)
+    order = np.lexsort((rows, fwd_term))
+    post_doc = rows[order]
+    post_tf = fwd_tf[order]
+    post_indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(fwd_term, minlength=len(vocab)), out=post_indptr[1:])
+
+    np.save(seg_dir / "post_indptr.npy", post_indptr)
+    np.save(seg_dir / "post_doc.npy", post_doc)
+    np.save(seg_dir / "post_tf.npy", post_tf)
+    np.save(seg_dir / "fwd_indptr.npy", fwd_indptr)
+    np.save(seg_dir / "fwd_term.npy", fwd_term)
+    np.save(seg_dir / "fwd_tf.npy", fwd_tf)
+    np.save(seg_dir / "doc_len.npy", np.asarray(doc_len, dtype=np.int32))
+
+    offsets = [0]
+    with open(seg_dir / "docs.jsonl", "wb") as f:
+        for content, asin in zip(contents, asins):
+            line = (json.dumps({"content": content, "asin": asin}, ensure_ascii=False) + "\n").encode("utf-8")
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(seg_dir / "docs_offsets.npy", np.asarray(offsets, dtype=np.int64))
+
+    with open(seg_dir / "vocab.json", "w", encoding="utf-8") as f:
+        json.dump(sorted(vocab, key=vocab.get), f, ensure_ascii=False)
+    with open(seg_dir / "ids.json", "w", encoding="utf-8") as f:
+        json.dump(list(ids), f)
+    with open(seg_dir / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "format": FORMAT_VERSION,
+            "k1": k1, "b": b, "epsilon": epsilon,
+            "n_docs": len(contents),
+            "n_terms": len(vocab),
+            "ids_fingerprint": ids_fingerprint(ids),
+        }, f, indent=2)
+    (seg_dir / "delta.jsonl").touch()
+
+
+# ==========================================
+# CROSS-PROCESS LOCK
+# ==========================================
+
+class FileLock:
+    """Exclusive lock on `path` across processes; re-entrant within one (threads serialize on an RLock)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+                else:
+                    while True:
+                        try:
+                            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:  # LK_LOCK gives up after ~10s; keep waiting
+                            pass
+            except BaseException:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+        self._thread_lock.release()
+
+
+# ==========================================
+# INDEX
+# ==========================================
+
+class BM25Index:
+    def __init__(self, index_dir, tokenize=default_tokenize, compact_ratio: float = 0.2, min_compact: int = 256):
+        """
+        index_dir:     <index_root>/<collection>
+        compact_ratio: rewrite the base segment once delta docs exceed this share of it
+        min_compact:   ... but never for fewer delta docs than this
+        """
+        self.index_dir = Path(index_dir)
+        self.tokenize = tokenize
+        self.compact_ratio = compact_ratio
+        self.min_compact = min_compact
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(self.index_dir / "LOCK")
+        self.seg_dir = None
+
+    # ---------- building / opening ----------
+
+    def exists(self) -> bool:
+        return (self.index_dir / "CURRENT").is_file()
+
+    @contextmanager
+    def write_lock(self):
+        """Held around every write: in-process (searches wait) and across processes (LOCK file)."""
+        with self._lock, self._file_lock:
+            if self.seg_dir is not None:
+                self.refresh()  # apply what other processes wrote before adding to it
+            yield self
+
+    def build(self, ids, contents, asins):
+        """Write a new base segment from the full document set and switch to it."""
+        with self.write_lock():
+            previous = self._current_name()
+            n = int(previous.split("-")[1]) + 1 if previous else 1
+            # Written under a private name, renamed in complete; only CURRENT decides what is live
+            tmp_dir = self.index_dir / f".tmp-seg-{os.getpid()}-{time.time_ns()}"
+            write_segment(tmp_dir, ids, contents, asins, self.tokenize)
+            seg_dir = self.index_dir / f"seg-{n:06d}-{os.getpid()}"
+            shutil.rmtree(seg_dir, ignore_errors=True)  # leftover of a crashed build by a same-pid process
+            os.rename(tmp_dir, seg_dir)
+            tmp = self.index_dir / f"CURRENT.tmp-{os.getpid()}"
+            tmp.write_text(seg_dir.name, encoding="utf-8")
+            os.replace(tmp, self.index_dir / "CURRENT")
+            self._open(seg_dir)
+            self._remove_stale(seg_dir.name)
+
+    def _remove_stale(self, current, min_age_s: float = 60.0):
+        # Readers that have a segment open keep their mmaps; one that read CURRENT just
+        # before the switch retries (open). Memory-mapped files cannot be deleted on
+        # Windows: those are skipped and retried on the next build.
+        now = time.time()
+        for path in self.index_dir.iterdir():
+            if not path.is_dir() or path.name == current:
+                continue
+            if path.name.startswith("seg-"):
+                shutil.rmtree(path, ignore_errors=True)
+            elif path.name.startswith(".tmp-seg-"):
+                # Another process's build in progress, unless it was abandoned long ago
+                try:
+                    if now - path.stat().st_mtime > min_age_s:
+                        shutil.rmtree(path, ignore_errors=True)
+                except OSError:
+                    pass
+
+    def open(self, retries: int = 3):
+        with self._lock:
+            for attempt in range(retries):
+                try:
+                    self._open(self.index_dir / self._current_name())
+                    return
+                except FileNotFoundError:
+                    # CURRENT moved on and the segment we read it as was removed
+                    if attempt == retries - 1:
+                        raise
+
+    def refresh(self):
+        """Catch up with other processes: reopen if CURRENT switched, else replay new delta lines."""
+        with self._lock:
+            try:
+                name = self._current_name()
+                if name is not None and name != self.seg_dir.name:
+                    self.open()
+                else:
+                    self._replay_delta()
+            except OSError as e:
+                # Keep serving the mapped segment; the next search tries again
+                print(f"[BM25] Could not refresh {self.index_dir.name}: {e}")
+
+    def _current_name(self):
+        current = self.index_dir / "CURRENT"
+        return current.read_text(encoding="utf-8").strip() if current.is_file() else None
+
+    def _open(self, seg_dir: Path):
+        with open(seg_dir / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"unsupported BM25 index format in {seg_dir}")
+        self.seg_dir = seg_dir
+        self.meta = meta
+        self.k1, self.b, self.epsilon = meta["k1"], meta["b"], meta["epsilon"]
+
+        load = lambda name: np.load(seg_dir / name, mmap_mode="r")
+        self.post_indptr = load("post_indptr.npy")
+        self.post_doc = load("post_doc.npy")
+        self.post_tf = load("post_tf.npy")
+        self.fwd_indptr = load("fwd_indptr.npy")
+        self.fwd_term = load("fwd_term.npy")
+        self.fwd_tf = load("fwd_tf.npy")
+        self.doc_len = load("doc_len.npy")
+        self.docs_offsets = load("docs_offsets.npy")
+        self._docs = None  # mmap of docs.jsonl (None when empty)
+        if self.docs_offsets[-1] > 0:
+            with open(seg_dir / "docs.jsonl", "rb") as f:
+                self._docs = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        with open(seg_dir / "vocab.json", "r", encoding="utf-8") as f:
+            terms = json.load(f)
+        with open(seg_dir / "ids.json", "r", encoding="utf-8") as f:
+            self.base_ids = json.load(f)
+        self.n_base = len(self.base_ids)
+        self.n_base_terms = len(terms)
+        self.vocab = {t: i for i, t in enumerate(terms)}
+        self.row_of = {doc_id: i for i, doc_id in enumerate(self.base_ids)}
+
+        # Live statistics (base minus tombstones plus delta)
+        self.df = np.diff(self.post_indptr).astype(np.float64)
+        self.alive = np.ones(self.n_base, dtype=bool)
+        self.n_docs = self.n_base
+        self.total_len = float(np.sum(self.doc_len, dtype=np.int64))
+
+        # Delta segment: id -> {"tf": Counter, "len", "content", "asin"}
+        self.delta = {}
+        self.delta_postings = {}  # term -> {id: tf}
+        self._avg_idf = None
+        self._delta_pos = 0  # bytes of delta.jsonl applied so far
+        self._replay_delta()
+
+    def _replay_delta(self):
+        """Apply delta.jsonl from where we left off (complete lines only: another process may be appending)."""
+        path = self.seg_dir / "delta.jsonl"
+        try:
+            if path.stat().st_size <= self._delta_pos:
+                return
+            with open(path, "rb") as f:
+                f.seek(self._delta_pos)
+                chunk = f.read()
+        except FileNotFoundError:
+            return
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            if not line.strip():
+                continue
+            op = json.loads(line)
+            if op["op"] == "upsert":
+                self._apply_upsert(op["id"], op["content"], op.get("asin"))
+            else:
+                self._apply_delete(op["id"])
+        self._delta_pos += end
+
+    # ---------- incremental updates ----------
+
+    def _retract_base(self, row: int):
+        if not self.alive[row]:
+            return
+        s, e = self.fwd_indptr[row], self.fwd_indptr[row + 1]
+        self.df[np.asarray(self.fwd_term[s:e])] -= 1
+        self.alive[row] = False
+        self.n_docs -= 1
+        self.total_len -= int(self.doc_len[row])
+
+    def _retract_delta(self, doc_id):
+        entry = self.delta.pop(doc_id, None)
+        if entry is None:
+            return
+        for term in entry["tf"]:
+            self.df[self.vocab[term]] -= 1
+            postings = self.delta_postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self.delta_postings[term]
+        self.n_docs -= 1
+        self.total_len -= entry["len"]
+
+    def _apply_delete(self, doc_id):
+        row = self.row_of.get(doc_id)
+        if row is not None:
+            self._retract_base(row)
+        self._retract_delta(doc_id)
+        self._avg_idf = None
+
+    def _apply_upsert(self, doc_id, content, asin):
+        self._apply_delete(doc_id)
+        tokens = self.tokenize(content)
+        counts = Counter(tokens)
+        new_terms = [t for t in counts if t not in self.vocab]
+        if new_terms:
+            for t in new_terms:
+                self.vocab[t] = len(self.vocab)
+            self.df = np.concatenate([self.df, np.zeros(len(new_terms))])
+        for term, tf in counts.items():
+            self.df[self.vocab[term]] += 1
+            self.delta_postings.setdefault(term, {})[doc_id] = tf
+        self.delta[doc_id] = {"tf": counts, "len": len(tokens), "content": content, "asin": asin}
+        self.n_docs += 1
+        self.total_len += len(tokens)
+        self._avg_idf = None
+
+    def upsert(self, ids, contents, asins):
+        """Add or replace documents (same ids as in Chroma)."""
+        with self.write_lock():
+            lines = []
+            for doc_id, content, asin in zip(ids, contents, asins):
+                self._apply_upsert(doc_id, content, asin)
+                lines.append(json.dumps({"op": "upsert", "id": doc_id, "content": content, "asin": asin},
+                                        ensure_ascii=False) + "\n")
+            self._append_delta(lines)
+            self._maybe_compact()
+
+    def delete(self, ids):
+        with self.write_lock():
+            lines = []
+            for doc_id in ids:
+                self._apply_delete(doc_id)
+                lines.append(json.dumps({"op": "delete", "id": doc_id}) + "\n")
+            self._append_delta(lines)
+            self._maybe_compact()
+
+    def _append_delta(self, lines):
+        with open(self.seg_dir / "delta.jsonl", "ab") as f:
+            f.write("".join(lines).encode("utf-8"))
+            self._delta_pos = f.tell()
+
+    def live_ids(self) -> list[str]:
+        with self._lock:
+            base = [doc_id for doc_id, ok in zip(self.base_ids, self.alive) if ok]
+            return base + list(self.delta)
+
+    def _maybe_compact(self):
+        changed = len(self.delta) + int(self.n_base - self.alive.sum())
+        if changed >= max(self.min_compact, self.compact_ratio * self.n_base):
+            self.compact()
+
+    def compact(self):
+        """Fold the delta into a new base segment."""
+        with self.write_lock():
+            ids, contents, asins = [], [], []
+            for row in np.flatnonzero(self.alive):
+                doc = self._read_doc(int(row))
+                ids.append(self.base_ids[row])
+                contents.append(doc["content"])
+                asins.append(doc["asin"])
+            for doc_id, entry in self.delta.items():
+                ids.append(doc_id)
+                contents.append(entry["content"])
+                asins.append(entry["asin"])
+            self.build(ids, contents, asins)
+
+    # ---------- search ----------
+
+    def _read_doc(self, row: int) -> dict:
+        start, end = int(self.docs_offsets[row]), int(self.docs_offsets[row + 1])
+        return json.loads(self._docs[start:end])
+
+    def _idf(self) -> tuple[float, float]:
+        """(N, epsilon floor) for rank_bm25's IDF with negative values clamped."""
+        if self._avg_idf is None:
+            df = self.df[self.df > 0]  # terms that only lived in deleted docs are gone
+            idf = np.log(self.n_docs - df + 0.5) - np.log(df + 0.5)
+            self._avg_idf = float(idf.sum() / len(idf)) if len(idf) else 0.0
+        return self.n_docs, self.epsilon * self._avg_idf
+
+    def search(self, query: str, k: int = 50) -> list[dict]:
+        """Top-k documents with a positive BM25 score: [{"content", "asin", "score"}]."""
+        with self._lock:
+            self.refresh()
+            if self.n_docs == 0:
+                return []
+            n, eps = self._idf()
+            avgdl = self.total_len / n
+            k1, b = self.k1, self.b
+            base_scores = np.zeros(self.n_base, dtype=np.float64)
+            delta_scores = dict.fromkeys(self.delta, 0.0)
+
+            # Repeated query tokens count again, as in rank_bm25
+            for term in self.tokenize(query):
+                tid = self.vocab.get(term)
+                if tid is None or self.df[tid] <= 0:
+                    continue
+                df = self.df[tid]
+                idf = math.log(n - df + 0.5) - math.log(df + 0.5)
+                if idf < 0:
+                    idf = eps
+                if tid < self.n_base_terms:
+                    s, e = self.post_indptr[tid], self.post_indptr[tid + 1]
+                    rows = np.asarray(self.post_doc[s:e])
+                    tf = np.asarray(self.post_tf[s:e], dtype=np.float64)
+                    norm = k1 * (1 - b + b * np.asarray(self.doc_len[rows]) / avgdl)
+                    base_scores[rows] += idf * tf * (k1 + 1) / (tf + norm)
+                for doc_id, tf in self.delta_postings.get(term, {}).items():
+                    norm = k1 * (1 - b + b * self.delta[doc_id]["len"] / avgdl)
+                    delta_scores[doc_id] += idf * tf * (k1 + 1) / (tf + norm)
+
+            base_scores[~self.alive] = 0.0
+            hits = [(float(base_scores[r]), int(r)) for r in np.flatnonzero(base_scores > 0)]
+            hits += [(score, doc_id) for doc_id, score in delta_scores.items() if score > 0]
+            hits.sort(key=lambda h: h[0], reverse=True)
+
+            results = []
+            for score, ref in hits[:k]:
+                doc = self._read_doc(ref) if isinstance(ref, int) else self.delta[ref]
+                results.append({"content": doc["content"], "asin": doc["asin"], "score": score})
+            return results
+
+
+# ==========================================
+# CHROMA SYNC
+# ==========================================
+
+def _asin(meta):
+    return (meta or {}).get("asins", None)
+
+
+def open_for_collection(index_root, collection, **kwargs) -> BM25Index:
+    """
+    Open the persisted index for a Chroma collection, (re)building it if it is
+    missing or its ids no longer match the collection.
+    """
+    index = BM25Index(Path(index_root) / collection.name, **kwargs)
+    ids = collection.get(include=[])["ids"]
+    if index.exists():
+        try:
+            index.open()
+            if ids_fingerprint(index.live_ids()) == ids_fingerprint(ids):
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+    # Another process (worker, ingest CLI) may be doing the same: decide again under the lock
+    with index.write_lock():
+        if index.exists():
+            try:
+                if index.seg_dir is None:
+                    index.open()
+                if ids_fingerprint(index.live_ids()) != ids_fingerprint(ids):
+                    print(f"[BM25] '{collection.name}' is out of date, syncing")
+                    sync_with_collection(index, collection, ids)
+                return index
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[BM25] Could not open index for '{collection.name}' ({e}), rebuilding")
+
+        print(f"[BM25] Building index for '{collection.name}' ({len(ids)} docs)")
+        data = collection.get(include=["documents", "metadatas"])
+        index.build(data["ids"], data["documents"], [_asin(m) for m in data["metadatas"]])
+    return index
+
+
+def sync_with_collection(index: BM25Index, collection, ids=None):
+    """Apply id-level differences (new / removed documents) from Chroma to the index."""
+    ids = ids if ids is not None else collection.get(include=[])["ids"]
+    with index.write_lock():
+        live = set(index.live_ids())
+        wanted = set(ids)
+        removed = live - wanted
+        added = [i for i in ids if i not in live]
+        if removed:
+            index.delete(sorted(removed))
+        if added:
+            data = collection.get(ids=added, include=["documents", "metadatas"])
+            index.upsert(data["ids"], data["documents"], [_asin(m) for m in data["metadatas"]])
+    return len(added), len(removed)
@@ -0,0 +1,204 @@
+# build_router_anchors.py
+"""
+Builds teleoracle_v2_anchors.npz for ClusterSemanticRouter from the live
+Chroma collections: each collection (owner) gets its document embeddings
+clustered down to a fixed centroid budget (spherical k-means,
+router_anchors.py). Routing cost is one (queries x anchors) product plus a
+softmax over every anchor, so fewer anchors is cheaper as long as the
+routing decisions hold.
+
+Before writing, it sweeps several budgets and reports routing accuracy vs.
+latency on labelled probes:
+
+    retail_qna_eval_100.json      -> "retail_qna"
+    CONFIG["product_queries"]     -> "product"
+    CONFIG["ood_queries"]         -> "OOD"
+
+The current anchors file is included as the baseline row. Queries are
+embedded once (bge-small, normalized, no instruction: same as
+DatabaseRouting.embed_query).
+
+    python build_router_anchors.py                          # sweep + write with --budget
+    python build_router_anchors.py --budget 8               # 8 centroids per owner
+    python build_router_anchors.py --owner-budget product=8 retail_qna=24
+    python build_router_anchors.py --sweep 2 4 8 16 32 --dry-run
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import chromadb
+import numpy as np
+
+import router_anchors
+from ProposedRouter import ClusterSemanticRouter
+
+SERVICE_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SERVICE_DIR.parent
+
+CONFIG = {
+    "db_path": str(SERVICE_DIR / "db"),
+    "anchors_path": str(SERVICE_DIR / "teleoracle_v2_anchors.npz"),
+    "embed_model": "BAAI/bge-small-en-v1.5",
+    "eval_path": str(REPO_ROOT / "experiment_metric" / "reranker_metric" / "retail_qna_eval_100.json"),
+    "product_queries": [
+        "show me running shoes",
+        "do you have black sneakers for women",
+        "I want something for basketball",
+        "lightweight shoes for the gym",
+        "flip flops for the beach",
+        "kids trainers with velcro",
+        "white leather sneakers",
+        "something comfortable for walking all day",
+    ],
+    "ood_queries": [
+        "what's the weather like tomorrow",
+        "tell me a joke",
+        "who won the football match last night",
+        "how do I cook pasta",
+        "what is the capital of France",
+    ],
+    "threshold": 0.6,            # same as RAG/main.py
+    "sweep": [2, 4, 8, 16, 32, 64],
+    "budget": None,              # centroids per owner to write; None keeps the current per-owner counts
+    "timing_repeats": 20,
+    "seed": 0,
+    "report_path": "./reports/router_anchors.json",
+}
+
+
+def percentile(sorted_values, q):
+    # nearest-rank, same as tracing.py
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(np.ceil(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def load_probes(cfg):
+    with open(cfg["eval_path"], "r", encoding="utf-8") as f:
+        qna = [row["text"] for row in json.load(f)]
+    texts = qna + list(cfg["product_queries"]) + list(cfg["ood_queries"])
+    labels = (["retail_qna"] * len(qna) + ["product"] * len(cfg["product_queries"])
+              + ["OOD"] * len(cfg["ood_queries"]))
+    return texts, labels
+
+
+def collection_embeddings(db_path):
+    client = chromadb.PersistentClient(path=db_path)
+    out = {}
+    for col in sorted(client.list_collections(), key=lambda c: c.name):
+        out[col.name] = np.asarray(col.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+    return out
+
+
+def build(embeddings_by_owner, budgets, seed):
+    centroids, owners = [], []
+    for owner, X in embeddings_by_owner.items():
+        if len(X) == 0:
+            continue
+        C = router_anchors.spherical_kmeans(X, budgets[owner], seed=seed)
+        centroids.append(C)
+        owners.append(np.full(len(C), owner))
+    return np.concatenate(centroids), np.concatenate(owners)
+
+
+def evaluate(anchors_path, Q, labels, cfg):
+    router = ClusterSemanticRouter(anchors_path=anchors_path, threshold=cfg["threshold"])
+    predicted, _ = router.route_batch(Q)
+    labels = np.asarray(labels)
+    correct = np.asarray(predicted) == labels
+
+    # Per-request cost as served: one route() per query
+    lat = []
+    for _ in range(cfg["timing_repeats"]):
+        for q in Q:
+            t0 = time.perf_counter()
+            router.route(q)
+            lat.append((time.perf_counter() - t0) * 1e6)
+    lat.sort()
+    return {
+        "anchors": int(len(router.owners)),
+        "per_owner": {o: int((router.owners == o).sum()) for o in router.owner_names},
+        "accuracy": float(correct.mean()),
+        "accuracy_by_label": {str(l): float(correct[labels == l].mean()) for l in np.unique(labels)},
+        "route_p50_us": percentile(lat, 50),
+        "route_p95_us": percentile(lat, 95),
+    }
+
+
+def parse_owner_budgets(items):
+    budgets = {}
+    for item in items or []:
+        owner, _, n = item.partition("=")
+        budgets[owner] = int(n)
+    return budgets
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Build router anchors from the Chroma collections")
+    p.add_argument("--db", dest="db_path")
+    p.add_argument("--out", dest="anchors_path", help="anchors npz to write")
+    p.add_argument("--budget", type=int, help="centroids per owner")
+    p.add_argument("--owner-budget", nargs="+", metavar="OWNER=N", help="per-owner overrides")
+    p.add_argument("--sweep", type=int, nargs="+", help="budgets to compare in the report")
+    p.add_argument("--eval", dest="eval_path")
+    p.add_argument("--threshold", type=float)
+    p.add_argument("--report", dest="report_path", help="write the JSON report here ('' to skip)")
+    p.add_argument("--dry-run", action="store_true", help="report only, keep the current anchors")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    cfg = dict(CONFIG)
+    cfg.update({k: v for k, v in vars(args).items() if v is not None and k in CONFIG})
+
+    from sentence_transformers import SentenceTransformer
+
+    embeddings = collection_embeddings(cfg["db_path"])
+    print(f"[ANCHORS] Collections: " + ", ".join(f"{o} ({len(X)} docs)" for o, X in embeddings.items()))
+
+    current = router_anchors.owner_budgets(cfg["anchors_path"])
+    base = cfg["budget"]
+    budgets = {o: (base if base is not None else current.get(o, 16)) for o in embeddings}
+    budgets.update(parse_owner_budgets(args.owner_budget))
+
+    texts, labels = load_probes(cfg)
+    encoder = SentenceTransformer(cfg["embed_model"])
+    Q = encoder.encode(texts, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+
+    rows = []
+    if current:
+        rows.append({"budget": "current", **evaluate(cfg["anchors_path"], Q, labels, cfg)})
+    with tempfile.TemporaryDirectory() as tmp:
+        candidates = [(b, {o: b for o in embeddings}) for b in cfg["sweep"]] + [("selected", budgets)]
+        for name, owner_budgets in candidates:
+            path = os.path.join(tmp, f"anchors_{name}.npz")
+            router_anchors.save_anchors(path, *build(embeddings, owner_budgets, cfg["seed"]))
+            rows.append({"budget": name, **evaluate(path, Q, labels, cfg)})
+
+    print(f"\n{'budget':>9} {'anchors':>8} {'acc':>7} " + " ".join(f"{l:>11}" for l in sorted(set(labels)))
+          + f" {'p50 us':>8} {'p95 us':>8}")
+    for r in rows:
+        per_label = " ".join(f"{r['accuracy_by_label'][l]:>11.3f}" for l in sorted(set(labels)))
+        print(f"{r['budget']:>9} {r['anchors']:>8} {r['accuracy']:>7.3f} {per_label} "
+              f"{r['route_p50_us']:>8.1f} {r['route_p95_us']:>8.1f}")
+
+    if not args.dry_run:
+        router_anchors.save_anchors(cfg["anchors_path"], *build(embeddings, budgets, cfg["seed"]))
+        print(f"\n[ANCHORS] Wrote {sum(min(budgets[o], len(X)) for o, X in embeddings.items())} anchors "
+              f"({', '.join(f'{o}={budgets[o]}' for o in embeddings)}) to {cfg['anchors_path']}")
+
+    if cfg["report_path"]:
+        os.makedirs(os.path.dirname(cfg["report_path"]) or ".", exist_ok=True)
+        with open(cfg["report_path"], "w", encoding="utf-8") as f:
+            json.dump({"config": {**cfg, "owner_budgets": budgets}, "results": rows}, f, indent=2)
+        print(f"Saved report to {cfg['report_path']}")
+
+
+if __name__ == "__main__":
+    main()
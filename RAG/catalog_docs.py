@@ -0,0 +1,139 @@
+"""
+Document conventions for the RAG collections, shared by ingestion
+(ingest_catalog.py) and serving (DatabaseRouting).
+
+    product     one document per ASIN, rendered as
+                PRODUCT_PREFIX + "<title>. The <title> is currently priced at ..."
+                (DatabaseRouting strips the prefix again for the carousel / LLM)
+    retail_qna  policy / FAQ pages split into ~100-word chunks on sentence
+                boundaries, one document per chunk
+
+Loaders return [{"key", "content", "metadata"}]: `key` identifies a document
+across catalog refreshes (the ASIN for products, the content hash for QnA
+chunks) and `metadata` is what gets stored next to it in Chroma.
+"""
+import hashlib
+import json
+import re
+from pathlib import Path
+
+PRODUCT_PREFIX = "Product information for users looking for or interested in "
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _read_records(path: Path) -> list[dict]:
+    """JSON list or JSON-lines file of objects."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.suffix == ".jsonl":
+            return [json.loads(line) for line in f if line.strip()]
+        data = json.load(f)
+    return data if isinstance(data, list) else [data]
+
+
+# ==========================================
+# PRODUCTS
+# ==========================================
+
+def render_product(record: dict) -> str:
+    """
+    Product text in the store's template. Records that already carry a
+    rendered "content" (product.json exports) are used as is, prefix added
+    if missing; otherwise the text is built from the structured fields.
+    """
+    content = (record.get("content") or "").strip()
+    if content:
+        return content if content.startswith(PRODUCT_PREFIX) else PRODUCT_PREFIX + content
+
+    title = (record.get("title") or record.get("name") or "").strip()
+    parts = [f"{PRODUCT_PREFIX}{title}."]
+    if record.get("price") not in (None, ""):
+        parts.append(f"The {title} is currently priced at {record['price']}.")
+    features = record.get("features")
+    if isinstance(features, (list, tuple)):
+        features = ", ".join(str(f).strip() for f in features if str(f).strip())
+    if features:
+        parts.append(f"Key features and materials include {features}.")
+    reviews = record.get("reviews", record.get("review_count"))
+    if record.get("rating") not in (None, ""):
+        rating = f"It has a customer satisfaction rating of {record['rating']}/5 stars"
+        parts.append(f"{rating} based on {reviews} reviews." if reviews not in (None, "") else f"{rating}.")
+    review = (record.get("top_review") or record.get("review") or "").strip()
+    if review:
+        parts.append(f"A highly-rated review mentioned: {review}")
+    return " ".join(parts)
+
+
+def load_products(path) -> list[dict]:
+    """Product documents keyed by ASIN (a repeated ASIN keeps its last record)."""
+    docs = {}
+    for record in _read_records(Path(path)):
+        asin = str(record.get("asin") or record.get("asins") or "").strip()
+        if not asin:
+            print(f"[CATALOG] Skipping product without ASIN: {str(record)[:80]}")
+            continue
+        if asin in docs:
+            print(f"[CATALOG] Duplicate ASIN {asin}, keeping the last record")
+        docs[asin] = render_product(record)
+    return [
+        {"key": asin, "content": text,
+         "metadata": {"source_file": "product", "word_count": len(text.split()), "position": i,
+                      "asins": asin, "content_hash": content_hash(text)}}
+        for i, (asin, text) in enumerate(docs.items())
+    ]
+
+
+# ==========================================
+# RETAIL QNA
+# ==========================================
+
+def chunk_text(text: str, chunk_words: int = 120) -> list[str]:
+    """Pack whole sentences into chunks of at most ~chunk_words words."""
+    chunks, current, size = [], [], 0
+    for sentence in _SENTENCE_END.split(" ".join(text.split())):
+        n = len(sentence.split())
+        if current and size + n > chunk_words:
+            chunks.append(" ".join(current))
+            current, size = [], 0
+        current.append(sentence)
+        size += n
+    if current:
+        chunks.append(" ".join(current))
+    return [c for c in chunks if c.strip()]
+
+
+def _qna_pages(path: Path) -> list[str]:
+    if path.is_dir():
+        return [p.read_text(encoding="utf-8") for p in sorted(path.rglob("*")) if p.suffix in (".txt", ".md")]
+    if path.suffix in (".txt", ".md"):
+        return [path.read_text(encoding="utf-8")]
+    pages = []
+    for record in _read_records(path):
+        if record.get("question") and record.get("answer"):
+            pages.append(f"{record['question'].strip()} {record['answer'].strip()}")
+        else:
+            pages.append(record.get("content") or record.get("text") or "")
+    return pages
+
+
+def load_qna(path, chunk_words: int = 120) -> list[dict]:
+    """
+    QnA chunks from a folder of .txt/.md pages, one page file, or a JSON(L)
+    file of {"content"} / {"text"} / {"question", "answer"} records. Chunks
+    are keyed by content hash, so an edited page only replaces the chunks
+    whose text actually changed.
+    """
+    docs = {}
+    for page in _qna_pages(Path(path)):
+        for chunk in chunk_text(page, chunk_words):
+            docs.setdefault(content_hash(chunk), chunk)
+    return [
+        {"key": key, "content": text,
+         "metadata": {"source_file": "retail_qna", "word_count": len(text.split()), "position": i,
+                      "content_hash": key}}
+        for i, (key, text) in enumerate(docs.items())
+    ]
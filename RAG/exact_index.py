@@ -0,0 +1,205 @@
+"""
+Exact (brute-force) vector search for small collections.
+
+The deployed collections hold a few hundred embeddings; at that size one
+BLAS matrix-vector product over a contiguous float32 matrix plus
+argpartition beats Chroma's HNSW + SQLite round trip. Each collection is
+snapshotted to
+
+    <index_root>/<collection>/
+        meta.json          source fingerprint, distance space, dim, count
+        embeddings.npy     (n, dim) float32, memory-mapped at load
+        sq_norms.npy       (n,) float32 squared norms (for l2 ranking)
+        docs.jsonl         {"content", "asin"} per row, memory-mapped, read by offset
+        docs_offsets.npy
+
+and rebuilt only when the fingerprint of the Chroma store changes. Ranking
+reproduces Chroma's distance for the collection's "hnsw:space" (l2 by
+default, cosine, ip) exactly, without HNSW's approximation.
+
+Everything is memory-mapped read-only, so several RAG worker processes
+share one copy of the embeddings and texts through the page cache.
+"""
+import json
+import mmap
+import os
+import shutil
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+FORMAT_VERSION = 2
+
+# Largest collection served by exact search; above it the HNSW retriever is used
+EXACT_SEARCH_MAX = 20000
+
+
+def store_signature(db_path) -> tuple:
+    """
+    Write position of a Chroma store: the last sequence id of its write log
+    plus its collection ids. Moves on every add / update / delete / new or
+    dropped collection, but not when a process merely opens the store (which
+    rewrites the sqlite file, so its mtime moves on every worker start).
+    Falls back to the sqlite (+WAL) mtimes for an unexpected schema.
+    """
+    db_file = Path(db_path).resolve() / "chroma.sqlite3"
+    if not db_file.is_file():
+        return (None,)
+    try:
+        conn = sqlite3.connect(f"{db_file.as_uri()}?mode=ro", uri=True, timeout=5.0)
+        try:
+            seq = conn.execute("SELECT MAX(seq_id) FROM embeddings_queue").fetchone()[0]
+            collections = conn.execute("SELECT COUNT(*), GROUP_CONCAT(id) FROM "
+                                       "(SELECT id FROM collections ORDER BY id)").fetchone()
+        finally:
+            conn.close()
+        return ("seq", seq, *collections)
+    except sqlite3.Error:
+        return ("mtime", *(f.stat().st_mtime_ns if f.exists() else None
+                           for f in (db_file, db_file.with_name(db_file.name + "-wal"))))
+
+
+def collection_space(collection) -> str:
+    """The collection's HNSW distance ("l2" when not configured, as in Chroma)."""
+    meta = collection.metadata or {}
+    if "hnsw:space" in meta:
+        return meta["hnsw:space"]
+    config = getattr(collection, "configuration_json", None) or {}
+    return (config.get("hnsw") or {}).get("space") or "l2"
+
+
+class ExactVectorIndex:
+    def __init__(self, index_dir, embeddings, sq_norms, docs_offsets, docs_map, space="l2"):
+        self.index_dir = Path(index_dir)
+        self.embeddings = embeddings
+        self.sq_norms = sq_norms
+        self.docs_offsets = docs_offsets
+        self._docs = docs_map  # mmap of docs.jsonl (None when empty)
+        self.space = space
+
+    def __len__(self):
+        return len(self.docs_offsets) - 1
+
+    def doc(self, row: int) -> dict:
+        start, end = int(self.docs_offsets[row]), int(self.docs_offsets[row + 1])
+        return json.loads(self._docs[start:end])
+
+    # ---------- building / opening ----------
+
+    @classmethod
+    def open(cls, index_dir, fingerprint=None):
+        """mmap a snapshot; None if missing, unreadable or built from another fingerprint."""
+        index_dir = Path(index_dir)
+        try:
+            with open(index_dir / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("format") != FORMAT_VERSION:
+                return None
+            if fingerprint is not None and meta.get("fingerprint") != fingerprint:
+                return None
+            embeddings = np.load(index_dir / "embeddings.npy", mmap_mode="r")
+            sq_norms = np.load(index_dir / "sq_norms.npy", mmap_mode="r")
+            docs_offsets = np.load(index_dir / "docs_offsets.npy", mmap_mode="r")
+            docs_map = None
+            if docs_offsets[-1] > 0:
+                with open(index_dir / "docs.jsonl", "rb") as f:
+                    docs_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, KeyError):
+            return None
+        if len(docs_offsets) - 1 != embeddings.shape[0]:
+            return None
+        return cls(index_dir, embeddings, sq_norms, docs_offsets, docs_map, meta.get("space", "l2"))
+
+    @classmethod
+    def build(cls, index_dir, embeddings, contents, asins, space="l2", fingerprint=None):
+        """
+        Write a snapshot (atomically replacing any previous one) and open it.
+        Safe against other processes building the same snapshot at the same
+        time: each writes its own temp folder and the last rename wins.
+        """
+        index_dir = Path(index_dir)
+        if len(contents):
+            embeddings = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32).reshape(len(contents), -1))
+        else:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        if space == "cosine":
+            embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        tmp = index_dir.with_name(f"{index_dir.name}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        np.save(tmp / "embeddings.npy", embeddings)
+        np.save(tmp / "sq_norms.npy", np.einsum("ij,ij->i", embeddings, embeddings).astype(np.float32))
+        offsets = [0]
+        with open(tmp / "docs.jsonl", "wb") as f:
+            for c, a in zip(contents, asins):
+                line = (json.dumps({"content": c, "asin": a}, ensure_ascii=False) + "\n").encode("utf-8")
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+        np.save(tmp / "docs_offsets.npy", np.asarray(offsets, dtype=np.int64))
+        with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"format": FORMAT_VERSION, "fingerprint": fingerprint, "space": space,
+                       "count": len(contents), "dim": int(embeddings.shape[1]) if len(contents) else 0},
+                      f, indent=2)
+        old = index_dir.with_name(f"{index_dir.name}.old-{os.getpid()}")
+        shutil.rmtree(old, ignore_errors=True)
+        for _ in range(3):
+            try:
+                if index_dir.exists():
+                    os.replace(index_dir, old)
+                os.replace(tmp, index_dir)
+                break
+            except OSError:
+                # Another process swapped its snapshot in between: use it if it is the same one
+                index = cls.open(index_dir, fingerprint)
+                if index is not None:
+                    shutil.rmtree(tmp, ignore_errors=True)
+                    return index
+        # An old mmap may still be open (Windows); it is cleaned up on the next build
+        shutil.rmtree(old, ignore_errors=True)
+        return cls.open(index_dir, fingerprint)
+
+    # ---------- search ----------
+
+    def scores(self, query_embeddings) -> np.ndarray:
+        """(n_queries, n_docs) similarity; higher is closer under the collection's space."""
+        Q = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if self.space == "cosine":
+            Q = Q / np.maximum(np.linalg.norm(Q, axis=1, keepdims=True), 1e-12)
+        S = Q @ self.embeddings.T
+        if self.space == "l2":
+            # -||e - q||^2 up to the per-query constant ||q||^2
+            S = 2.0 * S - self.sq_norms
+        return S
+
+    def search(self, query_embedding, k: int = 50) -> list[dict]:
+        """Top-k [{"content", "asin"}] for one query embedding, best first."""
+        return self.search_batch(query_embedding, k)[0]
+
+    def search_batch(self, query_embeddings, k: int = 50) -> list[list[dict]]:
+        n = len(self)
+        if n == 0:
+            return [[] for _ in range(len(np.atleast_2d(query_embeddings)))]
+        S = self.scores(query_embeddings)
+        k = min(k, n)
+        out = []
+        for row in S:
+            top = np.argpartition(-row, k - 1)[:k] if k < n else np.arange(n)
+            top = top[np.argsort(-row[top], kind="stable")]
+            out.append([self.doc(i) for i in top])
+        return out
+
+
+def open_for_collection(index_root, collection, signature, verbose=False):
+    """Snapshot of a Chroma collection, rebuilt when the store's `signature` (store_signature) moves."""
+    fingerprint = f"{collection.count()}|{signature}"
+    index_dir = Path(index_root) / collection.name
+    index = ExactVectorIndex.open(index_dir, fingerprint)
+    if index is not None:
+        return index
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    if verbose:
+        print(f"[EXACT] Snapshotting '{collection.name}' ({len(data['ids'])} embeddings)")
+    asins = [(m or {}).get("asins", None) for m in data["metadatas"]]
+    return ExactVectorIndex.build(index_dir, data["embeddings"], data["documents"], asins,
+                                  space=collection_space(collection), fingerprint=fingerprint)
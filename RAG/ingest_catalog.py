@@ -0,0 +1,255 @@
+# ingest_catalog.py
+"""
+Incremental catalog ingestion into the RAG service's Chroma store.
+
+Reads the product catalog and the retail QnA pages (formats: catalog_docs.py),
+diffs them against what is already stored and only touches what changed:
+
+    unchanged   same key, same content hash      -> nothing (no embedding)
+    updated     same key, new content hash       -> re-embedded, upserted under its id
+    added       new key                          -> embedded, upserted (id = uuid5 of the key)
+    removed     key no longer in the source      -> deleted (unless --keep-missing)
+
+Documents are embedded with bge-small in large batches, exactly as
+llama-index's HuggingFaceEmbedding did for the prebuilt db (no text
+instruction, L2-normalized). The artifacts derived from a collection are
+refreshed in the same run, only for collections that changed:
+
+    BM25 index      delta upserts/deletes (RAG/bm25_index, see bm25_index.py)
+    ASIN index      rebuilt by DatabaseRouting when the store changes; checked here
+                    so every catalog ASIN resolves to its new text
+    router anchors  that collection's centroids in teleoracle_v2_anchors.npz,
+                    same number of centroids per owner as before (router_anchors.py)
+
+A refresh with nothing changed reads metadata only and never loads the model.
+The running RAG service picks up the new store and BM25 on its next query;
+it reads the anchors at startup.
+
+    python ingest_catalog.py --products data/products.json --qna data/policies/
+    python ingest_catalog.py --products data/products.json --dry-run
+"""
+import argparse
+import time
+import uuid
+from pathlib import Path
+
+import chromadb
+import numpy as np
+
+import router_anchors
+from asin_finder import ASINFinder
+from bm25_index import BM25Index, ids_fingerprint, open_for_collection, sync_with_collection
+from catalog_docs import content_hash, load_products, load_qna
+
+SERVICE_DIR = Path(__file__).resolve().parent
+
+CONFIG = {
+    "db_path": str(SERVICE_DIR / "db"),
+    "bm25_path": str(SERVICE_DIR / "bm25_index"),
+    "anchors_path": str(SERVICE_DIR / "teleoracle_v2_anchors.npz"),
+    "embed_model": "BAAI/bge-small-en-v1.5",
+    "embed_batch_size": 128,
+    "chunk_words": 120,            # QnA chunk size (words)
+    "default_anchor_budget": 16,   # centroids for an owner the anchors file doesn't know yet
+    "seed": 0,
+}
+
+
+def doc_id(collection_name: str, key: str) -> str:
+    # Deterministic: re-running after a crash upserts the same ids instead of duplicating
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"teleoracle/{collection_name}/{key}"))
+
+
+def stored_key(collection_name, meta, document=None):
+    """Key of a stored row: ASIN for products, content hash otherwise (hashed here for pre-ingest rows)."""
+    meta = meta or {}
+    if collection_name == "product":
+        return meta.get("asins")
+    return meta.get("content_hash") or (content_hash(document) if document is not None else None)
+
+
+# ==========================================
+# DIFF
+# ==========================================
+
+def plan_changes(collection, docs, delete_missing=True):
+    """
+    {"add", "update": [doc + "id"], "delete": [ids], "unchanged": n} for `docs`
+    (catalog_docs format) against the collection. Rows the prebuilt db stored
+    without a content_hash are hashed from their text.
+    """
+    stored = collection.get(include=["metadatas"])
+    legacy = [i for i, m in zip(stored["ids"], stored["metadatas"]) if not (m or {}).get("content_hash")]
+    texts = {}
+    if legacy:
+        got = collection.get(ids=legacy, include=["documents"])
+        texts = dict(zip(got["ids"], got["documents"]))
+
+    existing, duplicates = {}, []
+    for row_id, meta in zip(stored["ids"], stored["metadatas"]):
+        text = texts.get(row_id)
+        key = stored_key(collection.name, meta, text)
+        digest = (meta or {}).get("content_hash") or (content_hash(text) if text is not None else None)
+        if key is None or key in existing:
+            duplicates.append(row_id)
+        else:
+            existing[key] = (row_id, digest)
+
+    plan = {"add": [], "update": [], "delete": list(duplicates), "unchanged": 0}
+    for doc in docs:
+        hit = existing.pop(doc["key"], None)
+        if hit is None:
+            plan["add"].append({**doc, "id": doc_id(collection.name, doc["key"])})
+        elif hit[1] != doc["metadata"]["content_hash"]:
+            plan["update"].append({**doc, "id": hit[0]})
+        else:
+            plan["unchanged"] += 1
+    if delete_missing:
+        plan["delete"] += [row_id for row_id, _ in existing.values()]
+    return plan
+
+
+def has_changes(plan) -> bool:
+    return bool(plan["add"] or plan["update"] or plan["delete"])
+
+
+# ==========================================
+# APPLY
+# ==========================================
+
+class LazyEncoder:
+    """Loads bge-small on first use, so runs with nothing to embed stay cheap."""
+
+    def __init__(self, model_name, batch_size):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+
+    def encode(self, texts) -> np.ndarray:
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            t0 = time.perf_counter()
+            self._model = SentenceTransformer(self.model_name)
+            print(f"[INGEST] Loaded {self.model_name} in {time.perf_counter() - t0:.1f}s")
+        return self._model.encode(list(texts), batch_size=self.batch_size, convert_to_numpy=True,
+                                  normalize_embeddings=True, show_progress_bar=False)
+
+
+def apply_changes(client, collection, plan, encoder):
+    changed = plan["add"] + plan["update"]
+    max_batch = client.get_max_batch_size()
+    if changed:
+        t0 = time.perf_counter()
+        embeddings = encoder.encode(d["content"] for d in changed)
+        print(f"[INGEST] '{collection.name}': embedded {len(changed)} docs in {time.perf_counter() - t0:.2f}s")
+        for s in range(0, len(changed), max_batch):
+            batch = changed[s:s + max_batch]
+            collection.upsert(ids=[d["id"] for d in batch], embeddings=embeddings[s:s + max_batch],
+                              documents=[d["content"] for d in batch], metadatas=[d["metadata"] for d in batch])
+    for s in range(0, len(plan["delete"]), max_batch):
+        collection.delete(ids=plan["delete"][s:s + max_batch])
+
+
+def refresh_bm25(index_root, collection, plan):
+    """Apply the same upserts/deletes to the persisted BM25 index (full build if there is none)."""
+    index = BM25Index(Path(index_root) / collection.name)
+    try:
+        if not index.exists():
+            raise FileNotFoundError("no index yet")
+        index.open()
+    except (OSError, ValueError, KeyError):
+        open_for_collection(index_root, collection)
+        return
+    # One lock for the whole refresh: running RAG workers may sync the same index
+    with index.write_lock():
+        if plan["delete"]:
+            index.delete(plan["delete"])
+        changed = plan["add"] + plan["update"]
+        if changed:
+            index.upsert([d["id"] for d in changed], [d["content"] for d in changed],
+                         [d["metadata"].get("asins") for d in changed])
+        ids = collection.get(include=[])["ids"]
+        if ids_fingerprint(index.live_ids()) != ids_fingerprint(ids):
+            print(f"[BM25] '{collection.name}' ids drifted from Chroma, syncing")
+            sync_with_collection(index, collection, ids)
+
+
+def check_asin_index(collection, docs):
+    """Rebuild the ASIN index the way DatabaseRouting does and check every catalog ASIN against it."""
+    data = collection.get(include=["documents", "metadatas"])
+    finder = ASINFinder.from_documents(data["documents"], data["metadatas"])
+    stale = [d["key"] for d in docs if finder.products.get(d["key"]) != d["content"]]
+    if stale:
+        print(f"[INGEST] WARNING: {len(stale)} ASINs do not resolve to their catalog text: {stale[:5]}")
+    print(f"[INGEST] ASIN index: {len(finder)} products")
+
+
+def refresh_anchors(anchors_path, collections, default_budget, seed):
+    budgets = router_anchors.owner_budgets(anchors_path)
+    embeddings = {}
+    for col in collections:
+        budgets.setdefault(col.name, default_budget)
+        embeddings[col.name] = np.asarray(col.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+    built = router_anchors.refresh_owners(anchors_path, embeddings, budgets, seed=seed)
+    for owner, n in built.items():
+        print(f"[INGEST] Router anchors: {n} centroids for '{owner}'")
+
+
+# ==========================================
+# MAIN
+# ==========================================
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Incremental product / QnA ingestion for the RAG service")
+    p.add_argument("--products", help="product catalog (.json / .jsonl)")
+    p.add_argument("--qna", help="QnA pages: folder of .txt/.md, a page file, or .json / .jsonl records")
+    p.add_argument("--db", dest="db_path")
+    p.add_argument("--bm25", dest="bm25_path")
+    p.add_argument("--anchors", dest="anchors_path", help="router anchors npz to refresh ('' to skip)")
+    p.add_argument("--chunk-words", dest="chunk_words", type=int)
+    p.add_argument("--batch-size", dest="embed_batch_size", type=int)
+    p.add_argument("--keep-missing", action="store_true", help="do not delete documents missing from the source")
+    p.add_argument("--dry-run", action="store_true", help="print the diff and exit")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    cfg = dict(CONFIG)
+    cfg.update({k: v for k, v in vars(args).items() if v is not None and k in CONFIG})
+    if not args.products and not args.qna:
+        raise SystemExit("Nothing to ingest: pass --products and/or --qna")
+
+    t_start = time.perf_counter()
+    sources = []
+    if args.products:
+        sources.append(("product", load_products(args.products)))
+    if args.qna:
+        sources.append(("retail_qna", load_qna(args.qna, cfg["chunk_words"])))
+
+    client = chromadb.PersistentClient(path=cfg["db_path"])
+    encoder = LazyEncoder(cfg["embed_model"], cfg["embed_batch_size"])
+    changed = []
+    for name, docs in sources:
+        collection = client.get_or_create_collection(name)
+        plan = plan_changes(collection, docs, delete_missing=not args.keep_missing)
+        print(f"[INGEST] '{name}': {len(docs)} source docs | +{len(plan['add'])} added, "
+              f"~{len(plan['update'])} updated, -{len(plan['delete'])} removed, {plan['unchanged']} unchanged")
+        if args.dry_run or not has_changes(plan):
+            continue
+        apply_changes(client, collection, plan, encoder)
+        t0 = time.perf_counter()
+        refresh_bm25(cfg["bm25_path"], collection, plan)
+        print(f"[INGEST] '{name}': BM25 index refreshed in {time.perf_counter() - t0:.2f}s")
+        if name == "product":
+            check_asin_index(collection, docs)
+        changed.append(collection)
+
+    if changed and cfg["anchors_path"]:
+        refresh_anchors(cfg["anchors_path"], changed, cfg["default_anchor_budget"], cfg["seed"])
+    print(f"[INGEST] Done in {time.perf_counter() - t_start:.2f}s "
+          f"({'dry run' if args.dry_run else f'{len(changed)} collection(s) changed'})")
+
+
+if __name__ == "__main__":
+    main()
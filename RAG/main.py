@@ -1,33 +1,95 @@
-import uvicorn
+import time
+BOOT_T0 = time.perf_counter()
+
+import os
 import sys
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from ProposedRouter import *
-from DatabaseRouting import *
+import threading
+from pathlib import Path
+from startup import StartupReport
+
+# Boot breakdown (GET /startup): the heavy libraries are imported one by one here
+# only so each one's cost shows up separately; llama-index is deferred to the HNSW path
+STARTUP = StartupReport("RAG", t0=BOOT_T0)
+with STARTUP.phase("import fastapi"):
+    import uvicorn
+    from fastapi import FastAPI, HTTPException
+    from fastapi.responses import JSONResponse
+    from pydantic import BaseModel
+with STARTUP.phase("import torch"):
+    import torch
+with STARTUP.phase("import sentence_transformers"):
+    import sentence_transformers
+with STARTUP.phase("import chromadb"):
+    import chromadb
+with STARTUP.phase("import DatabaseRouting"):
+    from ProposedRouter import *
+    from DatabaseRouting import *
+from semantic_cache import SemanticCache
+
+# tracing.py lives at the repo root (one copy for the orchestrator and every service)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from tracing import Tracer
 
 # REMOVED: from asin_finder import ASINFinder
 
+# Paths relative to this file, so the service also loads in-process (orchestrator monolith mode)
+SERVICE_DIR = Path(__file__).resolve().parent
+
+# Set per worker by serve_workers.py: torch threads (cores / workers, so workers don't
+# oversubscribe the CPU) and the micro-batching window for encoder / reranker calls
+TORCH_THREADS = int(os.environ.get("RAG_TORCH_THREADS", "0"))
+MICRO_BATCH_MS = float(os.environ.get("RAG_MICRO_BATCH_MS", "0"))
+if TORCH_THREADS > 0:
+    torch.set_num_threads(TORCH_THREADS)
+
+# Paraphrase-level result cache in front of retrieval + reranking (per worker process)
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE = SemanticCache(max_entries=512, threshold=0.95)
+
 class RAGRequest(BaseModel):
     query: str
     asin: str = None
 
+class RAGBatchRequest(BaseModel):
+    queries: list[str]
+
 app = FastAPI()
+TRACER = Tracer("RAG")
+TRACER.install(app)
+
+
+# Set once the boot warmup query has gone through router, retrievers and reranker
+READY = threading.Event()
+
+
+@app.get("/ready")
+def ready():
+    # Models load at import time; the warmup runs after, so /ready answers 503 until it is done
+    if not READY.is_set():
+        return JSONResponse(status_code=503, content={"service": "RAG", "ready": False, "error": STARTUP.error})
+    return {"service": "RAG", "ready": True}
+
+
+@app.get("/startup")
+def startup_report():
+    """Import / model-load / warmup timings of this boot (phases on parallel threads overlap)."""
+    return STARTUP.summary()
 
 print("--- [RAG BOOT] Initializing Models... ---")
 
 try:
-    proposed_math_router = ClusterSemanticRouter(
-        anchors_path="teleoracle_v2_anchors.npz", 
-        threshold=0.6
-    )
-    
-    if 'model' not in globals():
-        print("⚠️ WARNING: 'model' variable not found via imports.")
-    
-    wrapped_proposed_router = ProposedRouterWrapper(proposed_math_router, model)
+    # Initialize Router (owns the only bge-small encoder in this process)
+    router = DatabaseRouting(db_path=str(SERVICE_DIR / "db"), verbose=True, use_length_sorting=True, tracer=TRACER,
+                             startup=STARTUP, micro_batch_ms=MICRO_BATCH_MS,
+                             semantic_cache=SEMANTIC_CACHE if SEMANTIC_CACHE_ENABLED else None)
+
+    with STARTUP.phase("load router anchors"):
+        proposed_math_router = ClusterSemanticRouter(
+            anchors_path=str(SERVICE_DIR / "teleoracle_v2_anchors.npz"), 
+            threshold=0.6
+        )
     
-    # Initialize Router
-    router = DatabaseRouting(db_path="db", verbose=True, use_length_sorting=True)
+    wrapped_proposed_router = ProposedRouterWrapper(proposed_math_router, router.encoder)
     
     # REMOVED: product_lookup = ASINFinder("product.json")
     print("--- [RAG BOOT] Models Loaded Successfully. ---")
@@ -37,6 +99,35 @@ except Exception as e:
     sys.exit(1)
 
 
+def build_context_response(predicted_db, search_results):
+    asins_found = []
+    formatted_context = ""
+
+    if not search_results:
+         formatted_context = "No products found."
+         trigger_carousel = False
+    
+    elif predicted_db == "product":
+        # Extract ASINs for React
+        asins_found = [item["asin"] for item in search_results if item["asin"]]
+        
+        # Format text for LLM
+        formatted_context = router.format_product_list(search_results)
+        trigger_carousel = len(asins_found) > 0
+    
+    else:
+        # For non-product queries (QnA), just join the text
+        formatted_context = "\n".join([item["content"] for item in search_results])
+        trigger_carousel = False
+
+    return {
+        "context": formatted_context,
+        "intent": predicted_db,
+        "trigger_carousel": trigger_carousel,
+        "asins": asins_found # <--- NEW: React needs this!
+    }
+
+
 @app.post("/get_context")
 def get_context(request: RAGRequest):
     print(f"\n[RAG] 📨 Received: {request.query}", flush=True)
@@ -47,7 +138,8 @@ def get_context(request: RAGRequest):
             print(f"[RAG] 🛑 Handling Exit for ASIN: {request.asin}", flush=True)
             
             # USE NEW METHOD IN ROUTER
-            context_str = router.get_product_by_asin(request.asin)
+            with TRACER.span("get_product_by_asin"):
+                context_str = router.get_product_by_asin(request.asin)
             
             return {
                 "context": context_str, 
@@ -58,44 +150,101 @@ def get_context(request: RAGRequest):
 
         # --- CASE 1 & 2: STANDARD SEARCH ---
         print("[RAG] 🧠 Routing...", flush=True)
-        predicted_db, confidence = wrapped_proposed_router.route(request.query)
+        # Encoded once; the same vector drives routing and the dense search
+        query_embedding = router.embed_query(request.query)
+        with TRACER.span("ProposedRouterWrapper.route"):
+            predicted_db, confidence = wrapped_proposed_router.route(request.query, embedding=query_embedding)
         print(f"[RAG] 🔍 Predicted: {predicted_db} ({confidence:.2f})", flush=True)
         
         # This now returns a list of DICTS: [{"content": "...", "asin": "B0..."}, ...]
-        search_results = router.query(request.query, predicted_db)
+        with TRACER.span("DatabaseRouting.query"):
+            search_results = router.query(request.query, predicted_db, query_embedding=query_embedding)
         
-        asins_found = []
-        formatted_context = ""
+        response = build_context_response(predicted_db, search_results)
+        print(f"[RAG] ✅ Done. Found {len(response['asins'])} ASINs.", flush=True)
+        return response
 
-        if not search_results:
-             formatted_context = "No products found."
-             trigger_carousel = False
-        
-        elif predicted_db == "product":
-            # Extract ASINs for React
-            asins_found = [item["asin"] for item in search_results if item["asin"]]
-            
-            # Format text for LLM
-            formatted_context = router.format_product_list(search_results)
-            trigger_carousel = len(asins_found) > 0
-        
-        else:
-            # For non-product queries (QnA), just join the text
-            formatted_context = "\n".join([item["content"] for item in search_results])
-            trigger_carousel = False
+    except Exception as e:
+        print(f"❌ [RAG ERROR]: {e}", flush=True)
+        raise HTTPException(status_code=500, detail=str(e))
 
-        print(f"[RAG] ✅ Done. Found {len(asins_found)} ASINs.", flush=True)
-        
-        return {
-            "context": formatted_context,
-            "intent": predicted_db,
-            "trigger_carousel": trigger_carousel,
-            "asins": asins_found # <--- NEW: React needs this!
-        }
+@app.post("/get_context_batch")
+def get_context_batch(request: RAGBatchRequest):
+    """
+    /get_context for many queries (offline eval, several kiosks at once): one
+    encoder call, one routing matrix product, per-collection retrieval and
+    shared length-bucketed reranker batches. Returns {"results": [...]} in
+    query order, each shaped like /get_context's response.
+    """
+    queries = request.queries
+    print(f"\n[RAG] 📨 Received batch of {len(queries)} queries", flush=True)
+    if not queries:
+        return {"results": []}
+
+    try:
+        query_embeddings = router.embed_queries(queries)
+        with TRACER.span("ProposedRouterWrapper.route_batch"):
+            predicted, confidences = wrapped_proposed_router.route_batch(queries, embeddings=query_embeddings)
+        print(f"[RAG] 🔍 Predicted: {dict(zip(*np.unique(predicted, return_counts=True)))}", flush=True)
+
+        with TRACER.span("DatabaseRouting.query_batch"):
+            search_results = router.query_batch(queries, predicted, query_embeddings)
+
+        results = [build_context_response(db, res) for db, res in zip(predicted, search_results)]
+        print(f"[RAG] ✅ Done. Batch of {len(results)}.", flush=True)
+        return {"results": results}
 
     except Exception as e:
         print(f"❌ [RAG ERROR]: {e}", flush=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/version")
+def get_version():
+    """Collection fingerprint; the orchestrator keys its response cache on it."""
+    return {"version": router.collection_version()}
+
+@app.get("/rerank_stats")
+def get_rerank_stats():
+    """Cross-encoder batching / padding-waste counters (length-aware batching on or off)."""
+    return router.rerank_stats()
+
+@app.get("/semantic_cache")
+def semantic_cache_stats():
+    """Hit rate / size of the semantic result cache (this worker)."""
+    return {**SEMANTIC_CACHE.stats(), "enabled": SEMANTIC_CACHE_ENABLED}
+
+@app.delete("/semantic_cache")
+def clear_semantic_cache():
+    SEMANTIC_CACHE.clear()
+    return {"status": "cleared"}
+
+# ==========================================
+# WARMUP
+# ==========================================
+
+# One query per collection, so the first shopper query is not the cold one
+WARMUP_QUERIES = {"product": "show me running shoes", "retail_qna": "what is your return policy?"}
+
+
+def warmup():
+    """embed -> route -> retrieval (vector + BM25) -> rerank for each collection, then flip /ready."""
+    try:
+        for target_db, query in WARMUP_QUERIES.items():
+            with STARTUP.phase(f"warmup: {target_db}"):
+                query_embedding = router.embed_query(query)
+                wrapped_proposed_router.route(query, embedding=query_embedding)
+                # Kept out of the semantic cache: neither served to shoppers nor counted in its hit rate
+                router.query(query, target_db, query_embedding=query_embedding, use_cache=False)
+    except Exception as e:
+        STARTUP.error = f"warmup failed: {e!r}"
+        print(f"❌ CRITICAL ERROR during RAG warmup: {e}", flush=True)
+        return
+    STARTUP.mark_ready()
+    READY.set()
+    STARTUP.print()
+
+
+threading.Thread(target=warmup, name="rag-warmup", daemon=True).start()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8002)
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""
+Request-level micro-batching for model calls.
+
+FastAPI runs the sync endpoints on a thread pool, so concurrent shopper
+queries reach the encoder and the cross-encoder as separate small calls.
+A MicroBatcher sits in front of one batched function: callers block in
+submit(item), a single worker thread takes the first waiting item, keeps
+collecting for up to `max_wait_ms` (or until `max_items`), runs
+fn(items) -> results once and hands each caller its own result.
+
+An idle service pays at most `max_wait_ms` extra per call; under load the
+model runs fewer, fuller batches.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_wait_ms: float = 2.0, max_items: int = 32, name: str = "micro-batch",
+                 size_of=None):
+        """
+        fn:        fn(list of items) -> list of results, same order
+        max_items: cap on the combined size of one batch
+        size_of:   size of an item against max_items (default 1; e.g. pair count for rerank jobs)
+        """
+        self.fn = fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_items = max_items
+        self.size_of = size_of or (lambda item: 1)
+        self._queue = queue.Queue()
+        self._stats = {"calls": 0, "batches": 0, "max_batch": 0}
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Run `item` in the next batch and return its result (re-raises the batch's exception)."""
+        future = Future()
+        self._queue.put((item, future))
+        return future.result()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            st = dict(self._stats)
+        st["avg_batch"] = round(st["calls"] / st["batches"], 2) if st["batches"] else 0.0
+        return st
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        size = self.size_of(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_items:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(entry)
+            size += self.size_of(entry[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = self.fn(items)
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            with self._stats_lock:
+                self._stats["calls"] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
@@ -0,0 +1,190 @@
+"""
+Pre-tokenized passages for the cross-encoder reranker.
+
+Passages only change on re-ingestion, so their token ids are computed once
+(keyed by content hash) and persisted per collection and tokenizer:
+
+    <cache_root>/<collection>/<tokenizer tag>.npz              keys, offsets, name of the ids file
+    <cache_root>/<collection>/<tokenizer tag>.<n>.ids.npy      flat token ids, memory-mapped
+
+The ids are mapped read-only, so RAG worker processes share one copy.
+
+At request time only the query is tokenized; model inputs are assembled as
+[CLS] query [SEP] passage [SEP] (token_type 0 / 1), which is what the BERT
+pair template produces, truncated "longest_first" to the model's max length.
+Exact pair lengths come for free for length-aware batching.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+def content_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def tokenizer_tag(tokenizer) -> str:
+    """Identifies the vocabulary + normalization; a different tokenizer gets its own cache file."""
+    # Not backend_tokenizer.to_str(): that also serializes the current truncation/padding state
+    h = hashlib.sha1()
+    h.update(f"{type(tokenizer).__name__}|{tokenizer.init_kwargs.get('do_lower_case')}|".encode("utf-8"))
+    h.update(json.dumps(sorted(tokenizer.get_vocab().items()), ensure_ascii=False).encode("utf-8"))
+    return f"{Path(str(tokenizer.name_or_path)).name}-{h.hexdigest()[:10]}"
+
+
+def supports(tokenizer) -> bool:
+    """Only the BERT-style pair template ([CLS] a [SEP] b [SEP]) is assembled by hand."""
+    return tokenizer.cls_token_id is not None and tokenizer.sep_token_id is not None
+
+
+def truncate_pair(n_query: int, n_passage: int, budget: int) -> tuple[int, int]:
+    """'longest_first': drop tokens from whichever side is longer until both fit."""
+    if n_query + n_passage <= budget:
+        return n_query, n_passage
+    if n_query <= budget // 2:
+        return n_query, budget - n_query
+    if n_passage <= budget // 2:
+        return budget - n_passage, n_passage
+    # Both over half: the longer side keeps the odd token (the query on a strict tie loses it)
+    if n_query > n_passage:
+        return budget - budget // 2, budget // 2
+    return budget // 2, budget - budget // 2
+
+
+class PassageTokenCache:
+    def __init__(self, tokenizer, cache_dir, max_length: int | None = None):
+        self.tokenizer = tokenizer
+        self.max_length = min(max_length or tokenizer.model_max_length, 512)
+        self.path = Path(cache_dir) / f"{tokenizer_tag(tokenizer)}.npz"
+        self.with_token_types = "token_type_ids" in tokenizer.model_input_names
+        self._ids = {}  # content hash -> np.int32 token ids (no special tokens)
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self):
+        return len(self._ids)
+
+    # ---------- persistence ----------
+
+    def _load(self):
+        if not self.path.is_file():
+            return
+        try:
+            with np.load(self.path) as data:
+                keys, offsets = data["keys"], data["offsets"]
+                flat = np.load(self.path.parent / str(data["ids_file"]), mmap_mode="r")
+            for i, key in enumerate(keys):
+                self._ids[str(key)] = flat[offsets[i]:offsets[i + 1]]
+        except (OSError, KeyError, ValueError) as e:
+            print(f"[TOKENS] Ignoring unreadable cache {self.path}: {e}")
+            self._ids = {}
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            keys = list(self._ids)
+            arrays = [self._ids[k] for k in keys]
+            offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+            np.cumsum([len(a) for a in arrays], out=offsets[1:])
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Unique names: other worker processes may be saving (or mapping) this cache too
+            unique = f"{os.getpid()}-{time.time_ns()}"
+            ids_file = f"{self.path.stem}.{unique}.ids.npy"
+            np.save(self.path.parent / ids_file, np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.int32))
+            tmp = self.path.with_name(f"{self.path.stem}.{unique}.tmp.npz")
+            np.savez(tmp, keys=np.asarray(keys), offsets=offsets, ids_file=np.asarray(ids_file))
+            os.replace(tmp, self.path)
+            self._dirty = False
+            self._remove_stale(ids_file)
+
+    def _remove_stale(self, current, min_age_s: float = 60.0):
+        # Older ids files; young ones may belong to a save racing this one. Still-mapped
+        # files cannot be deleted on Windows: skipped, retried on the next save.
+        now = time.time()
+        for f in self.path.parent.glob(f"{self.path.stem}.*.ids.npy"):
+            try:
+                if f.name != current and now - f.stat().st_mtime > min_age_s:
+                    f.unlink()
+            except OSError:
+                pass
+
+    def prune(self, texts):
+        """Keep only entries for `texts` (the collection's current documents)."""
+        keep = {content_key(t) for t in texts}
+        with self._lock:
+            stale = [k for k in self._ids if k not in keep]
+            for k in stale:
+                del self._ids[k]
+            self._dirty = self._dirty or bool(stale)
+
+    # ---------- lookup ----------
+
+    def _encode(self, texts):
+        # Untruncated: longest_first needs both full lengths to decide which side to cut
+        encoded = self.tokenizer(list(texts), add_special_tokens=False, verbose=False)["input_ids"]
+        return [np.asarray(ids, dtype=np.int32) for ids in encoded]
+
+    def passage_ids(self, texts) -> list[np.ndarray]:
+        """Token ids for each passage; anything unseen is tokenized (once) and remembered."""
+        keys = [content_key(t) for t in texts]
+        with self._lock:
+            missing = list({k: t for k, t in zip(keys, texts) if k not in self._ids}.items())
+            if missing:
+                for (key, _), ids in zip(missing, self._encode(t for _, t in missing)):
+                    self._ids[key] = ids
+                self._dirty = True
+            return [self._ids[k] for k in keys]
+
+    def warm(self, texts):
+        self.passage_ids(texts)
+        self.prune(texts)
+        self.save()
+
+    def query_ids(self, query: str) -> np.ndarray:
+        return self._encode([query])[0]
+
+    # ---------- model inputs ----------
+
+    def pair_lengths(self, pairs) -> np.ndarray:
+        """Exact model input length of each (query ids, passage ids) pair."""
+        budget = self.max_length - 3
+        return np.fromiter((sum(truncate_pair(len(q), len(p), budget)) + 3 for q, p in pairs),
+                           dtype=np.int64, count=len(pairs))
+
+    def build_batch(self, pairs) -> dict:
+        """
+        Padded numpy input_ids / attention_mask (/ token_type_ids) for one batch
+        of (query ids, passage ids) pairs; the queries may differ (batched requests).
+        """
+        tok = self.tokenizer
+        budget = self.max_length - 3
+        rows = []
+        for q, p in pairs:
+            nq, np_ = truncate_pair(len(q), len(p), budget)
+            rows.append((q[:nq], p[:np_]))
+        width = max(len(q) + len(p) + 3 for q, p in rows)
+        pad = tok.pad_token_id if tok.pad_token_id is not None else 0
+        input_ids = np.full((len(rows), width), pad, dtype=np.int64)
+        attention = np.zeros((len(rows), width), dtype=np.int64)
+        types = np.zeros((len(rows), width), dtype=np.int64)
+        for r, (q, p) in enumerate(rows):
+            a = len(q) + 2
+            n = a + len(p) + 1
+            input_ids[r, 0] = tok.cls_token_id
+            input_ids[r, 1:a - 1] = q
+            input_ids[r, a - 1] = tok.sep_token_id
+            input_ids[r, a:n - 1] = p
+            input_ids[r, n - 1] = tok.sep_token_id
+            attention[r, :n] = 1
+            types[r, a:n] = 1
+        batch = {"input_ids": input_ids, "attention_mask": attention}
+        if self.with_token_types:
+            batch["token_type_ids"] = types
+        return batch
@@ -0,0 +1,100 @@
+"""
+Anchors for ClusterSemanticRouter: unit-norm centroids of each collection's
+document embeddings, stored as teleoracle_v2_anchors.npz
+
+    centroids   (n_anchors, dim) float32, L2-normalized
+    owners      (n_anchors,) str, the collection each centroid routes to
+
+Centroids come from spherical k-means (cosine, k-means++ seeding, fixed
+seed) over the embeddings already in Chroma, so no model is needed.
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+def _normalize(X):
+    return X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+
+
+def spherical_kmeans(X, k: int, iterations: int = 50, seed: int = 0) -> np.ndarray:
+    """(k, dim) unit centroids of the rows of X; every row is its own centroid when k >= len(X)."""
+    X = _normalize(np.asarray(X, dtype=np.float32))
+    n = len(X)
+    if k >= n:
+        return X.copy()
+    rng = np.random.default_rng(seed)
+
+    # k-means++ seeding on cosine distance
+    centers = [int(rng.integers(n))]
+    dist = 1.0 - X @ X[centers[0]]
+    for _ in range(1, k):
+        p = np.maximum(dist, 0.0) ** 2
+        idx = int(rng.choice(n, p=p / p.sum())) if p.sum() > 0 else int(rng.integers(n))
+        centers.append(idx)
+        dist = np.minimum(dist, 1.0 - X @ X[idx])
+    C = X[centers].copy()
+
+    labels = None
+    for _ in range(iterations):
+        new_labels = (X @ C.T).argmax(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        sums = np.zeros_like(C)
+        np.add.at(sums, labels, X)
+        empty = ~np.bincount(labels, minlength=k).astype(bool)
+        if empty.any():
+            # Re-seed empty clusters on the points worst served by their centroid
+            worst = np.argsort((X * C[labels]).sum(axis=1))[:empty.sum()]
+            sums[empty] = X[worst]
+        C = _normalize(sums)
+    return C.astype(np.float32)
+
+
+def load_anchors(path):
+    """(centroids, owners) or (None, None) when the file does not exist."""
+    if not Path(path).is_file():
+        return None, None
+    with np.load(path) as data:
+        return data["centroids"], data["owners"]
+
+
+def save_anchors(path, centroids, owners):
+    """Atomic write, so a router starting mid-refresh never reads half a file."""
+    path = Path(path)
+    tmp = path.with_name(path.stem + ".tmp.npz")
+    np.savez(tmp, centroids=np.asarray(centroids, dtype=np.float32), owners=np.asarray(owners, dtype=str))
+    os.replace(tmp, path)
+
+
+def owner_budgets(path) -> dict:
+    """Current centroid count per owner in an anchors file ({} if there is none)."""
+    _, owners = load_anchors(path)
+    if owners is None:
+        return {}
+    names, counts = np.unique(owners, return_counts=True)
+    return {str(o): int(c) for o, c in zip(names, counts)}
+
+
+def refresh_owners(path, embeddings_by_owner: dict, budgets: dict, seed: int = 0):
+    """
+    Recompute the centroids of the given owners (collection -> (n, dim) embeddings)
+    with budgets[owner] clusters each; other owners' anchors are kept as they are.
+    Returns {owner: n_centroids} for the owners that were rebuilt.
+    """
+    centroids, owners = load_anchors(path)
+    keep = np.ones(0, dtype=bool) if owners is None else ~np.isin(owners, list(embeddings_by_owner))
+    parts_c = [] if owners is None else [centroids[keep]]
+    parts_o = [] if owners is None else [owners[keep].astype(str)]
+    built = {}
+    for owner, X in embeddings_by_owner.items():
+        if len(X) == 0:
+            continue
+        C = spherical_kmeans(X, budgets[owner], seed=seed)
+        parts_c.append(C)
+        parts_o.append(np.full(len(C), owner))
+        built[owner] = len(C)
+    save_anchors(path, np.concatenate(parts_c), np.concatenate(parts_o))
+    return built
@@ -0,0 +1,108 @@
+"""
+Semantic result cache for DatabaseRouting.query.
+
+Shoppers paraphrase ("running shoes", "shoes for running"), so exact-text
+keys (response_cache.py) miss most repeats. This cache keys on the query
+embedding every request already has (it drives ClusterSemanticRouter): a
+lookup takes the most similar recent query routed to the same collection
+and, if the cosine similarity is at least `threshold`, returns that query's
+fused + reranked result list, skipping retrieval, BM25 and the
+cross-encoder.
+
+Embeddings sit in one preallocated (max_entries, dim) matrix, so a lookup is
+a single matrix-vector product. The least recently used entry is evicted once
+`max_entries` is reached. Entries belong to one store `version`; a lookup or
+insert under a different version drops them all, so a re-ingested collection
+never serves old results.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticCache:
+    def __init__(self, max_entries: int = 512, threshold: float = 0.95):
+        """
+        max_entries: cached queries across all collections (LRU beyond that)
+        threshold:   minimum cosine similarity (embeddings are L2-normalized) for a hit
+        """
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.version = None
+        self._emb = None                                       # (max_entries, dim), allocated on first put
+        self._owner = np.full(max_entries, None, dtype=object)  # collection per slot, None = free
+        self._lru: OrderedDict = OrderedDict()                 # slot -> results, least recent first
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "inserts": 0, "evictions": 0, "invalidations": 0}
+        self._by_collection = {}  # collection -> {"hits", "misses"}
+        self._hit_similarity = 0.0
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self._lru:
+                self._stats["invalidations"] += 1
+            self._lru.clear()
+            self._owner[:] = None
+            self.version = version
+
+    def _count(self, collection, key):
+        self._stats[key] += 1
+        self._by_collection.setdefault(collection, {"hits": 0, "misses": 0})[key] += 1
+
+    def get(self, embedding, collection, version):
+        """Cached results of the closest query routed to `collection` if it clears the threshold, else None."""
+        with self._lock:
+            self._check_version(version)
+            if self._lru:
+                candidates = np.flatnonzero(self._owner == collection)
+                if len(candidates):
+                    sims = self._emb[candidates] @ np.asarray(embedding, dtype=np.float32)
+                    best = int(np.argmax(sims))
+                    if sims[best] >= self.threshold:
+                        slot = int(candidates[best])
+                        self._lru.move_to_end(slot)
+                        self._count(collection, "hits")
+                        self._hit_similarity += float(sims[best])
+                        return list(self._lru[slot])
+            self._count(collection, "misses")
+            return None
+
+    def put(self, embedding, collection, version, results):
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._check_version(version)
+            if self._emb is None:
+                self._emb = np.zeros((self.max_entries, embedding.shape[-1]), dtype=np.float32)
+            if len(self._lru) >= self.max_entries:
+                slot, _ = self._lru.popitem(last=False)
+                self._stats["evictions"] += 1
+            else:
+                slot = int(np.flatnonzero(self._owner == None)[0])  # noqa: E711 (elementwise)
+            self._emb[slot] = embedding
+            self._owner[slot] = collection
+            self._lru[slot] = list(results)
+            self._stats["inserts"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self._owner[:] = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            st = dict(self._stats)
+            lookups = st["hits"] + st["misses"]
+            st.update({
+                "entries": len(self._lru),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hit_rate": round(st["hits"] / lookups, 4) if lookups else 0.0,
+                "avg_hit_similarity": round(self._hit_similarity / st["hits"], 4) if st["hits"] else 0.0,
+                "by_collection": {
+                    name: {**c, "hit_rate": round(c["hits"] / (c["hits"] + c["misses"]), 4)
+                           if c["hits"] + c["misses"] else 0.0}
+                    for name, c in self._by_collection.items()
+                },
+            })
+        return st
@@ -0,0 +1,108 @@
+# serve_workers.py
+"""
+Runs the RAG service as N uvicorn worker processes on one port.
+
+Every worker loads its own bge-small encoder and cross-encoder (models are
+not shared across processes), but the big per-collection artifacts are
+files the workers map read-only, so the OS page cache holds one copy:
+
+    exact_index/<collection>      embeddings .npy + docs.jsonl   (exact_index.py, np.load mmap)
+    bm25_index/<collection>       postings / doc store            (bm25_index.py)
+    rerank_tokens/<collection>    passage token ids .npy          (passage_tokens.py, mmap)
+
+prepare() builds or refreshes all of them once in this (parent) process
+before the workers start, so N workers don't race to snapshot the same
+collection at boot. Each worker gets cores // N torch threads and, with
+--micro-batch-ms > 0, coalesces concurrent encoder / reranker calls
+(micro_batch.py).
+
+    python serve_workers.py --workers 4
+    python serve_workers.py --workers 2 --micro-batch-ms 3
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+
+import chromadb
+import uvicorn
+
+import exact_index
+import passage_tokens
+from bm25_index import open_for_collection
+from passage_tokens import PassageTokenCache
+
+SERVICE_DIR = Path(__file__).resolve().parent
+
+CONFIG = {
+    "host": "127.0.0.1",
+    "port": 8002,
+    "workers": 2,
+    "micro_batch_ms": 0.0,        # 0 = off; a few ms pays off once several queries are in flight
+    "torch_threads": None,        # per worker; None = cores // workers
+    "db_path": str(SERVICE_DIR / "db"),
+    "bm25_path": str(SERVICE_DIR / "bm25_index"),
+    "exact_index_path": str(SERVICE_DIR / "exact_index"),
+    "token_cache_path": str(SERVICE_DIR / "rerank_tokens"),
+}
+
+
+def prepare(cfg):
+    """Build / refresh the shared on-disk indexes for every collection (no models loaded)."""
+    t0 = time.perf_counter()
+    client = chromadb.PersistentClient(path=cfg["db_path"])
+    signature = exact_index.store_signature(cfg["db_path"])
+
+    tokenizer = None
+    try:
+        from transformers import AutoTokenizer
+        from DatabaseRouting import RERANK_MODEL
+        tokenizer = AutoTokenizer.from_pretrained(RERANK_MODEL)
+    except Exception as e:
+        print(f"[WORKERS] Rerank tokenizer unavailable ({e}); workers will build the token cache")
+    if tokenizer is not None and not passage_tokens.supports(tokenizer):
+        tokenizer = None
+
+    for col in client.list_collections():
+        collection = client.get_collection(col.name)
+        count = collection.count()
+        if count <= exact_index.EXACT_SEARCH_MAX:
+            exact_index.open_for_collection(cfg["exact_index_path"], collection, signature, verbose=True)
+        open_for_collection(cfg["bm25_path"], collection)
+        if tokenizer is not None:
+            documents = collection.get(include=["documents"])["documents"]
+            PassageTokenCache(tokenizer, Path(cfg["token_cache_path"]) / collection.name).warm(documents)
+        print(f"[WORKERS] '{collection.name}' ({count} docs) ready to share")
+    print(f"[WORKERS] Shared indexes prepared in {time.perf_counter() - t0:.2f}s")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Serve the RAG service from several worker processes")
+    p.add_argument("--workers", type=int)
+    p.add_argument("--host")
+    p.add_argument("--port", type=int)
+    p.add_argument("--micro-batch-ms", dest="micro_batch_ms", type=float)
+    p.add_argument("--torch-threads", dest="torch_threads", type=int)
+    p.add_argument("--skip-prepare", action="store_true", help="start the workers without refreshing indexes")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    cfg = dict(CONFIG)
+    cfg.update({k: v for k, v in vars(args).items() if v is not None and k in CONFIG})
+
+    if not args.skip_prepare:
+        prepare(cfg)
+
+    # Read by main.py in every worker (uvicorn spawns them, they inherit the environment)
+    threads = cfg["torch_threads"] or max(1, (os.cpu_count() or 1) // cfg["workers"])
+    os.environ["RAG_TORCH_THREADS"] = str(threads)
+    os.environ["RAG_MICRO_BATCH_MS"] = str(cfg["micro_batch_ms"])
+    print(f"[WORKERS] {cfg['workers']} workers x {threads} torch threads on {cfg['host']}:{cfg['port']} "
+          f"(micro-batch {cfg['micro_batch_ms']} ms)")
+    uvicorn.run("main:app", host=cfg["host"], port=cfg["port"], workers=cfg["workers"], app_dir=str(SERVICE_DIR))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Boot-time breakdown for the RAG service: how long each import, model load
+and warmup step took, and which of them overlapped (models load on parallel
+threads). Served on GET /startup and printed once the service is ready.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupReport:
+    def __init__(self, service: str, t0: float | None = None):
+        self.service = service
+        self.t0 = t0 if t0 is not None else time.perf_counter()
+        self.phases = []  # {"name", "thread", "start_s", "duration_s"}
+        self.ready_s = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.phases.append({"name": name, "thread": threading.current_thread().name,
+                                    "start_s": round(start - self.t0, 3), "duration_s": round(end - start, 3)})
+
+    def mark_ready(self):
+        self.ready_s = round(time.perf_counter() - self.t0, 3)
+
+    def summary(self) -> dict:
+        with self._lock:
+            phases = sorted(self.phases, key=lambda p: p["start_s"])
+        return {"service": self.service, "ready": self.ready_s is not None, "ready_s": self.ready_s,
+                "error": self.error, "phases": phases}
+
+    def print(self):
+        s = self.summary()
+        print(f"--- [{self.service} BOOT] Startup report (ready after {s['ready_s']}s) ---")
+        for p in s["phases"]:
+            print(f"  {p['start_s']:>7.2f}s +{p['duration_s']:>6.2f}s  {p['name']:<42} [{p['thread']}]")
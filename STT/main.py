@@ -1,9 +1,23 @@
+import sys
+from pathlib import Path
 from fastapi import FastAPI, Request
 import numpy as np
 from faster_whisper import WhisperModel
 import uvicorn
 
+# tracing.py lives at the repo root (one copy for the orchestrator and every service)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from tracing import Tracer
+
 app = FastAPI(title="PUMA Holographic Assistant - STT Service")
+TRACER = Tracer("STT")
+TRACER.install(app)
+
+
+@app.get("/ready")
+def ready():
+    # Models load at import time, before uvicorn binds the port: answering means warm
+    return {"service": "STT", "ready": True}
 
 print("[SERVER] Loading Whisper model (large-v3)...")
 model = WhisperModel("large-v3", device="cuda", compute_type="float16")
@@ -15,13 +29,16 @@ async def transcribe(request: Request):
     body = await request.body()
     
     # Convert buffer to the format Whisper expects
-    audio_int16 = np.frombuffer(body, dtype=np.int16)
-    audio_fp32 = audio_int16.astype(np.float32) / 32767.0
+    with TRACER.span("decode_audio"):
+        audio_int16 = np.frombuffer(body, dtype=np.int16)
+        audio_fp32 = audio_int16.astype(np.float32) / 32767.0
     
     # 2. Transcription Phase
     # We specify language="en" to avoid the model "guessing" and adding latency
-    segments, _ = model.transcribe(audio_fp32, language="en", beam_size=5)
-    text = "".join(seg.text for seg in segments).strip()
+    # (segments is lazy - decoding happens while joining, so both are in the span)
+    with TRACER.span("whisper.transcribe"):
+        segments, _ = model.transcribe(audio_fp32, language="en", beam_size=5)
+        text = "".join(seg.text for seg in segments).strip()
     
     print(f"[STT Result] {text}")
 
@@ -1,5 +1,6 @@
 import os
 import subprocess
+import sys
 import uvicorn
 from fastapi import FastAPI, Request
 from pydantic import BaseModel
@@ -21,33 +22,46 @@ else:
 # Import your existing class logic
 # (Assuming your provided code is in a file named xtts_logic.py in the same folder)
 from TTS_fyp import XTTSEngine 
+from phrase_cache import PhraseCache, load_phrase_list, voice_id
+# tracing.py lives at the repo root (one copy for the orchestrator and every service)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from tracing import Tracer
 
 app = FastAPI(title="PUMA Holographic Assistant - TTS Service")
+TRACER = Tracer("TTS")
+TRACER.install(app)
+
+
+@app.get("/ready")
+def ready():
+    # Models load at import time, before uvicorn binds the port: answering means warm
+    return {"service": "TTS", "ready": True}
 
 # --- CONFIGURATION ---
-RHUBARB_PATH = str(Path("../rhubarb/rhubarb.exe").resolve())
-OUTPUT_DIR = Path("outputs_xtts")
-SPEAKER_WAV = "sample.wav" ## clone voice, None use default
+# Paths relative to this file, so the service also loads in-process (orchestrator monolith mode)
+SERVICE_DIR = Path(__file__).resolve().parent
+RHUBARB_PATH = str((SERVICE_DIR / "../rhubarb/rhubarb.exe").resolve())
+OUTPUT_DIR = SERVICE_DIR / "outputs_xtts"
+SPEAKER_WAV = str(SERVICE_DIR / "sample.wav") ## clone voice, None use default
+# Phrases pre-rendered at boot (goodbye, fallbacks, greetings); see phrase_cache.py
+CANNED_PHRASES_FILE = os.environ.get("TTS_CANNED_PHRASES", str(SERVICE_DIR / "canned_phrases.json"))
 
 # Initialize the engine once on startup
 print("[TTS] Loading XTTS Model to GPU...")
 engine = XTTSEngine(
     speaker_wav=SPEAKER_WAV,
     speaker="Ana Florence",
+    out_dir=str(OUTPUT_DIR),
     voice_mode="auto"
 )
 
-@app.post("/generate_speech")
-async def generate_speech(request: Request):
-    data = await request.json()
-    text = data.get("text", "")
-    
-    if not text:
-        return {"error": "No text provided"}
 
+def synthesize(text, wav_file_path=None):
+    """XTTS wav + Rhubarb visemes (same name, .json). Returns the wav path."""
     # 1. Generate the Audio File (.wav)
     # This uses your existing logic to save a timestamped file
-    wav_file_path = engine.speak(text)
+    with TRACER.span("tts_to_file"):
+        wav_file_path = engine.speak(text, file_path=wav_file_path)
     
     # 2. Run Rhubarb for Lip-Sync (.json)
     # We name the json the same as the wav file
@@ -56,14 +70,41 @@ async def generate_speech(request: Request):
     print(f"[RHUBARB] Generating visemes for {Path(wav_file_path).name}...")
     try:
         # Command: rhubarb.exe -f json -o output.json input.wav
-        subprocess.run([
-            RHUBARB_PATH, 
-            "-f", "json", 
-            "-o", json_file_path, 
-            wav_file_path
-        ], check=True)
+        with TRACER.span("rhubarb"):
+            subprocess.run([
+                RHUBARB_PATH, 
+                "-f", "json", 
+                "-o", json_file_path, 
+                wav_file_path
+            ], check=True)
     except Exception as e:
         print(f"[ERROR] Rhubarb failed: {e}")
+    return wav_file_path
+
+
+# --- PHRASE CACHE (warmed once the model is up) ---
+PHRASES = PhraseCache(OUTPUT_DIR)
+PHRASES.warm(load_phrase_list(CANNED_PHRASES_FILE), voice_id(engine), engine.language, synthesize)
+
+
+def speech_files(text: str, cache: bool = False) -> dict:
+    """
+    Render `text` (or reuse a cached phrase) and describe the files. Shared by
+    the HTTP endpoint and the orchestrator's in-process transport.
+    """
+    # Canned phrases are served from disk; pass cache=True to store a new one
+    voice = voice_id(engine)
+    cached = PHRASES.lookup(text, voice, engine.language)
+    if cached is not None:
+        TRACER.record("phrase_cache.hit", 0.0)
+        wav_file_path, filename = str(cached), PHRASES.filename(cached.stem)
+    elif cache:
+        wav, _ = PHRASES.render(text, voice, engine.language, synthesize)
+        wav_file_path, filename = str(wav), PHRASES.filename(wav.stem)
+    else:
+        wav_file_path = synthesize(text)
+        filename = Path(wav_file_path).name
+    json_file_path = wav_file_path.replace(".wav", ".json")
 
     # 3. Return paths to the Orchestrator
     # The Orchestrator will then tell React where to find these files
@@ -71,8 +112,20 @@ async def generate_speech(request: Request):
         "status": "success",
         "audio_path": str(Path(wav_file_path).absolute()),
         "viseme_path": str(Path(json_file_path).absolute()),
-        "filename": Path(wav_file_path).name
+        "filename": filename,
+        "cached": cached is not None,
     }
 
+
+@app.post("/generate_speech")
+async def generate_speech(request: Request):
+    data = await request.json()
+    text = data.get("text", "")
+    
+    if not text:
+        return {"error": "No text provided"}
+
+    return speech_files(text, cache=bool(data.get("cache")))
+
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8003)
\ No newline at end of file
@@ -0,0 +1,99 @@
+"""
+Content-addressed cache for canned phrases (goodbye, fallbacks, greetings).
+
+A phrase is rendered once (XTTS wav + Rhubarb viseme json) and stored as
+outputs_xtts/phrases/<sha1(text|voice|language)>.wav/.json, so asking for the
+same sentence in the same voice again is a file lookup instead of a GPU run.
+Changing the voice (other speaker / re-recorded sample.wav) or the language
+gives new keys, so stale audio is never served.
+"""
+import hashlib
+import json
+import re
+from pathlib import Path
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", (text or "")).strip()
+
+
+_sample_digests: dict[tuple, str] = {}
+
+
+def voice_id(engine) -> str:
+    """Stable id for the voice an XTTSEngine will currently use."""
+    mode, value = engine._resolve_voice()
+    if mode == "clone":
+        # Tie cloned-voice entries to the sample's contents, not just its name
+        stat = Path(value).stat()
+        sig = (value, stat.st_size, stat.st_mtime_ns)
+        if sig not in _sample_digests:
+            _sample_digests[sig] = hashlib.sha1(Path(value).read_bytes()).hexdigest()[:12]
+        return f"clone:{Path(value).name}:{_sample_digests[sig]}"
+    return f"default:{value}"
+
+
+def load_phrase_list(path) -> list[str]:
+    """Read the boot-time phrase list (JSON array of strings). Missing file = no phrases."""
+    path = Path(path)
+    if not path.is_file():
+        print(f"[PHRASES] No phrase list at {path}, skipping warmup")
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        phrases = json.load(f)
+    return [p for p in (normalize_text(p) for p in phrases) if p]
+
+
+class PhraseCache:
+    def __init__(self, out_dir, subdir: str = "phrases"):
+        """
+        out_dir: the TTS output folder the orchestrator serves under /audio
+        subdir:  cache folder inside it (returned filenames are relative to out_dir)
+        """
+        self.out_dir = Path(out_dir)
+        self.subdir = subdir
+        (self.out_dir / subdir).mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(text: str, voice: str, language: str) -> str:
+        raw = f"{normalize_text(text)}\x1f{voice}\x1f{language}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def wav_path(self, key: str) -> Path:
+        return self.out_dir / self.subdir / f"{key}.wav"
+
+    def filename(self, key: str) -> str:
+        """Name relative to out_dir, i.e. what the orchestrator puts after /audio/."""
+        return f"{self.subdir}/{key}.wav"
+
+    def lookup(self, text: str, voice: str, language: str):
+        """Return the cached wav path, or None unless both wav and visemes exist."""
+        wav = self.wav_path(self.key(text, voice, language))
+        if wav.is_file() and wav.with_suffix(".json").is_file():
+            return wav
+        return None
+
+    def render(self, text: str, voice: str, language: str, synthesize) -> tuple[Path, bool]:
+        """
+        Return (wav_path, was_cached). On a miss `synthesize(text, wav_path)`
+        must write the wav and its .json visemes next to it.
+        """
+        cached = self.lookup(text, voice, language)
+        if cached is not None:
+            return cached, True
+        wav = self.wav_path(self.key(text, voice, language))
+        synthesize(normalize_text(text), str(wav))
+        return wav, False
+
+    def warm(self, phrases, voice: str, language: str, synthesize) -> dict:
+        """Pre-render every phrase that is not cached yet. Returns {text: filename}."""
+        rendered = {}
+        for text in phrases:
+            try:
+                wav, hit = self.render(text, voice, language, synthesize)
+            except Exception as e:
+                print(f"[PHRASES] Failed to render {text!r}: {e}")
+                continue
+            rendered[text] = self.filename(wav.stem)
+            print(f"[PHRASES] {'cached ' if hit else 'rendered'} {wav.name} <- {text!r}")
+        return rendered
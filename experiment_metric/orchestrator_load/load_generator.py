@@ -0,0 +1,213 @@
+# load_generator.py
+"""
+Drive the orchestrator from N simulated kiosks and report latency percentiles.
+
+Each kiosk is a coroutine with its own X-Kiosk-Id that loops: pick an action
+(/process with a short wav, /process_text or /gesture_command) by weight, send
+it, sleep a think time. With `barge_in_rate` > 0 a kiosk sometimes fires its
+next request before the previous one finished, to exercise cancellation.
+
+Reports per-endpoint count / errors / superseded and p50/p95/p99/max, plus the
+orchestrator's own stage stats from GET /metrics. Run against the stand-ins
+(stand_in_services.py) for GPU-free numbers.
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import struct
+import time
+import wave
+from collections import defaultdict
+
+import httpx
+
+CONFIG = {
+    "base_url": "http://127.0.0.1:5000",
+    "kiosks": 4,
+    "duration_s": 60.0,
+    "think_time_s": (1.0, 3.0),      # uniform pause between a kiosk's requests
+    "barge_in_rate": 0.1,            # chance to send the next request without waiting
+    "weights": {"process_text": 0.6, "process": 0.25, "gesture_command": 0.15},
+    "gestures": ["swipe_left", "swipe_right", "grab", "expand"],
+    "queries": [
+        "show me running shoes",
+        "what's the return policy",
+        "do you have black sneakers for women",
+        "how long does delivery take",
+        "I want something for basketball",
+        "can I pay with a gift card",
+    ],
+    "timeout_s": 120.0,
+    "report_path": "./reports/load_report.json",
+    "seed": 0,
+}
+
+
+def percentile(sorted_values, q):
+    # nearest-rank, same as tracing.py
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def silent_wav(seconds: float = 1.0, rate: int = 16000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(struct.pack("<h", 0) * int(seconds * rate))
+    return buf.getvalue()
+
+
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)   # endpoint -> [ms] of successful calls
+        self.errors = defaultdict(int)
+        self.superseded = defaultdict(int)
+        self.error_samples = defaultdict(list)
+
+    def add(self, endpoint, ms, ok, superseded=False, error=None):
+        if superseded:
+            self.superseded[endpoint] += 1
+        if ok:
+            self.latencies[endpoint].append(ms)
+        else:
+            self.errors[endpoint] += 1
+            if error and len(self.error_samples[endpoint]) < 5:
+                self.error_samples[endpoint].append(error)
+
+    def summary(self, elapsed_s: float) -> dict:
+        out = {}
+        endpoints = set(self.latencies) | set(self.errors)
+        for ep in sorted(endpoints):
+            values = sorted(self.latencies[ep])
+            total = len(values) + self.errors[ep]
+            out[ep] = {
+                "requests": total,
+                "ok": len(values),
+                "errors": self.errors[ep],
+                "error_rate": round(self.errors[ep] / total, 4) if total else 0.0,
+                "superseded": self.superseded[ep],
+                "throughput_rps": round(total / elapsed_s, 3) if elapsed_s else 0.0,
+                "p50_ms": round(percentile(values, 50), 1),
+                "p95_ms": round(percentile(values, 95), 1),
+                "p99_ms": round(percentile(values, 99), 1),
+                "max_ms": round(values[-1], 1) if values else 0.0,
+                "error_samples": self.error_samples[ep],
+            }
+        return out
+
+
+async def send(client, kiosk_id, action, cfg, audio, results):
+    headers = {"X-Kiosk-Id": kiosk_id}
+    query = random.choice(cfg["queries"])
+    t0 = time.perf_counter()
+    try:
+        if action == "process":
+            resp = await client.post("/process", content=audio, headers=headers)
+        elif action == "process_text":
+            resp = await client.post("/process_text", json={"text": query}, headers=headers)
+        else:
+            resp = await client.post("/gesture_command", json={"command": random.choice(cfg["gestures"])},
+                                     headers=headers)
+        ms = (time.perf_counter() - t0) * 1000.0
+        resp.raise_for_status()
+        body = resp.json()
+        status = body.get("status")
+        results.add(action, ms, ok=status != "error", superseded=status == "superseded",
+                    error=None if status != "error" else json.dumps(body)[:200])
+    except (httpx.HTTPError, ValueError) as e:
+        results.add(action, (time.perf_counter() - t0) * 1000.0, ok=False, error=repr(e)[:200])
+
+
+async def kiosk(idx, client, cfg, audio, results, deadline):
+    kiosk_id = f"load-{idx}"
+    actions = list(cfg["weights"])
+    weights = [cfg["weights"][a] for a in actions]
+    inflight = set()
+    while time.monotonic() < deadline:
+        action = random.choices(actions, weights)[0]
+        task = asyncio.create_task(send(client, kiosk_id, action, cfg, audio, results))
+        inflight.add(task)
+        task.add_done_callback(inflight.discard)
+        if random.random() >= cfg["barge_in_rate"]:
+            await task
+        await asyncio.sleep(random.uniform(*cfg["think_time_s"]))
+    if inflight:
+        await asyncio.gather(*inflight)
+
+
+async def run(cfg):
+    audio = silent_wav()
+    results = Results()
+    limits = httpx.Limits(max_connections=cfg["kiosks"] * 2 + 2)
+    async with httpx.AsyncClient(base_url=cfg["base_url"], timeout=cfg["timeout_s"], limits=limits) as client:
+        try:
+            await client.post("/reset_state")
+        except httpx.HTTPError as e:
+            raise SystemExit(f"Orchestrator not reachable at {cfg['base_url']}: {e!r}")
+
+        print(f"[LOAD] {cfg['kiosks']} kiosks for {cfg['duration_s']:.0f}s against {cfg['base_url']}")
+        t0 = time.monotonic()
+        deadline = t0 + cfg["duration_s"]
+        await asyncio.gather(*(kiosk(i, client, cfg, audio, results, deadline) for i in range(cfg["kiosks"])))
+        elapsed = time.monotonic() - t0
+
+        try:
+            stages = (await client.get("/metrics")).json().get("stages", {})
+        except (httpx.HTTPError, ValueError):
+            stages = {}
+
+    return {"config": cfg, "elapsed_s": round(elapsed, 2), "endpoints": results.summary(elapsed),
+            "orchestrator_stages": stages}
+
+
+def print_report(report):
+    print(f"\n=== LOAD REPORT ({report['elapsed_s']}s, {report['config']['kiosks']} kiosks) ===")
+    print(f"{'endpoint':<16}{'req':>6}{'err':>6}{'sup':>6}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for ep, s in report["endpoints"].items():
+        print(f"{ep:<16}{s['requests']:>6}{s['errors']:>6}{s['superseded']:>6}{s['throughput_rps']:>8.2f}"
+              f"{s['p50_ms']:>9.0f}{s['p95_ms']:>9.0f}{s['p99_ms']:>9.0f}{s['max_ms']:>9.0f}")
+        for sample in s["error_samples"]:
+            print(f"    ! {sample}")
+    if report["orchestrator_stages"]:
+        print("\n--- orchestrator stages (ms) ---")
+        for stage, s in sorted(report["orchestrator_stages"].items()):
+            print(f"{stage:<32}{s['count']:>6}  p50 {s['p50_ms']:>8.0f}  p95 {s['p95_ms']:>8.0f}  p99 {s['p99_ms']:>8.0f}")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Concurrent kiosk load against the orchestrator")
+    p.add_argument("--url", dest="base_url")
+    p.add_argument("--kiosks", type=int)
+    p.add_argument("--duration", dest="duration_s", type=float)
+    p.add_argument("--barge-in", dest="barge_in_rate", type=float)
+    p.add_argument("--think", type=float, nargs=2, metavar=("MIN_S", "MAX_S"), dest="think_time_s")
+    p.add_argument("--report", dest="report_path", help="write the JSON report here ('' to skip)")
+    p.add_argument("--seed", type=int)
+    return p.parse_args()
+
+
+def main():
+    cfg = dict(CONFIG)
+    cfg.update({k: v for k, v in vars(parse_args()).items() if v is not None})
+    random.seed(cfg["seed"])
+
+    report = asyncio.run(run(cfg))
+    print_report(report)
+
+    if cfg["report_path"]:
+        os.makedirs(os.path.dirname(cfg["report_path"]) or ".", exist_ok=True)
+        with open(cfg["report_path"], "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved report to {cfg['report_path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# stand_in_services.py
+"""
+GPU-free stand-ins for the STT / RAG / LLM / TTS services.
+
+They speak the same HTTP contracts as the real services on the same ports
+(8000-8003), so main_orchestrator.py runs unchanged against them:
+
+    python stand_in_services.py              # terminal 1 (this folder)
+    python main_orchestrator.py --headless   # terminal 2 (repo root)
+    python load_generator.py --kiosks 8      # terminal 3 (this folder)
+
+Each endpoint sleeps for a lognormal latency (median_ms, sigma) and fails with
+`fail_rate` probability (HTTP 500). The LLM stand-in holds a semaphore of
+`concurrency` slots to mimic the single GPU the real Phi-2 service serializes on.
+Edit CONFIG or override with the CLI flags below.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import struct
+import wave
+from itertools import count
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+CONFIG = {
+    "host": "127.0.0.1",
+    "seed": 0,
+    "stt": {"port": 8000, "median_ms": 350.0, "sigma": 0.35, "fail_rate": 0.0},
+    "rag": {"port": 8002, "median_ms": 120.0, "sigma": 0.40, "fail_rate": 0.0},
+    "llm": {
+        "port": 8001,
+        "median_ms": 250.0,         # prefill
+        "sigma": 0.30,
+        "token_ms": 25.0,           # per streamed word
+        "fail_rate": 0.0,
+        "concurrency": 1,           # one GPU
+    },
+    "tts": {
+        "port": 8003,
+        "median_ms": 600.0,
+        "sigma": 0.30,
+        "per_char_ms": 4.0,         # longer sentences take longer
+        "fail_rate": 0.0,
+        # Orchestrator serves TTS/outputs_xtts under /audio; stand-in files go in a subfolder
+        "audio_dir": str(REPO_ROOT / "TTS" / "outputs_xtts"),
+        "audio_subdir": "standin",
+    },
+}
+
+QUERIES = [
+    "show me running shoes",
+    "what's the return policy",
+    "do you have black sneakers for women",
+    "how long does delivery take",
+    "I want something for basketball",
+    "can I pay with a gift card",
+]
+
+PRODUCT_REPLY = (
+    "Here are some great picks from our running collection. "
+    "Each one balances cushioning and responsiveness for daily miles. "
+    "Take a look at them in the 3D view!"
+)
+QNA_REPLY = "You can return unworn items within thirty days of purchase. Just bring your receipt to any PUMA store."
+
+
+def lognormal_ms(cfg: dict) -> float:
+    return cfg["median_ms"] * math.exp(random.gauss(0.0, cfg["sigma"]))
+
+
+async def simulate(cfg: dict, extra_ms: float = 0.0):
+    """Sleep for one sampled latency, then maybe fail like an overloaded service."""
+    await asyncio.sleep((lognormal_ms(cfg) + extra_ms) / 1000.0)
+    if random.random() < cfg["fail_rate"]:
+        raise HTTPException(status_code=500, detail="stand-in failure")
+
+
+def is_product_query(text: str) -> bool:
+    return any(w in text.lower() for w in ("shoe", "sneaker", "show", "basketball", "running", "want"))
+
+
+# ==========================================
+# STT
+# ==========================================
+
+def build_stt(cfg: dict) -> FastAPI:
+    app = FastAPI(title="Stand-in STT")
+
+    @app.post("/transcribe")
+    async def transcribe(request: Request):
+        body = await request.body()
+        await simulate(cfg)
+        return {"text": random.choice(QUERIES), "audio_bytes": len(body)}
+
+    return app
+
+
+# ==========================================
+# RAG
+# ==========================================
+
+def build_rag(cfg: dict) -> FastAPI:
+    app = FastAPI(title="Stand-in RAG")
+
+    @app.post("/get_context")
+    async def get_context(request: Request):
+        data = await request.json()
+        await simulate(cfg)
+        query = data.get("query", "")
+        if is_product_query(query):
+            asins = [f"B0STANDIN{i}" for i in range(1, 6)]
+            context = "\n".join(f"{i}. Stand-in running shoe {i}" for i in range(1, 6))
+            return {"context": context, "intent": "product", "trigger_carousel": True, "asins": asins}
+        return {"context": "Returns are accepted within 30 days.", "intent": "retail_qna",
+                "trigger_carousel": False, "asins": []}
+
+    @app.get("/version")
+    def version():
+        return {"version": "standin"}
+
+    return app
+
+
+# ==========================================
+# LLM
+# ==========================================
+
+def build_llm(cfg: dict) -> FastAPI:
+    app = FastAPI(title="Stand-in LLM")
+    gpu = asyncio.Semaphore(cfg["concurrency"])
+    cancelled = set()
+
+    def reply_for(data):
+        return PRODUCT_REPLY if "1." in data.get("context", "") else QNA_REPLY
+
+    @app.post("/chat")
+    async def chat(request: Request):
+        data = await request.json()
+        text = reply_for(data)
+        async with gpu:
+            await simulate(cfg, extra_ms=cfg["token_ms"] * len(text.split()))
+        return {"response": text}
+
+    @app.post("/chat_stream")
+    async def chat_stream(request: Request):
+        data = await request.json()
+        trace_id = request.headers.get("X-Trace-Id")
+        words = reply_for(data).split(" ")
+
+        async def token_stream():
+            async with gpu:
+                await simulate(cfg)
+                for i, word in enumerate(words):
+                    if trace_id in cancelled:
+                        cancelled.discard(trace_id)
+                        return
+                    await asyncio.sleep(cfg["token_ms"] / 1000.0)
+                    yield word if i == 0 else " " + word
+
+        return StreamingResponse(token_stream(), media_type="text/plain")
+
+    @app.post("/cancel")
+    async def cancel(request: Request):
+        data = await request.json()
+        if data.get("trace_id"):
+            cancelled.add(data["trace_id"])
+        return {"status": "cancelled"}
+
+    return app
+
+
+# ==========================================
+# TTS
+# ==========================================
+
+def write_silence(path: Path, seconds: float = 0.2, rate: int = 16000):
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(struct.pack("<h", 0) * int(seconds * rate))
+
+
+def build_tts(cfg: dict) -> FastAPI:
+    app = FastAPI(title="Stand-in TTS")
+    out_dir = Path(cfg["audio_dir"]) / cfg["audio_subdir"]
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ids = count()
+
+    @app.post("/generate_speech")
+    async def generate_speech(request: Request):
+        data = await request.json()
+        text = data.get("text", "")
+        if not text:
+            return {"error": "No text provided"}
+        await simulate(cfg, extra_ms=cfg["per_char_ms"] * len(text))
+        name = f"{next(ids):06d}.wav"
+        wav = out_dir / name
+        write_silence(wav)
+        wav.with_suffix(".json").write_text(json.dumps({"mouthCues": [{"start": 0.0, "end": 0.2, "value": "X"}]}))
+        return {
+            "status": "success",
+            "audio_path": str(wav),
+            "viseme_path": str(wav.with_suffix(".json")),
+            "filename": f"{cfg['audio_subdir']}/{name}",
+            "cached": False,
+        }
+
+    return app
+
+
+# ==========================================
+# MAIN
+# ==========================================
+
+def add_health(app: FastAPI, name: str) -> FastAPI:
+    @app.get("/ready")
+    def ready():
+        return {"service": name, "ready": True}
+
+    @app.get("/metrics")
+    def metrics():
+        return {"service": name, "stand_in": True, "stages": {}}
+
+    return app
+
+
+async def serve_all(config: dict):
+    builders = {"stt": build_stt, "rag": build_rag, "llm": build_llm, "tts": build_tts}
+    servers = []
+    for name, build in builders.items():
+        cfg = config[name]
+        app = add_health(build(cfg), name.upper())
+        server_cfg = uvicorn.Config(app, host=config["host"], port=cfg["port"], log_level="warning")
+        servers.append(uvicorn.Server(server_cfg))
+        print(f"[STAND-IN] {name.upper():<3} on :{cfg['port']} "
+              f"(median {cfg['median_ms']:.0f} ms, sigma {cfg['sigma']}, fail {cfg['fail_rate']:.0%})")
+    await asyncio.gather(*(s.serve() for s in servers))
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="GPU-free stand-ins for the PUMA AI services")
+    for name in ("stt", "rag", "llm", "tts"):
+        p.add_argument(f"--{name}-ms", type=float, help=f"{name.upper()} median latency (ms)")
+        p.add_argument(f"--{name}-fail", type=float, help=f"{name.upper()} failure rate (0-1)")
+    p.add_argument("--sigma", type=float, help="lognormal sigma for every service")
+    p.add_argument("--llm-concurrency", type=int, help="parallel generations the LLM stand-in allows")
+    p.add_argument("--seed", type=int)
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    config = json.loads(json.dumps(CONFIG))
+    for name in ("stt", "rag", "llm", "tts"):
+        if getattr(args, f"{name}_ms") is not None:
+            config[name]["median_ms"] = getattr(args, f"{name}_ms")
+        if getattr(args, f"{name}_fail") is not None:
+            config[name]["fail_rate"] = getattr(args, f"{name}_fail")
+        if args.sigma is not None:
+            config[name]["sigma"] = args.sigma
+    if args.llm_concurrency is not None:
+        config["llm"]["concurrency"] = args.llm_concurrency
+    random.seed(config["seed"] if args.seed is None else args.seed)
+    asyncio.run(serve_all(config))
+
+
+if __name__ == "__main__":
+    main()
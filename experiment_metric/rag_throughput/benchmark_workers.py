@@ -0,0 +1,201 @@
+# benchmark_workers.py
+"""
+RAG throughput vs. number of worker processes.
+
+For each worker count, starts RAG/serve_workers.py on its own port, waits
+for GET /ready, warms every worker up, then drives POST /get_context from
+`concurrency` closed-loop clients for `duration_s` (eval-set QnA queries +
+product queries, cycled). Reports qps and p50/p95/p99 per configuration, the
+speedup over the first row and, with micro-batching on, the average batch
+sizes a worker reached (GET /rerank_stats answers from whichever worker
+takes the call).
+
+    python benchmark_workers.py                          # 1, 2, 4 workers
+    python benchmark_workers.py --workers 1 2 4 8 --concurrency 16 --micro-batch-ms 3
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+CONFIG = {
+    "serve_script": str(REPO_ROOT / "RAG" / "serve_workers.py"),
+    "host": "127.0.0.1",
+    "base_port": 8102,               # worker count n is served on base_port + n
+    "workers": [1, 2, 4],
+    "concurrency": 8,                # closed-loop clients
+    "duration_s": 30.0,
+    "warmup_requests": 16,
+    "micro_batch_ms": 0.0,
+    "eval_path": str(REPO_ROOT / "experiment_metric" / "reranker_metric" / "retail_qna_eval_100.json"),
+    "product_queries": [
+        "show me running shoes",
+        "do you have black sneakers for women",
+        "I want something for basketball",
+        "lightweight shoes for the gym",
+        "flip flops for the beach",
+        "white leather sneakers",
+    ],
+    "ready_timeout_s": 600.0,
+    "timeout_s": 120.0,
+    "report_path": "./reports/rag_workers_throughput.json",
+}
+
+
+def percentile(sorted_values, q):
+    # nearest-rank, same as tracing.py
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def load_queries(cfg):
+    with open(cfg["eval_path"], "r", encoding="utf-8") as f:
+        qna = [row["text"] for row in json.load(f)]
+    return qna + list(cfg["product_queries"])
+
+
+def start_service(cfg, workers, port):
+    cmd = [sys.executable, cfg["serve_script"], "--workers", str(workers), "--host", cfg["host"],
+           "--port", str(port), "--micro-batch-ms", str(cfg["micro_batch_ms"])]
+    return subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+
+def stop_service(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+async def wait_ready(client, proc, timeout_s):
+    # /ready is per worker; the first 200 means at least one is up, warmup() covers the rest
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"serve_workers.py exited with code {proc.returncode}")
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(1.0)
+    raise TimeoutError(f"RAG not ready after {timeout_s:.0f}s")
+
+
+async def warmup(client, queries, n):
+    # Concurrent, so the connections spread over the workers and every one has taken a query
+    await asyncio.gather(*(client.post("/get_context", json={"query": queries[i % len(queries)]})
+                           for i in range(n)), return_exceptions=True)
+
+
+async def drive(client, queries, concurrency, duration_s):
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration_s
+
+    async def worker(idx):
+        nonlocal errors
+        i = idx
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            try:
+                resp = await client.post("/get_context", json={"query": queries[i % len(queries)]})
+                resp.raise_for_status()
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+            except httpx.HTTPError:
+                errors += 1
+            i += concurrency
+
+    t0 = time.monotonic()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return latencies, errors, time.monotonic() - t0
+
+
+async def run_one(cfg, workers, queries):
+    port = cfg["base_port"] + workers
+    proc = start_service(cfg, workers, port)
+    limits = httpx.Limits(max_connections=cfg["concurrency"] + 2)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://{cfg['host']}:{port}", timeout=cfg["timeout_s"],
+                                     limits=limits) as client:
+            t0 = time.monotonic()
+            await wait_ready(client, proc, cfg["ready_timeout_s"])
+            ready_s = time.monotonic() - t0
+            await warmup(client, queries, max(cfg["warmup_requests"], workers * 4))
+
+            print(f"[BENCH] {workers} worker(s): {cfg['concurrency']} clients for {cfg['duration_s']:.0f}s")
+            latencies, errors, elapsed = await drive(client, queries, cfg["concurrency"], cfg["duration_s"])
+            try:
+                stats = (await client.get("/rerank_stats")).json()
+            except (httpx.HTTPError, ValueError):
+                stats = {}
+    finally:
+        stop_service(proc)
+
+    latencies.sort()
+    return {
+        "workers": workers,
+        "ready_s": round(ready_s, 1),
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "qps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "micro_batch": stats.get("micro_batch"),
+    }
+
+
+def print_report(rows):
+    print(f"\n{'workers':>8}{'qps':>9}{'speedup':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>6}  micro-batch (embed / rerank avg)")
+    for r in rows:
+        mb = r["micro_batch"]
+        batches = f"{mb['embed']['avg_batch']:.2f} / {mb['rerank']['avg_batch']:.2f}" if mb else "-"
+        print(f"{r['workers']:>8}{r['qps']:>9.2f}{r['speedup']:>8.2f}x{r['p50_ms']:>9.0f}{r['p95_ms']:>9.0f}"
+              f"{r['p99_ms']:>9.0f}{r['errors']:>6}  {batches}")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="RAG /get_context throughput vs. worker processes")
+    p.add_argument("--workers", type=int, nargs="+")
+    p.add_argument("--concurrency", type=int)
+    p.add_argument("--duration", dest="duration_s", type=float)
+    p.add_argument("--micro-batch-ms", dest="micro_batch_ms", type=float)
+    p.add_argument("--base-port", dest="base_port", type=int)
+    p.add_argument("--report", dest="report_path", help="write the JSON report here ('' to skip)")
+    return p.parse_args()
+
+
+def main():
+    cfg = dict(CONFIG)
+    cfg.update({k: v for k, v in vars(parse_args()).items() if v is not None})
+    queries = load_queries(cfg)
+
+    rows = []
+    for workers in cfg["workers"]:
+        rows.append(asyncio.run(run_one(cfg, workers, queries)))
+    for r in rows:
+        r["speedup"] = round(r["qps"] / rows[0]["qps"], 2) if rows[0]["qps"] else 0.0
+    print_report(rows)
+
+    if cfg["report_path"]:
+        os.makedirs(os.path.dirname(cfg["report_path"]) or ".", exist_ok=True)
+        with open(cfg["report_path"], "w", encoding="utf-8") as f:
+            json.dump({"config": cfg, "cpu_count": os.cpu_count(), "results": rows}, f, indent=2)
+        print(f"\nSaved report to {cfg['report_path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+# rerank_budget_eval.py
+"""
+Parity check and tuning for DatabaseRouting's RRF + adaptive rerank budget.
+
+Every query goes through the production RAG path once with every fused
+candidate cross-encoded (rerank_budget=False). That full rerank is the
+reference: its top document is the "relevant" one, because the eval set
+has no gold labels. Each budget setting in the sweep (per_result x min x
+max) keeps only the head of the same fused list. Cross-encoder scores are
+per pair, so its ranking is the reference logits cut to that head. The
+report shows how much of the full-rerank answer each setting keeps:
+
+    MRR@10 / HitRate@1 / HitRate@5   of the reference top doc in the budgeted ranking
+    exact parity                     budgeted query() output == reference output
+    pairs / query                    cross-encoder work actually done
+
+The cheapest setting that clears CONFIG["parity"] overall and for every
+intent is re-run for real (CE ms) and written to RAG/rerank_budget.json.
+DatabaseRouting turns the budget on from that file (load_rerank_budget).
+If no setting passes, the file records enabled=false and every candidate
+stays reranked.
+
+Queries: retail_qna_eval_100.json (QnA) plus CONFIG["product_queries"], each
+routed by the production ClusterSemanticRouter. Run from this folder with the
+RAG service's environment:
+
+    python rerank_budget_eval.py
+    python rerank_budget_eval.py --per-result 4 --min 8 --max 30      # one setting
+    python rerank_budget_eval.py --dry-run                            # report only
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+RAG_DIR = REPO_ROOT / "RAG"
+sys.path.insert(0, str(RAG_DIR))
+
+CONFIG = {
+    "dataset": "retail_qna_eval_100.json",
+    "product_queries": [
+        "show me running shoes",
+        "do you have black sneakers for women",
+        "I want something for basketball",
+        "lightweight shoes for the gym",
+        "flip flops for the beach",
+        "kids trainers with velcro",
+        "white leather sneakers",
+        "something comfortable for walking all day",
+    ],
+    "rrf_k": 60,
+    "margin_ref": 0.5,
+    "sweep": {"per_result": [2, 3, 4, 6, 8], "min": [4, 8, 12], "max": [20, 30, 40]},
+    # Minimum agreement with the full rerank, overall and per intent
+    "parity": {"mrr_at_10": 0.99, "hit_at_1": 0.98, "exact_parity": 0.95},
+    "settings_path": str(RAG_DIR / "rerank_budget.json"),
+    "report_path": "./reports/rerank_budget_eval.json",
+}
+
+
+def load_queries(cfg):
+    with open(cfg["dataset"], "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [row["text"] for row in data] + list(cfg["product_queries"])
+
+
+def ranked(router, handle, target_db, query, embedding, budget):
+    """(candidate contents in cross-encoder order, query() output, pairs scored, CE ms)."""
+    router.rerank_budget = budget
+    docs, rrf = router._fuse(handle, query, embedding)
+    docs = docs[:router._budget(target_db, rrf)]
+    if not docs:
+        return [], [], 0, 0.0
+    t0 = time.perf_counter()
+    logits = router._rerank(query, [d["content"] for d in docs], handle["tokens"])
+    ce_ms = (time.perf_counter() - t0) * 1000.0
+    order = np.argsort(-np.asarray(logits), kind="stable")
+    return [docs[i]["content"] for i in order], router._select(target_db, docs, logits), len(docs), ce_ms
+
+
+def apply_setting(router, setting):
+    router.rerank_per_result, router.rerank_min, router.rerank_max = (
+        setting["per_result"], setting["min"], setting["max"])
+
+
+def full_reranks(router, semantic_router, queries):
+    """Per routed query: fused docs, RRF scores and the reference (full) cross-encoder logits."""
+    embeddings = router.embed_queries(queries)
+    labels, _ = semantic_router.route_batch(embeddings)
+    router.rerank_budget = False
+    out = []
+    for query, emb, target_db in zip(queries, embeddings, labels):
+        handle = router._get_handle(target_db) if target_db != "OOD" else None
+        if handle is None:
+            continue
+        docs, rrf = router._fuse(handle, query, emb)
+        if not docs:
+            continue
+        t0 = time.perf_counter()
+        logits = np.asarray(router._rerank(query, [d["content"] for d in docs], handle["tokens"]))
+        out.append({"query": query, "embedding": emb, "intent": target_db, "handle": handle,
+                    "docs": docs, "rrf": rrf, "logits": logits,
+                    "ce_ms_full": (time.perf_counter() - t0) * 1000.0})
+    return out
+
+
+def evaluate(router, refs, setting):
+    """Budgeted vs full rerank for one setting, from the reference logits (no extra CE calls)."""
+    apply_setting(router, setting)
+    router.rerank_budget = True
+    rows = []
+    for ref in refs:
+        docs, logits = ref["docs"], ref["logits"]
+        k = router._budget(ref["intent"], ref["rrf"])
+        target = docs[int(np.argmax(logits))]["content"]
+        order = np.argsort(-logits[:k], kind="stable")
+        bud_rank = [docs[i]["content"] for i in order]
+        ref_out = router._select(ref["intent"], docs, logits)
+        bud_out = router._select(ref["intent"], docs[:k], logits[:k])
+        rows.append({
+            "query": ref["query"],
+            "intent": ref["intent"],
+            "rank_of_reference_top": bud_rank.index(target) + 1 if target in bud_rank else None,
+            "exact_parity": [d["content"] for d in ref_out] == [d["content"] for d in bud_out],
+            "pairs_full": len(docs),
+            "pairs_budget": k,
+            "ce_ms_full": ref["ce_ms_full"],
+        })
+    return rows
+
+
+def time_budgeted(router, refs, setting):
+    """Real CE ms per query with the budget on (the sweep above reuses the reference logits)."""
+    apply_setting(router, setting)
+    return [ranked(router, ref["handle"], ref["intent"], ref["query"], ref["embedding"], budget=True)[3]
+            for ref in refs]
+
+
+def passes(summary, parity):
+    return all(s[metric] >= floor for s in summary.values() for metric, floor in parity.items())
+
+
+def summarize(rows):
+    def block(rs):
+        ranks = [r["rank_of_reference_top"] for r in rs]
+        return {
+            "queries": len(rs),
+            "mrr_at_10": float(np.mean([1.0 / r if r and r <= 10 else 0.0 for r in ranks])),
+            "hit_at_1": float(np.mean([bool(r) and r <= 1 for r in ranks])),
+            "hit_at_5": float(np.mean([bool(r) and r <= 5 for r in ranks])),
+            "exact_parity": float(np.mean([r["exact_parity"] for r in rs])),
+            "pairs_per_query_full": float(np.mean([r["pairs_full"] for r in rs])),
+            "pairs_per_query_budget": float(np.mean([r["pairs_budget"] for r in rs])),
+            "ce_ms_p50_full": float(np.median([r["ce_ms_full"] for r in rs])),
+        }
+
+    out = {"all": block(rows)}
+    for intent in sorted({r["intent"] for r in rows}):
+        out[intent] = block([r for r in rows if r["intent"] == intent])
+    return out
+
+
+def print_sweep(results):
+    print(f"\n{'per_res':>7} {'min':>4} {'max':>4} {'MRR@10':>7} {'Hit@1':>6} {'Hit@5':>6} {'exact':>6} "
+          f"{'pairs':>6} {'full':>6}  pass")
+    for r in results:
+        s = r["summary"]["all"]
+        print(f"{r['setting']['per_result']:>7} {r['setting']['min']:>4} {r['setting']['max']:>4} "
+              f"{s['mrr_at_10']:>7.4f} {s['hit_at_1']:>6.3f} {s['hit_at_5']:>6.3f} {s['exact_parity']:>6.1%} "
+              f"{s['pairs_per_query_budget']:>6.1f} {s['pairs_per_query_full']:>6.1f}  {'yes' if r['passes'] else '-'}")
+
+
+def print_selected(selected):
+    if selected is None:
+        print("\nNo budget setting reaches parity: rerank_budget stays off")
+        return
+    print(f"\nSelected {selected['setting']} (CE p50 ms full {selected['ce_ms_p50_full']:.1f} "
+          f"-> budget {selected['ce_ms_p50_budget']:.1f})")
+    for name, s in selected["summary"].items():
+        print(f"  [{name}] {s['queries']} queries | MRR@10 {s['mrr_at_10']:.4f} | Hit@1 {s['hit_at_1']:.4f} "
+              f"| Hit@5 {s['hit_at_5']:.4f} | exact parity {s['exact_parity']:.2%} "
+              f"| pairs/query {s['pairs_per_query_full']:.1f} -> {s['pairs_per_query_budget']:.1f}")
+
+
+def write_settings(path, cfg, selected):
+    from DatabaseRouting import EMBED_MODEL, RERANK_MODEL
+    settings = {
+        "enabled": selected is not None,
+        "models": {"embed": EMBED_MODEL, "rerank": RERANK_MODEL},
+        "rrf_k": cfg["rrf_k"],
+        "margin_ref": cfg["margin_ref"],
+        "parity": cfg["parity"],
+        "evaluated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    if selected is not None:
+        settings.update(selected["setting"])
+        settings["summary"] = selected["summary"]
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(settings, f, indent=2)
+    os.replace(tmp, path)
+    print(f"Wrote {path} (rerank budget {'on' if settings['enabled'] else 'off'})")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="RRF + rerank budget vs full rerank parity")
+    p.add_argument("--dataset")
+    p.add_argument("--rrf-k", dest="rrf_k", type=int)
+    p.add_argument("--per-result", dest="per_result", type=int, nargs="+")
+    p.add_argument("--min", type=int, nargs="+")
+    p.add_argument("--max", type=int, nargs="+")
+    p.add_argument("--margin-ref", dest="margin_ref", type=float)
+    p.add_argument("--report", dest="report_path", help="write the JSON report here ('' to skip)")
+    p.add_argument("--dry-run", action="store_true", help=f"do not write {CONFIG['settings_path']}")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    cfg = dict(CONFIG)
+    cfg.update({k: v for k, v in vars(args).items() if v is not None and k in CONFIG})
+    cfg["sweep"] = {k: getattr(args, k) or v for k, v in CONFIG["sweep"].items()}
+
+    from DatabaseRouting import DatabaseRouting
+    from ProposedRouter import ClusterSemanticRouter
+
+    router = DatabaseRouting(db_path=str(RAG_DIR / "db"), rrf_k=cfg["rrf_k"], rerank_margin_ref=cfg["margin_ref"])
+    semantic_router = ClusterSemanticRouter(anchors_path=str(RAG_DIR / "teleoracle_v2_anchors.npz"), threshold=0.6)
+
+    refs = full_reranks(router, semantic_router, load_queries(cfg))
+    results = []
+    for per_result, lo, hi in product(cfg["sweep"]["per_result"], cfg["sweep"]["min"], cfg["sweep"]["max"]):
+        if lo > hi:
+            continue
+        setting = {"per_result": per_result, "min": lo, "max": hi}
+        summary = summarize(evaluate(router, refs, setting))
+        results.append({"setting": setting, "summary": summary, "passes": passes(summary, cfg["parity"])})
+    print_sweep(results)
+
+    passing = [r for r in results if r["passes"]]
+    selected = min(passing, key=lambda r: r["summary"]["all"]["pairs_per_query_budget"]) if passing else None
+    rows = []
+    if selected is not None:
+        rows = evaluate(router, refs, selected["setting"])
+        ce_ms = time_budgeted(router, refs, selected["setting"])
+        for row, ms in zip(rows, ce_ms):
+            row["ce_ms_budget"] = ms
+        selected["ce_ms_p50_full"] = float(np.median([r["ce_ms_full"] for r in rows]))
+        selected["ce_ms_p50_budget"] = float(np.median(ce_ms))
+    print_selected(selected)
+
+    if not args.dry_run:
+        write_settings(cfg["settings_path"], cfg, selected)
+    if cfg["report_path"]:
+        os.makedirs(os.path.dirname(cfg["report_path"]) or ".", exist_ok=True)
+        with open(cfg["report_path"], "w", encoding="utf-8") as f:
+            json.dump({"config": cfg, "sweep": results, "selected": selected, "queries": rows}, f, indent=2)
+        print(f"\nSaved report to {cfg['report_path']}")
+
+
+if __name__ == "__main__":
+    main()
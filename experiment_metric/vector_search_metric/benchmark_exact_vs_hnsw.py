@@ -0,0 +1,162 @@
+# benchmark_exact_vs_hnsw.py
+"""
+Exact in-memory search (RAG/exact_index.py) vs Chroma's HNSW, by collection size.
+
+For each size, builds a synthetic collection of clustered unit vectors
+(bge-small's 384 dims by default), loads it both into a Chroma collection and
+an ExactVectorIndex snapshot (memory-mapped, as in the RAG service), then
+times top-k queries one at a time on each. Reports p50/p95 per backend,
+HNSW recall@k against the exact result, and the crossover size: the first
+size where HNSW's p50 beats the exact matmul + argpartition.
+
+Use the crossover to set DatabaseRouting(exact_search_max=...).
+
+    python benchmark_exact_vs_hnsw.py
+    python benchmark_exact_vs_hnsw.py --sizes 200 1000 10000 100000 --queries 300
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT / "RAG"))
+from exact_index import ExactVectorIndex  # noqa: E402
+
+CONFIG = {
+    "sizes": [200, 1000, 5000, 10000, 25000, 50000, 100000],
+    "dim": 384,
+    "clusters": 64,          # docs are drawn around cluster centers, like product families
+    "noise": 0.35,
+    "queries": 200,
+    "k": 50,
+    "warmup": 20,
+    "add_batch": 5000,       # Chroma add() chunk size
+    "report_path": "./reports/exact_vs_hnsw.json",
+    "seed": 0,
+}
+
+
+def percentile(sorted_values, q):
+    # nearest-rank, same as tracing.py
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(np.ceil(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def unit(x):
+    return (x / np.linalg.norm(x, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def synthetic(rng, n, cfg):
+    centers = unit(rng.normal(size=(cfg["clusters"], cfg["dim"])))
+    docs = unit(centers[rng.integers(cfg["clusters"], size=n)]
+                + cfg["noise"] * rng.normal(size=(n, cfg["dim"])) / np.sqrt(cfg["dim"]) * 8)
+    queries = unit(centers[rng.integers(cfg["clusters"], size=cfg["queries"])]
+                   + cfg["noise"] * rng.normal(size=(cfg["queries"], cfg["dim"])) / np.sqrt(cfg["dim"]) * 8)
+    return docs, queries
+
+
+def time_queries(fn, queries, warmup):
+    for q in queries[:warmup]:
+        fn(q)
+    lat = []
+    results = []
+    for q in queries:
+        t0 = time.perf_counter()
+        results.append(fn(q))
+        lat.append((time.perf_counter() - t0) * 1000.0)
+    lat.sort()
+    return {"p50_ms": percentile(lat, 50), "p95_ms": percentile(lat, 95), "mean_ms": float(np.mean(lat))}, results
+
+
+def bench_size(n, cfg, rng, work_dir, client):
+    docs, queries = synthetic(rng, n, cfg)
+    ids = [f"d{i}" for i in range(n)]
+    texts = [f"doc {i}" for i in range(n)]
+
+    t0 = time.perf_counter()
+    exact = ExactVectorIndex.build(Path(work_dir) / f"exact_{n}", docs, texts, [None] * n, space="l2")
+    exact_build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    col = client.create_collection(f"bench_{n}")
+    for s in range(0, n, cfg["add_batch"]):
+        col.add(ids=ids[s:s + cfg["add_batch"]], embeddings=docs[s:s + cfg["add_batch"]], documents=texts[s:s + cfg["add_batch"]])
+    chroma_build_s = time.perf_counter() - t0
+
+    k = cfg["k"]
+    exact_stats, exact_res = time_queries(lambda q: [d["content"] for d in exact.search(q, k)], queries, cfg["warmup"])
+    hnsw_stats, hnsw_res = time_queries(
+        lambda q: col.query(query_embeddings=[q], n_results=k, include=["documents"])["documents"][0],
+        queries, cfg["warmup"])
+    recall = float(np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(exact_res, hnsw_res)]))
+
+    client.delete_collection(f"bench_{n}")
+    return {
+        "size": n,
+        "exact": {**exact_stats, "build_s": exact_build_s},
+        "hnsw": {**hnsw_stats, "build_s": chroma_build_s, f"recall_at_{k}": recall},
+    }
+
+
+def run(cfg):
+    import chromadb
+
+    rng = np.random.default_rng(cfg["seed"])
+    work_dir = tempfile.mkdtemp(prefix="exact_vs_hnsw_")
+    client = chromadb.EphemeralClient()
+    rows = []
+    try:
+        for n in cfg["sizes"]:
+            row = bench_size(n, cfg, rng, work_dir, client)
+            rows.append(row)
+            e, h = row["exact"], row["hnsw"]
+            recall = h[f"recall_at_{cfg['k']}"]
+            print(f"n={n:>7}  exact p50 {e['p50_ms']:7.3f} ms  p95 {e['p95_ms']:7.3f} ms | "
+                  f"hnsw p50 {h['p50_ms']:7.3f} ms  p95 {h['p95_ms']:7.3f} ms  recall@{cfg['k']} {recall:.3f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    crossover = next((r["size"] for r in rows if r["hnsw"]["p50_ms"] < r["exact"]["p50_ms"]), None)
+    return {"config": cfg, "results": rows, "crossover_size": crossover}
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Exact mmap vector search vs Chroma HNSW by collection size")
+    p.add_argument("--sizes", type=int, nargs="+")
+    p.add_argument("--dim", type=int)
+    p.add_argument("--queries", type=int)
+    p.add_argument("--k", type=int)
+    p.add_argument("--report", dest="report_path", help="write the JSON report here ('' to skip)")
+    p.add_argument("--seed", type=int)
+    return p.parse_args()
+
+
+def main():
+    cfg = dict(CONFIG)
+    cfg.update({k: v for k, v in vars(parse_args()).items() if v is not None})
+
+    report = run(cfg)
+    if report["crossover_size"] is None:
+        print(f"\nExact search stayed faster up to {cfg['sizes'][-1]} vectors.")
+    else:
+        print(f"\nCrossover: HNSW is faster from ~{report['crossover_size']} vectors "
+              f"(set exact_search_max just below that).")
+
+    if cfg["report_path"]:
+        os.makedirs(os.path.dirname(cfg["report_path"]) or ".", exist_ok=True)
+        with open(cfg["report_path"], "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved report to {cfg['report_path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# query_instruction_check.py
+"""
+Before / after check for dropping the BGE query instruction.
+
+The old llama-index path encoded queries as BGE_QUERY_INSTRUCTION + query;
+DatabaseRouting.embed_query now encodes the bare query (the same vector
+ClusterSemanticRouter routes on). Each query is encoded both ways, routed
+once on the bare embedding (production), and both embeddings go through the
+same collection:
+
+    dense top-k overlap    |bare top-k & instructed top-k| / k  (exact index or HNSW)
+    dense top-1 agreement  same first vector hit
+    query() parity         identical final query() output (RRF + rerank), cache bypassed
+    routing agreement      the instructed embedding would route to the same collection
+
+Queries: retail_qna_eval_100.json (QnA) plus CONFIG["product_queries"].
+Run from this folder with the RAG service's environment:
+
+    python query_instruction_check.py
+    python query_instruction_check.py --k 20 --report ''
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+RAG_DIR = REPO_ROOT / "RAG"
+sys.path.insert(0, str(RAG_DIR))
+
+CONFIG = {
+    "eval_path": str(REPO_ROOT / "experiment_metric" / "reranker_metric" / "retail_qna_eval_100.json"),
+    "product_queries": [
+        "show me running shoes",
+        "do you have black sneakers for women",
+        "I want something for basketball",
+        "lightweight shoes for the gym",
+        "flip flops for the beach",
+        "kids trainers with velcro",
+        "white leather sneakers",
+        "something comfortable for walking all day",
+    ],
+    "k": 50,                     # same as the service's dense retrieval
+    "threshold": 0.6,            # same as RAG/main.py
+    "report_path": "./reports/query_instruction_check.json",
+}
+
+
+def load_queries(cfg):
+    with open(cfg["eval_path"], "r", encoding="utf-8") as f:
+        qna = [row["text"] for row in json.load(f)]
+    return qna + list(cfg["product_queries"])
+
+
+def dense(router, handle, query, embedding, k):
+    """Vector hits as _fuse sees them (exact index or HNSW), contents only."""
+    if handle["exact"] is not None:
+        hits = handle["exact"].search(embedding, k=k)
+    else:
+        hits = router._get_vector_results(handle["retriever"], query, embedding)[:k]
+    return [h["content"] for h in hits]
+
+
+def compare(router, semantic_router, queries, k):
+    from DatabaseRouting import BGE_QUERY_INSTRUCTION
+
+    bare = router.embed_queries(queries)
+    instructed = router.encoder.encode(queries, prompt=BGE_QUERY_INSTRUCTION, convert_to_numpy=True,
+                                       normalize_embeddings=True, show_progress_bar=False)
+    labels, _ = semantic_router.route_batch(bare)
+    labels_instructed, _ = semantic_router.route_batch(instructed)
+
+    rows = []
+    for query, emb_b, emb_i, target_db, target_i in zip(queries, bare, instructed, labels, labels_instructed):
+        handle = router._get_handle(target_db) if target_db != "OOD" else None
+        if handle is None:
+            continue
+        top_b = dense(router, handle, query, emb_b, k)
+        top_i = dense(router, handle, query, emb_i, k)
+        out_b = router.query(query, target_db, query_embedding=emb_b, use_cache=False)
+        out_i = router.query(query, target_db, query_embedding=emb_i, use_cache=False)
+        rows.append({
+            "query": query,
+            "intent": target_db,
+            "route_agrees": target_db == target_i,
+            "cosine": float(np.dot(emb_b, emb_i)),
+            "overlap_at_k": len(set(top_b) & set(top_i)) / k,
+            "top1_agrees": bool(top_b) and bool(top_i) and top_b[0] == top_i[0],
+            "query_parity": [d["content"] for d in out_b] == [d["content"] for d in out_i],
+        })
+    return rows
+
+
+def summarize(rows):
+    def block(rs):
+        return {
+            "queries": len(rs),
+            "route_agreement": float(np.mean([r["route_agrees"] for r in rs])),
+            "cosine_mean": float(np.mean([r["cosine"] for r in rs])),
+            "overlap_at_k_mean": float(np.mean([r["overlap_at_k"] for r in rs])),
+            "overlap_at_k_min": float(np.min([r["overlap_at_k"] for r in rs])),
+            "top1_agreement": float(np.mean([r["top1_agrees"] for r in rs])),
+            "query_parity": float(np.mean([r["query_parity"] for r in rs])),
+        }
+
+    out = {"all": block(rows)} if rows else {}
+    for intent in sorted({r["intent"] for r in rows}):
+        out[intent] = block([r for r in rows if r["intent"] == intent])
+    return out
+
+
+def print_summary(summary, k):
+    print(f"\n{'intent':>12}{'n':>5}{'route':>8}{'cos':>7}{f'ov@{k}':>8}{'min':>7}{'top1':>7}{'query()':>9}")
+    for name, s in summary.items():
+        print(f"{name:>12}{s['queries']:>5}{s['route_agreement']:>8.1%}{s['cosine_mean']:>7.3f}"
+              f"{s['overlap_at_k_mean']:>8.1%}{s['overlap_at_k_min']:>7.1%}{s['top1_agreement']:>7.1%}"
+              f"{s['query_parity']:>9.1%}")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Bare vs BGE-instructed query embeddings: retrieval parity")
+    p.add_argument("--eval", dest="eval_path")
+    p.add_argument("--k", type=int)
+    p.add_argument("--report", dest="report_path", help="write the JSON report here ('' to skip)")
+    return p.parse_args()
+
+
+def main():
+    cfg = dict(CONFIG)
+    cfg.update({k: v for k, v in vars(parse_args()).items() if v is not None})
+
+    from DatabaseRouting import DatabaseRouting
+    from ProposedRouter import ClusterSemanticRouter
+
+    router = DatabaseRouting(db_path=str(RAG_DIR / "db"))
+    semantic_router = ClusterSemanticRouter(anchors_path=str(RAG_DIR / "teleoracle_v2_anchors.npz"),
+                                            threshold=cfg["threshold"])
+
+    rows = compare(router, semantic_router, load_queries(cfg), cfg["k"])
+    summary = summarize(rows)
+    print_summary(summary, cfg["k"])
+
+    if cfg["report_path"]:
+        os.makedirs(os.path.dirname(cfg["report_path"]) or ".", exist_ok=True)
+        with open(cfg["report_path"], "w", encoding="utf-8") as f:
+            json.dump({"config": cfg, "summary": summary, "queries": rows}, f, indent=2)
+        print(f"\nSaved report to {cfg['report_path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,25 @@
 import subprocess
 import time
-import requests
+import asyncio
 import uvicorn
 import threading
 import os
 import sys
-from fastapi import FastAPI, Request
+import httpx
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
+from transports import build_transport
+from service_supervisor import ServiceSupervisor, kill_tree
+from speech_stream import SentenceChunker
+from state_channel import StateChannel
+from tracing import Tracer
+from pipeline_session import SessionRegistry, Superseded
+from response_cache import ResponseCache
+
 # ==========================================
 # CONFIGURATION & PATH AUTO-DETECT
 # ==========================================
@@ -46,22 +56,71 @@ PATHS = {
 }
 
 # --- AI SERVICES (Gesture Included) ---
+# "timeout" is the per-stage budget (seconds) used by the async service client.
 AI_SERVICES = {
-    "STT": {"dir": "STT", "url": "http://127.0.0.1:8000/transcribe"},
-    "LLM": {"dir": "Chatbot_Phi2", "url": "http://127.0.0.1:8001/chat"},
-    "RAG": {"dir": "RAG", "url": "http://127.0.0.1:8002/get_context"},
-    "TTS": {"dir": "TTS", "url": "http://127.0.0.1:8003/generate_speech"},
+    "STT": {"dir": "STT", "url": "http://127.0.0.1:8000/transcribe", "timeout": 30.0},
+    "LLM": {"dir": "Chatbot_Phi2", "url": "http://127.0.0.1:8001/chat", "timeout": 90.0},
+    "RAG": {"dir": "RAG", "url": "http://127.0.0.1:8002/get_context", "timeout": 15.0},
+    "TTS": {"dir": "TTS", "url": "http://127.0.0.1:8003/generate_speech", "timeout": 60.0},
     "GESTURE": {
         "dir": "Gesture_System/real-time-HGR-application", 
         "venv": "..\\venv", 
-        "url": "http://127.0.0.1:8889"
+        "url": "http://127.0.0.1:8889",
+        "ready": False,  # no HTTP API: ready once the process stays up
     } 
 }
 
+# Spoken when the LLM stage fails
+FALLBACK_TEXT = "I am having trouble thinking."
+GOODBYE_TEXT = "I hope you liked those. Let me know if you need anything else!"
+AUDIO_BASE_URL = "http://localhost:5000/audio"
+
+# Fixed sentences the TTS service keeps pre-rendered (TTS/canned_phrases.json).
+# Their filenames are memoized here so repeats skip even the TTS round trip.
+CANNED_PHRASES = {FALLBACK_TEXT, GOODBYE_TEXT}
+PHRASE_AUDIO = {}  # text -> filename under /audio
+
+# Gestures that interrupt whatever the avatar is still thinking about / saying
+BARGE_IN_GESTURES = {"grab"}
+
+# Reuse the full reply (RAG result + LLM text + audio) for repeated queries.
+# Keyed by normalized text + RAG /version, so re-ingesting Chroma invalidates it.
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE = ResponseCache(max_entries=256, ttl=600.0)
+RAG_VERSION_TTL = 5.0   # seconds between RAG /version checks
+_rag_version = {"value": None, "checked_at": 0.0}
+
+# Stream LLM tokens and synthesize sentence-by-sentence (LLM /chat_stream).
+# False = wait for the full reply and synthesize it in one TTS call.
+STREAM_LLM_TO_TTS = True
+
+# How stages are reached (see transports.py):
+#   PUMA_TRANSPORT=http       pooled keep-alive HTTP to each service process (default)
+#   PUMA_TRANSPORT=inprocess  load RAG/LLM/TTS into this process ("monolith");
+#                             PUMA_INPROCESS_SERVICES picks which (default RAG,LLM,TTS)
+TRANSPORT = os.environ.get("PUMA_TRANSPORT", "http")
+IN_PROCESS_SERVICES = tuple(
+    s.strip().upper() for s in os.environ.get("PUMA_INPROCESS_SERVICES", "RAG,LLM,TTS").split(",") if s.strip()
+)
+SERVICES = build_transport({k: v for k, v in AI_SERVICES.items() if k != "GESTURE"},
+                           mode=TRANSPORT, in_process=IN_PROCESS_SERVICES)
+
+# Per-stage latency as seen from the orchestrator; every request gets a trace id
+# that is forwarded to the services (see tracing.py)
+TRACER = Tracer("ORCHESTRATOR", verbose=True)
+
 # ==========================================
 # APP SETUP
 # ==========================================
-app = FastAPI(title="PUMA Holographic Orchestrator")
+@asynccontextmanager
+async def lifespan(app):
+    STATE_CHANNEL.bind(asyncio.get_running_loop())
+    await SERVICES.start()
+    yield
+    await SERVICES.aclose()
+
+app = FastAPI(title="PUMA Holographic Orchestrator", lifespan=lifespan)
+TRACER.install(app, skip_prefixes=("/metrics", "/poll_state", "/audio"))
 
 app.add_middleware(
     CORSMiddleware,
@@ -83,30 +142,38 @@ SYSTEM_STATE = {
     "trigger_carousel": False,
     "gesture": "talk",
     "asins": [],
+    "playlist": [],            # ordered [{audio_url, viseme_url}] speech segments
+    "playlist_complete": True, # False while more segments are still being synthesized
     "last_update_id": 0,
     "streams": {"avatar": False, "cam1": False},
-    "ai_launched": False
+    "ai_launched": False,
+    "services": {},            # name -> starting | ready | crashed (service_supervisor.py)
+    "boot_report": None,       # per-service boot-to-ready seconds, once all are ready
 }
 
+# One active pipeline per kiosk (X-Kiosk-Id header); newer turns cancel older ones
+SESSIONS = SessionRegistry()
+
+# Every SYSTEM_STATE change goes through STATE_CHANNEL.publish() so it is
+# pushed to /ws/state subscribers (see state_channel.py)
+STATE_CHANNEL = StateChannel(SYSTEM_STATE)
+
 PROCS = {
     "watchdog": None,
     "react": None,
     "node": None,
-    "ai_services": []
 }
 
+# Starts the AI services in parallel, probes /ready, restarts crashes (see service_supervisor.py)
+SUPERVISOR = None
+
 # ==========================================
 # PROCESS MANAGEMENT
 # ==========================================
 
 def kill_process_tree(proc):
-    """Forcefully kills a process and its children on Windows."""
-    if proc and proc.poll() is None:
-        try:
-            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)], 
-                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except Exception as e:
-            print(f"Error killing process: {e}")
+    """Forcefully kills a process and its children (taskkill /T on Windows, process group elsewhere)."""
+    kill_tree(proc)
 
 def validate_paths():
     """Checks if critical files exist before launching."""
@@ -176,17 +243,30 @@ def launch_ai_services():
         return
 
     print("\n[ORCHESTRATOR] All Streams Stable (Avatar + Cam1). Launching AI Services...")
-    for name, cfg in AI_SERVICES.items():
-        print(f"   > Launching {name}...")
-        venv_path = cfg.get("venv", ".\\venv")
-        # Ensure we change directory to the service folder before activating venv
-        cmd = f'cd {cfg["dir"]} && {venv_path}\\Scripts\\activate && python main.py'
-        p = subprocess.Popen(["cmd.exe", "/k", cmd], creationflags=subprocess.CREATE_NEW_CONSOLE)
-        PROCS["ai_services"].append(p)
-    
-    SYSTEM_STATE["ai_launched"] = True
-    SYSTEM_STATE["status"] = "IDLE"
-    print("[ORCHESTRATOR] All Systems Operational.\n")
+    start_supervisor()
+
+def start_supervisor():
+    """Launch every AI service at once; status flips to IDLE only when all report ready."""
+    global SUPERVISOR
+    if SUPERVISOR is not None:
+        return  # watchdog events can race the ai_launched publish
+
+    def on_change(name, state, summary):
+        STATE_CHANNEL.publish({"services": {n: s.state for n, s in SUPERVISOR.services.items()}})
+
+    def on_all_ready(report):
+        STATE_CHANNEL.publish({"status": "IDLE", "boot_report": report})
+        print("[ORCHESTRATOR] All Systems Operational.\n")
+
+    SUPERVISOR = ServiceSupervisor(
+        AI_SERVICES,
+        root=Path(__file__).resolve().parent,
+        in_process={name: (lambda n=name: SERVICES.is_ready(n)) for name in getattr(SERVICES, "in_process", ())},
+        on_change=on_change,
+        on_all_ready=on_all_ready,
+    )
+    STATE_CHANNEL.publish({"ai_launched": True})
+    SUPERVISOR.start()
 
 # ==========================================
 # WATCHDOG LISTENER THREAD
@@ -229,181 +309,406 @@ def watchdog_listener():
                 elif "[WATCHDOG_CMD] AVATAR_READY" in line:
                     if not SYSTEM_STATE["streams"]["avatar"]:
                         print("[ORCHESTRATOR] Avatar Verified (2 Tracks).")
-                        SYSTEM_STATE["streams"]["avatar"] = True
+                        STATE_CHANNEL.publish({"streams": {**SYSTEM_STATE["streams"], "avatar": True}})
                         launch_ai_services()
                 
                 elif "[WATCHDOG_STATUS] CAM1_CONNECTED" in line:
                     if not SYSTEM_STATE["streams"]["cam1"]:
                         print("[ORCHESTRATOR] Pi Camera Connected.")
-                        SYSTEM_STATE["streams"]["cam1"] = True
+                        STATE_CHANNEL.publish({"streams": {**SYSTEM_STATE["streams"], "cam1": True}})
                         launch_ai_services()
 
             except Exception:
                 continue
 
 # ==========================================
-# API ENDPOINTS
+# PIPELINE STAGES (async, non-blocking)
 # ==========================================
 
-@app.post("/process")
-async def process_voice_command(request: Request):
-    global SYSTEM_STATE
-    audio_bytes = await request.body()
-    print("\n--- [PIPELINE STARTED] ---")
-    
-    # 1. STT
+async def run_stt(audio_bytes):
+    """Returns the transcript, or None if STT failed."""
     try:
-        stt_res = requests.post(AI_SERVICES["STT"]["url"], data=audio_bytes).json()
-        user_text = stt_res.get("text", "")
-        print(f"User said: {user_text}")
-    except Exception as e:
-        print(f"STT Failed: {e}")
-        return {"status": "error"}
-
-    if not user_text: return {"status": "ok"}
-
-    # 2. RAG
+        with TRACER.span("stt"):
+            stt_res = await SERVICES.post_json("STT", content=audio_bytes)
+        return stt_res.get("text", "")
+    except (httpx.HTTPError, ValueError) as e:
+        print(f"STT Failed: {e!r}")
+        return None
+
+async def run_rag(user_text):
+    """Returns (context, trigger_carousel, asins). Falls back to N/A context."""
     print(f"Sending to RAG...")
     try:
-        rag_res = requests.post(AI_SERVICES["RAG"]["url"], json={"query": user_text}).json()
+        with TRACER.span("rag"):
+            rag_res = await SERVICES.post_json("RAG", json={"query": user_text})
         context = rag_res.get("context", "N/A")
         trigger_carousel = rag_res.get("trigger_carousel", False)
         asins = rag_res.get("asins", [])
         print(f"Context found. Carousel: {trigger_carousel}")
-    except:
-        context, trigger_carousel, asins = "N/A", False, []
-    
-    # 3. LLM
+        return context, trigger_carousel, asins
+    except (httpx.HTTPError, ValueError) as e:
+        print(f"RAG Failed: {e!r}")
+        return "N/A", False, []
+
+async def run_llm(context, user_text):
     print(f"Sending to LLM...")
     try:
-        llm_res = requests.post(AI_SERVICES["LLM"]["url"], json={"context": context, "query": user_text}).json()
-        response_text = llm_res.get("response", "")
-    except:
-        response_text = "I am having trouble thinking."
-
-    # 4. TTS
+        with TRACER.span("llm"):
+            llm_res = await SERVICES.post_json("LLM", json={"context": context, "query": user_text})
+        return llm_res.get("response", "")
+    except (httpx.HTTPError, ValueError) as e:
+        print(f"LLM Failed: {e!r}")
+        return FALLBACK_TEXT
+
+async def run_tts(text):
+    """Returns the generated wav filename (served under /audio), or None."""
+    canned = text in CANNED_PHRASES
+    if canned and text in PHRASE_AUDIO:
+        TRACER.record("tts.phrase_memo", 0.0)
+        return PHRASE_AUDIO[text]
     print(f"Sending to TTS...")
     try:
-        tts_res = requests.post(AI_SERVICES["TTS"]["url"], json={"text": response_text}).json()
+        with TRACER.span("tts"):
+            tts_res = await SERVICES.post_json("TTS", json={"text": text, "cache": canned})
         filename = tts_res.get("filename")
-        
-        if filename:
-            base = "http://localhost:5000/audio"
-            
-            # --- FIXED GESTURE LOGIC ---
-            gesture = "talk"
-            if trigger_carousel:
-                gesture = "transition"
-            elif "N/A" in str(context) or "No products found" in str(context):
-                gesture = "confused"
-
-            SYSTEM_STATE.update({
-                "status": "SPEAKING",
-                "audio_url": f"{base}/{filename}",
-                "viseme_url": f"{base}/{filename.replace('.wav', '.json')}",
-                "trigger_carousel": trigger_carousel,
-                "asins": asins,
-                "gesture": gesture,
-                "last_update_id": SYSTEM_STATE["last_update_id"] + 1
-            })
+        if canned and filename:
+            PHRASE_AUDIO[text] = filename
+        return filename
+    except (httpx.HTTPError, ValueError) as e:
+        print(f"TTS Failed: {e!r}")
+        return None
+
+def pick_gesture(context, trigger_carousel):
+    # --- FIXED GESTURE LOGIC ---
+    if trigger_carousel:
+        return "transition"
+    if "N/A" in str(context) or "No products found" in str(context):
+        return "confused"
+    return "talk"
+
+def speech_segment(filename, cache_bust=None):
+    suffix = f"?t={cache_bust}" if cache_bust is not None else ""
+    return {
+        "audio_url": f"{AUDIO_BASE_URL}/{filename}{suffix}",
+        "viseme_url": f"{AUDIO_BASE_URL}/{filename.replace('.wav', '.json')}{suffix}",
+    }
+
+async def current_rag_version():
+    """RAG collection fingerprint, re-checked at most every RAG_VERSION_TTL seconds. None if unknown."""
+    now = time.monotonic()
+    if _rag_version["value"] is not None and now - _rag_version["checked_at"] < RAG_VERSION_TTL:
+        return _rag_version["value"]
+    try:
+        version = (await SERVICES.get_json("RAG", "/version", timeout=2.0)).get("version")
+    except (httpx.HTTPError, ValueError) as e:
+        print(f"RAG Version Check Failed: {e!r}")
+        version = None
+    if version != _rag_version["value"] and _rag_version["value"] is not None:
+        print(f"RAG collections changed ({_rag_version['value']} -> {version}), clearing response cache")
+        RESPONSE_CACHE.clear()
+    _rag_version.update(value=version, checked_at=now)
+    return version
+
+def remember_response(user_text, version, context, trigger_carousel, asins, gesture, response_text, filenames):
+    """Store a finished turn unless it went through a fallback (those should be retried)."""
+    if version is None or not filenames or response_text in ("", FALLBACK_TEXT):
+        return
+    RESPONSE_CACHE.put(user_text, version, {
+        "context": context,
+        "trigger_carousel": trigger_carousel,
+        "asins": asins,
+        "gesture": gesture,
+        "text": response_text,
+        "filenames": list(filenames),
+    })
+
+def replay_cached_response(user_text, version, turn=None):
+    """Publish a cached reply straight to SPEAKING. Returns its text, or None on a miss."""
+    cached = RESPONSE_CACHE.get(user_text, version) if version is not None else None
+    if cached is None:
+        return None
+    if not all((TTS_OUTPUT_DIR / f).is_file() for f in cached["filenames"]):
+        RESPONSE_CACHE.discard(user_text, version)  # audio was cleaned up
+        return None
+    stamp = int(time.time() * 1000)
+    segments = [speech_segment(f, cache_bust=stamp) for f in cached["filenames"]]
+    publish_for_turn(turn, {
+        "status": "SPEAKING",
+        **segments[0],
+        "playlist": segments,
+        "playlist_complete": True,
+        "trigger_carousel": cached["trigger_carousel"],
+        "asins": cached["asins"],
+        "gesture": cached["gesture"],
+    }, event=True)
+    print(f"Response cache hit: {user_text!r} ({len(segments)} segment(s))")
+    return cached["text"]
+
+def publish_for_turn(turn, changes, event=False):
+    """Publish unless a newer turn has replaced this one (stale results are dropped)."""
+    if turn is not None and not turn.is_current():
+        print(f"Discarding stale result (turn {turn.generation})")
+        return False
+    STATE_CHANNEL.publish(changes, event=event)
+    return True
+
+def cancel_remote_generation(trace_id):
+    """Tell the LLM to stop decoding for a superseded turn (fire-and-forget)."""
+    async def _cancel():
+        try:
+            await SERVICES.post_json("LLM", json={"trace_id": trace_id}, path="/cancel", timeout=2.0)
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"LLM Cancel Failed: {e!r}")
+    print(f"BARGE-IN: cancelling turn {trace_id}")
+    asyncio.create_task(_cancel())
+
+async def run_pipeline(user_text, turn=None):
+    """RAG -> LLM -> TTS for one utterance, then flips SYSTEM_STATE to SPEAKING."""
+    version = await current_rag_version() if RESPONSE_CACHE_ENABLED else None
+    if version is not None:
+        with TRACER.span("response_cache.lookup"):
+            cached_text = replay_cached_response(user_text, version, turn)
+        if cached_text is not None:
+            return cached_text
+
+    if STREAM_LLM_TO_TTS:
+        with TRACER.span("pipeline"):
+            return await run_pipeline_streaming(user_text, turn, version)
+
+    t0 = time.perf_counter()
+    context, trigger_carousel, asins = await run_rag(user_text)
+    response_text = await run_llm(context, user_text)
+    filename = await run_tts(response_text)
+    TRACER.record("pipeline", (time.perf_counter() - t0) * 1000.0)
+
+    if filename:
+        gesture = pick_gesture(context, trigger_carousel)
+        remember_response(user_text, version, context, trigger_carousel, asins, gesture, response_text, [filename])
+        # Canned / phrase-cached replies reuse the same wav; the stamp makes the avatar play it again
+        segment = speech_segment(filename, cache_bust=int(time.time() * 1000))
+        if publish_for_turn(turn, {
+            "status": "SPEAKING",
+            **segment,
+            "playlist": [segment],
+            "playlist_complete": True,
+            "trigger_carousel": trigger_carousel,
+            "asins": asins,
+            "gesture": gesture,
+        }, event=True):
             print(f"Playing: {filename} (Gesture: {gesture})")
-    except Exception as e:
-        print(f"TTS Failed: {e}")
+    return response_text
+
+async def run_pipeline_streaming(user_text, turn=None, version=None):
+    """
+    RAG -> streamed LLM -> per-sentence TTS.
+
+    A producer task cuts the token stream into sentences while the consumer
+    synthesizes them in order; the avatar starts on the first segment and the
+    rest are appended to SYSTEM_STATE["playlist"] as they become ready.
+    """
+    t0 = time.perf_counter()
+    context, trigger_carousel, asins = await run_rag(user_text)
+    gesture = pick_gesture(context, trigger_carousel)
+
+    sentences = asyncio.Queue()
+    spoken = []
+    complete = {"ok": True}  # False if any sentence failed TTS -> don't cache
+
+    async def produce():
+        chunker = SentenceChunker()
+        print(f"Streaming from LLM...")
+        t_llm = time.perf_counter()
+        try:
+            try:
+                async for piece in SERVICES.stream_text("LLM", "/chat_stream", json={"context": context, "query": user_text}):
+                    spoken.append(piece)
+                    for sentence in chunker.feed(piece):
+                        await sentences.put(sentence)
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"LLM Stream Failed: {e!r}")
+                complete["ok"] = False
+            except Exception as e:
+                # e.g. the in-process LLM raising something that isn't an httpx error
+                print(f"LLM Stream Failed (unexpected): {e!r}")
+                complete["ok"] = False
+            if not complete["ok"] and not spoken:
+                spoken.append(FALLBACK_TEXT)
+                for sentence in chunker.feed(FALLBACK_TEXT):
+                    await sentences.put(sentence)
+            TRACER.record("llm_stream", (time.perf_counter() - t_llm) * 1000.0)
+            tail = chunker.flush()
+            if tail:
+                await sentences.put(tail)
+        finally:
+            # Always end the consumer's loop, whatever happened above
+            sentences.put_nowait(None)
+
+    producer = asyncio.create_task(produce())
+    segments = []
+    filenames = []
+    stamp = int(time.time() * 1000)  # see run_pipeline: phrase-cached sentences reuse their wav
+    try:
+        while (sentence := await sentences.get()) is not None:
+            filename = await run_tts(sentence)
+            if not filename:
+                complete["ok"] = False
+                continue
+            filenames.append(filename)
+            segments.append(speech_segment(filename, cache_bust=stamp))
+            if len(segments) == 1:
+                publish_for_turn(turn, {
+                    "status": "SPEAKING",
+                    **segments[0],
+                    "playlist": list(segments),
+                    "playlist_complete": False,
+                    "trigger_carousel": trigger_carousel,
+                    "asins": asins,
+                    "gesture": gesture,
+                }, event=True)
+                TRACER.record("first_audio", (time.perf_counter() - t0) * 1000.0)
+                print(f"First audio after {time.perf_counter() - t0:.2f}s: {filename} (Gesture: {gesture})")
+            else:
+                publish_for_turn(turn, {"playlist": list(segments)})
+                print(f"Queued segment {len(segments)}: {filename}")
+    finally:
+        producer.cancel()
+
+    response_text = "".join(spoken).strip()
+    if segments:
+        publish_for_turn(turn, {"playlist_complete": True})
+        if complete["ok"]:
+            remember_response(user_text, version, context, trigger_carousel, asins, gesture, response_text, filenames)
+    return response_text
+
+# ==========================================
+# API ENDPOINTS
+# ==========================================
+
+@app.post("/process")
+async def process_voice_command(request: Request):
+    audio_bytes = await request.body()
+    session = SESSIONS.get(request.headers.get("X-Kiosk-Id"))
+    print("\n--- [PIPELINE STARTED] ---")
+
+    async def voice_turn(turn):
+        # 1. STT
+        user_text = await run_stt(audio_bytes)
+        if user_text is None:
+            return {"status": "error"}
+        print(f"User said: {user_text}")
+        if not user_text: return {"status": "ok"}
+
+        # 2-4. RAG -> LLM -> TTS
+        response_text = await run_pipeline(user_text, turn)
+        return {"status": "ok", "text": response_text}
+
+    try:
+        result = await session.run(voice_turn, on_interrupt=cancel_remote_generation)
+    except Superseded:
+        print("--- [PIPELINE SUPERSEDED] ---\n")
+        return {"status": "superseded"}
 
     print("--- [PIPELINE COMPLETE] ---\n")
-    return {"status": "ok", "text": response_text}
+    return result
 
 @app.post("/process_text")
 async def process_text_command(request: Request):
-    global SYSTEM_STATE
     data = await request.json()
     user_text = data.get("text", "")
     print(f"\nUser Typed: {user_text}")
     if not user_text: return {"status": "empty"}
 
     # --- RESTORED FULL PIPELINE FOR TEXT ---
-    
-    # 1. RAG (Text)
-    print(f"Sending to RAG...")
-    try:
-        rag_res = requests.post(AI_SERVICES["RAG"]["url"], json={"query": user_text}).json()
-        context = rag_res.get("context", "N/A")
-        trigger_carousel = rag_res.get("trigger_carousel", False)
-        asins = rag_res.get("asins", [])
-        print(f"Context found. Carousel: {trigger_carousel}")
-    except:
-        context, trigger_carousel, asins = "N/A", False, []
-
-    # 2. LLM (Text)
-    print(f"Sending to LLM...")
-    try:
-        llm_res = requests.post(AI_SERVICES["LLM"]["url"], json={"context": context, "query": user_text}).json()
-        response_text = llm_res.get("response", "")
-    except:
-        response_text = "I am having trouble thinking."
-
-    # 3. TTS (Text)
-    print(f"Sending to TTS...")
+    session = SESSIONS.get(request.headers.get("X-Kiosk-Id"))
     try:
-        tts_res = requests.post(AI_SERVICES["TTS"]["url"], json={"text": response_text}).json()
-        filename = tts_res.get("filename")
-        base = "http://localhost:5000/audio"
-        
-        # --- FIXED GESTURE LOGIC (Text Mode) ---
-        gesture = "talk"
-        if trigger_carousel:
-            gesture = "transition"
-        elif "N/A" in str(context) or "No products found" in str(context):
-            gesture = "confused"
-
-        SYSTEM_STATE.update({
-            "status": "SPEAKING",
-            "audio_url": f"{base}/{filename}",
-            "viseme_url": f"{base}/{filename.replace('.wav', '.json')}",
-            "trigger_carousel": trigger_carousel,
-            "asins": asins,
-            "gesture": gesture,
-            "last_update_id": SYSTEM_STATE["last_update_id"] + 1
-        })
-        print(f"Playing: {filename} (Gesture: {gesture})")
-    except Exception as e: print(f"TTS Error: {e}")
-
+        await session.run(lambda turn: run_pipeline(user_text, turn), on_interrupt=cancel_remote_generation)
+    except Superseded:
+        return {"status": "superseded"}
     return {"status": "ok"}
 
 @app.get("/poll_state")
 def poll_state():
-    return SYSTEM_STATE
+    # "seq" lets polling clients notice non-event changes (playlist appends, resets)
+    return {**SYSTEM_STATE, "seq": STATE_CHANNEL.seq}
+
+@app.get("/services")
+def services_status():
+    """Supervisor view: per-service state, restarts and boot-to-ready times."""
+    if SUPERVISOR is None:
+        return {"launched": False, "in_process": list(getattr(SERVICES, "in_process", ()))}
+    return {"launched": True, **SUPERVISOR.report(), "in_process": list(getattr(SERVICES, "in_process", ()))}
+
+@app.get("/response_cache")
+def response_cache_stats():
+    return {**RESPONSE_CACHE.stats(), "enabled": RESPONSE_CACHE_ENABLED, "rag_version": _rag_version["value"]}
+
+@app.delete("/response_cache")
+def clear_response_cache():
+    RESPONSE_CACHE.clear()
+    return {"status": "cleared"}
+
+@app.get("/metrics/aggregate")
+async def aggregate_metrics(trace_id: str | None = None):
+    """
+    Orchestrator stages plus every service's /metrics in one view. With
+    ?trace_id=... each section also lists that turn's spans.
+    """
+    path = f"/metrics?trace_id={trace_id}" if trace_id else "/metrics"
+
+    async def fetch(name):
+        try:
+            return await SERVICES.get_json(name, path, timeout=2.0)
+        except (httpx.HTTPError, ValueError) as e:
+            return {"service": name, "error": repr(e)}
+
+    names = list(SERVICES.services)
+    results = await asyncio.gather(*(fetch(n) for n in names))
+    return {"orchestrator": TRACER.metrics(trace_id), "services": dict(zip(names, results))}
+
+@app.websocket("/ws/state")
+async def state_socket(websocket: WebSocket):
+    """
+    Push channel for the avatar. Sends a snapshot (or, with ?since=<seq>, only
+    the deltas missed while disconnected), then every delta as it happens.
+    """
+    await websocket.accept()
+    since = websocket.query_params.get("since")
+    queue, backlog = STATE_CHANNEL.subscribe(int(since) if since and since.isdigit() else None)
+    try:
+        for message in backlog:
+            await websocket.send_json(message)
+        while True:
+            await websocket.send_json(await queue.get())
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        STATE_CHANNEL.unsubscribe(queue)
 
 @app.post("/reset_state")
-def reset_state():
-    SYSTEM_STATE["status"] = "IDLE"
+async def reset_state():
+    STATE_CHANNEL.publish({"status": "IDLE"})
     return {"status": "reset"}
 
 @app.post("/generate_goodbye")
-def generate_goodbye():
+async def generate_goodbye():
     print("REACT REQUESTED GOODBYE SPEECH")
     
     if not SYSTEM_STATE["trigger_carousel"]:
         print("Ignoring duplicate goodbye request.")
         return {"status": "ignored"}
 
-    SYSTEM_STATE["trigger_carousel"] = False
+    STATE_CHANNEL.publish({"trigger_carousel": False})
     
-    try:
-        tts_res = requests.post(AI_SERVICES["TTS"]["url"], json={"text": "I hope you liked those. Let me know if you need anything else!"}).json()
-        filename = tts_res.get("filename")
-        ts = int(time.time())
-        base = "http://localhost:5000/audio"
-        
-        SYSTEM_STATE.update({
+    filename = await run_tts(GOODBYE_TEXT)
+    if filename:
+        segment = speech_segment(filename, cache_bust=int(time.time()))
+        STATE_CHANNEL.publish({
             "status": "SPEAKING",
-            "audio_url": f"{base}/{filename}?t={ts}",
-            "viseme_url": f"{base}/{filename.replace('.wav', '.json')}?t={ts}",
+            **segment,
+            "playlist": [segment],
+            "playlist_complete": True,
             "gesture": "talk",
-            "last_update_id": SYSTEM_STATE["last_update_id"] + 1
-        })
-    except Exception as e:
-        print(f"TTS Error: {e}")
+        }, event=True)
     
     return {"status": "goodbye_initiated"}
 
@@ -412,8 +717,13 @@ async def handle_gesture(request: Request):
     data = await request.json()
     cmd = data.get("command")
     print(f"GESTURE RELAY: {cmd}")
-    SYSTEM_STATE["gesture"] = cmd
-    SYSTEM_STATE["last_update_id"] += 1
+    STATE_CHANNEL.publish({"gesture": cmd}, event=True)
+    if cmd in BARGE_IN_GESTURES:
+        stale_trace = SESSIONS.get(request.headers.get("X-Kiosk-Id")).interrupt()
+        if stale_trace:
+            cancel_remote_generation(stale_trace)
+            # Close whatever part of the reply already reached the avatar
+            STATE_CHANNEL.publish({"playlist_complete": True})
     return {"status": "relayed"}
 
 # ==========================================
@@ -424,6 +734,14 @@ if __name__ == "__main__":
     print("   PUMA ORCHESTRATOR + WATCHDOG INTEGRATION       ")
     print("==================================================")
 
+    # --headless: API server only (no MediaMTX / React / AI service launch).
+    # Used with experiment_metric/orchestrator_load/ stand-ins for load tests.
+    if "--headless" in sys.argv:
+        print("Headless mode: expecting AI services to be running already.")
+        STATE_CHANNEL.publish({"ai_launched": True, "status": "IDLE"})
+        uvicorn.run(app, host="0.0.0.0", port=5000, log_level="warning")
+        sys.exit(0)
+
     # 0. Validate Paths
     validate_paths()
 
@@ -448,4 +766,4 @@ if __name__ == "__main__":
         kill_process_tree(PROCS["watchdog"])
         kill_process_tree(PROCS["react"])
         kill_process_tree(PROCS["node"])
-        for p in PROCS["ai_services"]: kill_process_tree(p)
\ No newline at end of file
+        if SUPERVISOR: SUPERVISOR.stop()
\ No newline at end of file
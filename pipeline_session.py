@@ -0,0 +1,80 @@
+"""
+Barge-in support: one active pipeline per kiosk session.
+
+Every /process or /process_text call becomes a "turn". Starting a new turn
+(or a barge-in gesture) bumps the session generation and cancels the running
+turn's asyncio task, which aborts its in-flight HTTP calls and drops any TTS
+sentences still queued. Results are only published while the turn's
+generation is still current, so a late finisher can never overwrite
+SYSTEM_STATE for a newer request.
+"""
+import asyncio
+
+from tracing import current_trace_id
+
+
+class Superseded(Exception):
+    """Raised to the caller of KioskSession.run() when a newer turn replaced theirs."""
+
+
+class Turn:
+    def __init__(self, session: "KioskSession", generation: int):
+        self.session = session
+        self.generation = generation
+
+    def is_current(self) -> bool:
+        return self.session.generation == self.generation
+
+
+class KioskSession:
+    def __init__(self, kiosk_id: str):
+        self.kiosk_id = kiosk_id
+        self.generation = 0
+        self.trace_id = None
+        self._task = None
+
+    def interrupt(self):
+        """Invalidate and cancel the running turn. Returns its trace id if one was running."""
+        self.generation += 1
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            return self.trace_id
+        return None
+
+    async def run(self, turn_factory, on_interrupt=None):
+        """
+        Run `turn_factory(turn)` as this session's only active pipeline.
+
+        on_interrupt(trace_id) is called with the trace id of a turn that was
+        cancelled to make room (e.g. to stop its LLM generation server-side).
+        """
+        stale_trace = self.interrupt()
+        if stale_trace and on_interrupt:
+            on_interrupt(stale_trace)
+
+        turn = Turn(self, self.generation)
+        self.trace_id = current_trace_id()
+        task = asyncio.create_task(turn_factory(turn))
+        self._task = task
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if task.cancelled() and not turn.is_current():
+                raise Superseded(f"turn {turn.generation} superseded on kiosk {self.kiosk_id}")
+            raise
+        finally:
+            if self._task is task:
+                self._task = None
+
+
+class SessionRegistry:
+    def __init__(self):
+        self._sessions: dict[str, KioskSession] = {}
+
+    def get(self, kiosk_id: str | None = None) -> KioskSession:
+        kiosk_id = kiosk_id or "default"
+        session = self._sessions.get(kiosk_id)
+        if session is None:
+            session = self._sessions[kiosk_id] = KioskSession(kiosk_id)
+        return session
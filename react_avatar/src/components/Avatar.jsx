@@ -10,6 +10,7 @@ const jawOpenByViseme = { viseme_sil: 0.0, viseme_PP: 0.0, viseme_FF: 0.1, visem
 export function Avatar(props) {
   const { 
     status, audioUrl, visemeUrl, gesture, resetState, 
+    playlist = [], playlistComplete = true,
     onAudioTrackReady, onSpeechEnded, 
     sequenceState, visible = true 
   } = props;
@@ -77,6 +78,12 @@ export function Avatar(props) {
   const audioRef = useRef(new Audio()); 
   const lastAudioUrlRef = useRef(null);
 
+  // Streamed speech: segments arrive one by one while earlier ones play
+  const playlistRef = useRef(playlist);
+  const playlistCompleteRef = useRef(playlistComplete);
+  const segmentIndexRef = useRef(0);
+  const waitingForSegmentRef = useRef(false);
+
   useEffect(() => {
     if (!audioContextRef.current) {
       const AudioContext = window.AudioContext || window.webkitAudioContext;
@@ -113,39 +120,75 @@ export function Avatar(props) {
   }, [sequenceState]);
 
   // --- LOGIC 2: TALKING ---
+  const finishSpeech = () => {
+    waitingForSegmentRef.current = false;
+    setAnimation("idle");
+    setLipsync(null);
+    if (onSpeechEnded) onSpeechEnded(); 
+  };
+
+  const playSegment = (segment, isFirst) => {
+    const audioEl = audioRef.current;
+    audioEl.src = segment.audio_url;
+    audioEl.crossOrigin = "anonymous";
+
+    fetch(segment.viseme_url)
+      .then(res => res.json())
+      .then(json => {
+        setLipsync(json);
+        // Only change animation if we are currently Idle (don't interrupt walk)
+        if (isFirst) {
+          if (gesture === "confused") setAnimation("confused");
+          else if (gesture === "transition") setAnimation("transition");
+          else setAnimation("talk");
+        }
+        
+        audioEl.play().catch(e => console.error("Playback failed:", e));
+      })
+      .catch(err => console.error("Viseme Fetch Error:", err)); // Added catch
+
+    audioEl.onended = () => {
+      const next = playlistRef.current[segmentIndexRef.current + 1];
+      if (next) {
+        segmentIndexRef.current += 1;
+        playSegment(next, false);
+      } else if (!playlistCompleteRef.current) {
+        waitingForSegmentRef.current = true; // next sentence still in TTS
+      } else {
+        finishSpeech();
+      }
+    };
+  };
+
   useEffect(() => {
     if (sequenceState !== "IDLE") return;
 
     if (status === "SPEAKING" && audioUrl && visemeUrl) {
       if (audioUrl === lastAudioUrlRef.current) return;
       lastAudioUrlRef.current = audioUrl; 
+      segmentIndexRef.current = 0;
+      waitingForSegmentRef.current = false;
 
       if (audioContextRef.current) audioContextRef.current.resume();
-      const audioEl = audioRef.current;
-      audioEl.src = audioUrl;
-      audioEl.crossOrigin = "anonymous";
-
-      fetch(visemeUrl)
-        .then(res => res.json())
-        .then(json => {
-          setLipsync(json);
-          // Only change animation if we are currently Idle (don't interrupt walk)
-          if (gesture === "confused") setAnimation("confused");
-          else if (gesture === "transition") setAnimation("transition");
-          else setAnimation("talk");
-          
-          audioEl.play().catch(e => console.error("Playback failed:", e));
-        })
-        .catch(err => console.error("Viseme Fetch Error:", err)); // Added catch
-
-      audioEl.onended = () => {
-        setAnimation("idle");
-        setLipsync(null);
-        if (onSpeechEnded) onSpeechEnded(); 
-      };
+      playSegment({ audio_url: audioUrl, viseme_url: visemeUrl }, true);
     }
   }, [status, audioUrl, visemeUrl, gesture, sequenceState]); 
 
+  useEffect(() => {
+    playlistRef.current = playlist;
+    playlistCompleteRef.current = playlistComplete;
+    if (!waitingForSegmentRef.current) return;
+
+    const next = playlist[segmentIndexRef.current + 1];
+    if (next) {
+      waitingForSegmentRef.current = false;
+      segmentIndexRef.current += 1;
+      playSegment(next, false);
+    } else if (playlistComplete) {
+      finishSpeech();
+    }
+  }, [playlist, playlistComplete]);
+
   // --- ANIMATION MIXER ---
   useEffect(() => {
     if (!actions || !animation || !group.current) return
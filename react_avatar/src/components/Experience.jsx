@@ -9,6 +9,7 @@ import { useSpring, animated } from '@react-spring/three';
 export const Experience = ({ onAudioTrackReady }) => {
   const { 
     status, audioUrl, visemeUrl, gesture, 
+    playlist, playlistComplete,
     asins, triggerCarousel, resetState,
     updateId, triggerGoodbye 
   } = useOrchestrator();
@@ -125,6 +126,8 @@ export const Experience = ({ onAudioTrackReady }) => {
           status={status}
           audioUrl={audioUrl}
           visemeUrl={visemeUrl}
+          playlist={playlist}
+          playlistComplete={playlistComplete}
           gesture={gesture}
           sequenceState={getAvatarState()} 
           visible={isAvatarVisible}
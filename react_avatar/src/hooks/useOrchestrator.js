@@ -10,37 +10,90 @@ export function useOrchestrator() {
     triggerCarousel: false,
     asins: [],
     gesture: "talk",
+    playlist: [],
+    playlistComplete: true,
     updateId: 0
   });
 
-  const lastUpdateIdRef = useRef(0);
+  // Server state mirror + the channel sequence number we have applied
+  const serverStateRef = useRef({});
+  const lastSeqRef = useRef(-1);
 
   useEffect(() => {
+    let socket = null;
+    let pollTimer = null;
+    let retryTimer = null;
+    let retryDelay = 250;
+    let closed = false;
+
+    const publish = (data) => {
+      setState({
+        status: data.status,
+        audioUrl: data.audio_url,
+        visemeUrl: data.viseme_url,
+        triggerCarousel: data.trigger_carousel,
+        asins: data.asins || [],
+        gesture: data.gesture || "talk",
+        playlist: data.playlist || [],
+        playlistComplete: data.playlist_complete ?? true,
+        updateId: data.last_update_id 
+      });
+    };
+
+    // --- FALLBACK: polling while the push channel is down ---
     const poll = async () => {
       try {
         const res = await fetch(`${ORCHESTRATOR_URL}/poll_state`);
         const data = await res.json();
 
-        if (data.last_update_id !== lastUpdateIdRef.current) {
-          lastUpdateIdRef.current = data.last_update_id;
-          
-          setState({
-            status: data.status,
-            audioUrl: data.audio_url,
-            visemeUrl: data.viseme_url,
-            triggerCarousel: data.trigger_carousel,
-            asins: data.asins || [],
-            gesture: data.gesture || "talk",
-            updateId: data.last_update_id 
-          });
+        if (data.seq !== lastSeqRef.current) {
+          lastSeqRef.current = data.seq;
+          serverStateRef.current = data;
+          publish(data);
         }
       } catch (err) {
         // console.warn("Orchestrator offline?", err);
       }
     };
+    const startPolling = () => { if (!pollTimer) pollTimer = setInterval(poll, 50); };
+    const stopPolling = () => { clearInterval(pollTimer); pollTimer = null; };
+
+    // --- PUSH CHANNEL: snapshot + versioned deltas ---
+    const connect = () => {
+      const since = lastSeqRef.current >= 0 ? `?since=${lastSeqRef.current}` : "";
+      socket = new WebSocket(`${ORCHESTRATOR_URL.replace(/^http/, "ws")}/ws/state${since}`);
+
+      socket.onopen = () => { retryDelay = 250; stopPolling(); };
+
+      socket.onmessage = (event) => {
+        const msg = JSON.parse(event.data);
+        if (msg.type === "snapshot") {
+          serverStateRef.current = msg.state;
+        } else if (msg.type === "delta") {
+          if (msg.seq <= lastSeqRef.current) return; // already applied (e.g. via snapshot)
+          serverStateRef.current = { ...serverStateRef.current, ...msg.changes };
+        } else {
+          return;
+        }
+        lastSeqRef.current = msg.seq;
+        publish(serverStateRef.current);
+      };
+
+      socket.onclose = () => {
+        if (closed) return;
+        startPolling();
+        retryTimer = setTimeout(connect, retryDelay);
+        retryDelay = Math.min(retryDelay * 2, 5000);
+      };
+    };
 
-    const interval = setInterval(poll, 50); 
-    return () => clearInterval(interval);
+    connect();
+    return () => {
+      closed = true;
+      stopPolling();
+      clearTimeout(retryTimer);
+      if (socket) socket.close();
+    };
   }, []);
 
   const resetState = async () => {
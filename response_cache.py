@@ -0,0 +1,64 @@
+"""
+Full-response cache for repeated shopper queries ("show me running shoes").
+
+Maps (normalized query text, RAG collection version) to everything a turn
+produced: RAG context/carousel/asins, the LLM reply and the spoken segment
+filenames. A hit lets the orchestrator go straight to SPEAKING without
+touching the LLM or TTS. Entries expire after `ttl` seconds and the least
+recently used one is evicted once `max_entries` is reached; the RAG version in
+the key means a re-ingested Chroma collection never serves old answers.
+"""
+import re
+import time
+from collections import OrderedDict
+
+_PUNCT = re.compile(r"[^\w\s']+")
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, drop punctuation, collapse whitespace ("Show me  running shoes!" -> "show me running shoes")."""
+    return re.sub(r"\s+", " ", _PUNCT.sub(" ", (text or "").lower())).strip()
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 256, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()  # key -> (stored_at, value)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, version: str) -> tuple:
+        return normalize_query(query), version
+
+    def get(self, query: str, version: str):
+        key = self.key(query, version)
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, query: str, version: str, value: dict):
+        key = self.key(query, version)
+        if not key[0]:
+            return
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, query: str, version: str):
+        self._entries.pop(self.key(query, version), None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "max_entries": self.max_entries, "ttl_s": self.ttl}
@@ -0,0 +1,99 @@
+"""
+Async client layer for the orchestrator -> AI service hops (STT, RAG, LLM, TTS).
+
+Each service gets its own pooled keep-alive httpx.AsyncClient with a per-stage
+timeout, so a slow Phi-2 turn only parks one coroutine instead of freezing the
+whole uvicorn event loop (/poll_state, /gesture_command keep being served).
+"""
+from urllib.parse import urlsplit
+
+import httpx
+
+from tracing import trace_headers
+
+
+class ServiceClient:
+    def __init__(self, services: dict, max_connections: int = 4, connect_timeout: float = 2.0,
+                 default_timeout: float = 30.0, keepalive_expiry: float = 60.0):
+        """
+        services: the orchestrator's AI_SERVICES dict. Each entry needs a "url"
+                  (the stage endpoint) and may set "timeout" (seconds).
+        """
+        self.services = services
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.default_timeout = default_timeout
+        self.keepalive_expiry = keepalive_expiry
+        self._clients: dict[str, httpx.AsyncClient] = {}
+
+    # ---------- lifecycle ----------
+
+    def _client(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            cfg = self.services[name]
+            parts = urlsplit(cfg["url"])
+            client = httpx.AsyncClient(
+                base_url=f"{parts.scheme}://{parts.netloc}",
+                timeout=httpx.Timeout(cfg.get("timeout", self.default_timeout), connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+            )
+            self._clients[name] = client
+        return client
+
+    async def start(self, names=None):
+        """Open the pools up front so the first shopper query doesn't pay for it."""
+        for name in (names or self.services):
+            self._client(name)
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+    # ---------- requests ----------
+
+    def _path(self, name: str, path: str | None) -> str:
+        if path is not None:
+            return path
+        return urlsplit(self.services[name]["url"]).path or "/"
+
+    async def post_json(self, name: str, json=None, content: bytes | None = None,
+                        path: str | None = None, timeout: float | None = None) -> dict:
+        """POST to a service stage and return the decoded JSON body.
+
+        The current trace id (tracing.py) is forwarded as X-Trace-Id.
+
+        Raises httpx.HTTPError (incl. httpx.TimeoutException) on transport
+        failures or non-2xx responses; callers decide the fallback.
+        """
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=self.connect_timeout)
+        resp = await self._client(name).post(self._path(name, path), json=json, content=content,
+                                             headers=trace_headers(), **kwargs)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def get_json(self, name: str, path: str, timeout: float | None = None) -> dict:
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=self.connect_timeout)
+        resp = await self._client(name).get(path, headers=trace_headers(), **kwargs)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def stream_text(self, name: str, path: str, json=None, timeout: float | None = None):
+        """POST and yield the response body as decoded text fragments as they arrive."""
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=self.connect_timeout)
+        async with self._client(name).stream("POST", path, json=json, headers=trace_headers(), **kwargs) as resp:
+            resp.raise_for_status()
+            async for piece in resp.aiter_text():
+                if piece:
+                    yield piece
@@ -0,0 +1,242 @@
+"""
+Cross-platform supervisor for the AI service processes (STT, LLM, RAG, TTS, Gesture).
+
+Replaces `cmd.exe /k ... activate && python main.py` + taskkill:
+
+  * every service is started at once with its own venv interpreter
+    (<dir>/<venv>/Scripts/python.exe on Windows, <dir>/<venv>/bin/python elsewhere)
+  * readiness = GET /ready answering 200 (services without an HTTP API, i.e.
+    Gesture, count as ready once they have stayed up for `grace_s`)
+  * a crashed process is restarted with exponential backoff; the backoff
+    resets after the service has been ready for `stable_s`
+  * boot-to-ready time is recorded per service and for the whole set
+
+The orchestrator gets callbacks (on_change / on_all_ready) and flips
+SYSTEM_STATE["status"] to IDLE only once everything is warm.
+"""
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import httpx
+
+IS_WINDOWS = os.name == "nt"
+
+STARTING, READY, CRASHED, STOPPED = "starting", "ready", "crashed", "stopped"
+
+
+def venv_python(service_dir: Path, venv: str) -> Path:
+    venv_dir = (service_dir / venv.replace("\\", "/")).resolve()
+    return venv_dir / ("Scripts/python.exe" if IS_WINDOWS else "bin/python")
+
+
+def kill_tree(proc, grace_s: float = 5.0):
+    """Terminate a process and its children (process group / taskkill /T)."""
+    if proc is None or proc.poll() is not None:
+        return
+    try:
+        if IS_WINDOWS:
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=grace_s)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, OSError) as e:
+        print(f"[SUPERVISOR] Error killing process {proc.pid}: {e}")
+
+
+class ManagedService:
+    def __init__(self, name: str, cfg: dict, root: Path, check=None):
+        self.name = name
+        self.check = check  # in-process service: no process, ready when check() is True
+        self.dir = (root / cfg["dir"]).resolve()
+        self.venv = cfg.get("venv", "venv")
+        parts = urlsplit(cfg.get("url", ""))
+        # Only real HTTP services get a probe; Gesture's url is the MediaMTX stream
+        self.ready_url = f"{parts.scheme}://{parts.netloc}/ready" if cfg.get("ready", True) and parts.netloc else None
+        self.proc = None
+        self.state = STOPPED
+        self.restarts = 0
+        self.backoff_s = 0.0
+        self.started_at = None      # monotonic, current process
+        self.ready_at = None
+        self.next_start_at = 0.0
+        self.boot_to_ready_s = None  # supervisor start -> first ready
+        self.last_exit_code = None
+
+    def python(self) -> str:
+        exe = venv_python(self.dir, self.venv)
+        if not exe.exists():
+            print(f"[SUPERVISOR] {self.name}: no venv interpreter at {exe}, using {sys.executable}")
+            return sys.executable
+        return str(exe)
+
+    def spawn(self):
+        if self.check is not None:
+            self.state = STARTING
+            self.started_at = time.monotonic()
+            return
+        kwargs = {}
+        if IS_WINDOWS:
+            # Own console per service (as before) and its own group for taskkill /T
+            kwargs["creationflags"] = subprocess.CREATE_NEW_CONSOLE | subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True  # own process group for killpg
+        self.proc = subprocess.Popen([self.python(), "main.py"], cwd=str(self.dir), **kwargs)
+        self.state = STARTING
+        self.started_at = time.monotonic()
+        self.ready_at = None
+
+    def summary(self) -> dict:
+        return {
+            "state": self.state,
+            "pid": self.proc.pid if self.proc and self.proc.poll() is None else None,
+            "restarts": self.restarts,
+            "boot_to_ready_s": round(self.boot_to_ready_s, 2) if self.boot_to_ready_s is not None else None,
+            "last_exit_code": self.last_exit_code,
+        }
+
+
+class ServiceSupervisor:
+    def __init__(self, services: dict, root: Path, skip=(), in_process=None, on_change=None, on_all_ready=None,
+                 poll_interval: float = 1.0, probe_timeout: float = 1.0, grace_s: float = 5.0,
+                 min_backoff_s: float = 1.0, max_backoff_s: float = 60.0, stable_s: float = 60.0):
+        """
+        services:     AI_SERVICES-style dict ({"dir", "venv", "url"}; "ready": False disables the probe)
+        skip:         names not to launch at all
+        in_process:   {name: fn() -> bool} for stages loaded into the orchestrator;
+                      not launched, but still waited for before "all ready"
+        on_change:    fn(name, state, summary) on every state transition
+        on_all_ready: fn(report) the first time every service is ready
+        """
+        self.root = Path(root)
+        in_process = in_process or {}
+        self.services = {n: ManagedService(n, cfg, self.root, check=in_process.get(n))
+                         for n, cfg in services.items() if n not in skip}
+        self.on_change = on_change
+        self.on_all_ready = on_all_ready
+        self.poll_interval = poll_interval
+        self.probe_timeout = probe_timeout
+        self.grace_s = grace_s
+        self.min_backoff_s = min_backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.stable_s = stable_s
+        self.boot_started_at = None
+        self.all_ready_s = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        """Spawn every service in parallel and start the monitor thread."""
+        self.boot_started_at = time.monotonic()
+        for svc in self.services.values():
+            print(f"[SUPERVISOR] Starting {svc.name} ({svc.dir})...")
+            self._spawn(svc)
+        self._thread = threading.Thread(target=self._monitor, name="service-supervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for svc in self.services.values():
+            kill_tree(svc.proc)
+            svc.state = STOPPED
+
+    def all_ready(self) -> bool:
+        return all(s.state == READY for s in self.services.values())
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "all_ready": self.all_ready(),
+                "boot_to_ready_s": round(self.all_ready_s, 2) if self.all_ready_s is not None else None,
+                "services": {n: s.summary() for n, s in self.services.items()},
+            }
+
+    # ---------- internals ----------
+
+    def _spawn(self, svc: ManagedService):
+        try:
+            svc.spawn()
+        except OSError as e:
+            print(f"[SUPERVISOR] {svc.name} failed to start: {e}")
+            self._schedule_restart(svc, None)
+            return
+        self._set_state(svc, STARTING)
+
+    def _set_state(self, svc: ManagedService, state: str):
+        changed = svc.state != state
+        svc.state = state
+        if self.on_change and (changed or state == STARTING):
+            self.on_change(svc.name, state, svc.summary())
+
+    def _schedule_restart(self, svc: ManagedService, exit_code):
+        svc.last_exit_code = exit_code
+        svc.backoff_s = min(self.max_backoff_s, max(self.min_backoff_s, svc.backoff_s * 2))
+        svc.next_start_at = time.monotonic() + svc.backoff_s
+        print(f"[SUPERVISOR] {svc.name} exited (code {exit_code}); restarting in {svc.backoff_s:.0f}s")
+        self._set_state(svc, CRASHED)
+
+    def _probe(self, client: httpx.Client, svc: ManagedService) -> bool:
+        if svc.ready_url is None:
+            return time.monotonic() - svc.started_at >= self.grace_s
+        try:
+            return client.get(svc.ready_url, timeout=self.probe_timeout).status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    def _monitor(self):
+        with httpx.Client() as client:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                for svc in self.services.values():
+                    if svc.state == CRASHED:
+                        if now >= svc.next_start_at:
+                            svc.restarts += 1
+                            print(f"[SUPERVISOR] Restarting {svc.name} (attempt {svc.restarts})...")
+                            self._spawn(svc)
+                        continue
+                    if svc.check is not None:
+                        if svc.state == STARTING and svc.check():
+                            svc.ready_at = now
+                            svc.boot_to_ready_s = now - self.boot_started_at
+                            print(f"[SUPERVISOR] {svc.name} (in-process) ready after {svc.boot_to_ready_s:.1f}s")
+                            self._set_state(svc, READY)
+                        continue
+                    code = svc.proc.poll() if svc.proc else None
+                    if code is not None:
+                        with self._lock:
+                            self._schedule_restart(svc, code)
+                        continue
+                    if svc.state == STARTING and self._probe(client, svc):
+                        svc.ready_at = now
+                        took = now - svc.started_at
+                        if svc.boot_to_ready_s is None:
+                            svc.boot_to_ready_s = now - self.boot_started_at  # includes crash restarts
+                        print(f"[SUPERVISOR] {svc.name} ready after {took:.1f}s")
+                        with self._lock:
+                            self._set_state(svc, READY)
+                    elif svc.state == READY and svc.backoff_s and now - svc.ready_at >= self.stable_s:
+                        svc.backoff_s = 0.0
+
+                if self.all_ready_s is None and self.all_ready():
+                    self.all_ready_s = time.monotonic() - self.boot_started_at
+                    self._print_boot_report()
+                    if self.on_all_ready:
+                        self.on_all_ready(self.report())
+                self._stop.wait(self.poll_interval)
+
+    def _print_boot_report(self):
+        print(f"\n[SUPERVISOR] All services ready in {self.all_ready_s:.1f}s")
+        for name, svc in sorted(self.services.items(), key=lambda kv: kv[1].boot_to_ready_s or 0):
+            print(f"   {name:<8} {svc.boot_to_ready_s:6.1f}s  (restarts: {svc.restarts})")
@@ -0,0 +1,43 @@
+"""
+Sentence chunking for the streamed LLM -> TTS handoff.
+
+The LLM streams arbitrary text fragments; TTS wants whole sentences. The
+chunker buffers fragments and releases a sentence as soon as its terminator
+(. ! ? or a newline) is followed by whitespace, so the first sentence can be
+synthesized while Phi-2 is still decoding the rest of the reply.
+"""
+import re
+
+# Terminator followed by whitespace (so "16.24€" or "v1.5" don't split)
+_BOUNDARY = re.compile(r"([.!?]+[\"')\]]*)\s+|\n+")
+
+
+class SentenceChunker:
+    def __init__(self, min_chars: int = 12):
+        """
+        min_chars: sentences shorter than this ("Hi!", "Sure.") are merged into
+                   the next one - a tiny wav costs nearly a full TTS round trip.
+        """
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> list[str]:
+        """Add a streamed fragment; return the sentences it completed."""
+        self._buffer += text
+        sentences = []
+        start = 0
+        cut = 0
+        for m in _BOUNDARY.finditer(self._buffer):
+            end = m.end(1) if m.group(1) else m.start()
+            candidate = self._buffer[start:end].strip()
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = m.end()
+                cut = start
+        self._buffer = self._buffer[cut:]
+        return sentences
+
+    def flush(self) -> str:
+        """Return whatever is left once the stream has ended."""
+        tail, self._buffer = self._buffer.strip(), ""
+        return tail
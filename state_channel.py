@@ -0,0 +1,97 @@
+"""
+Push channel for SYSTEM_STATE (replaces /poll_state polling on the avatar side).
+
+Every change to the shared state goes through StateChannel.publish(), which
+applies it, stamps it with a monotonically increasing `seq` and fans the delta
+out to every connected WebSocket. A short history of deltas is kept so a client
+that reconnects with ?since=<seq> only receives what it missed; if it fell too
+far behind it gets a full snapshot instead.
+
+`seq` versions *every* change (status resets, stream flags, ...). The existing
+`last_update_id` keeps its meaning for the frontend: it only moves for events
+the avatar must react to (new speech, gesture relays), and is bumped through
+publish(..., event=True).
+"""
+import asyncio
+import copy
+import threading
+from collections import deque
+
+
+class StateChannel:
+    def __init__(self, state: dict, history: int = 512, max_pending: int = 1024):
+        self.state = state
+        self.seq = 0
+        self.max_pending = max_pending
+        self._history = deque(maxlen=history)
+        self._subscribers: set[asyncio.Queue] = set()
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def bind(self, loop):
+        """Remember the server loop so threads (watchdog) can publish too."""
+        self._loop = loop
+
+    # ---------- publishing ----------
+
+    def publish(self, changes: dict, event: bool = False):
+        """
+        Apply `changes` to the state and push them. Returns the new seq.
+
+        Calls from other threads are hopped onto the server loop so deltas
+        always go out in seq order (returns None in that case).
+        """
+        if self._loop is not None and not self._loop.is_closed() and not self._on_loop():
+            self._loop.call_soon_threadsafe(self.publish, changes, event)
+            return None
+
+        with self._lock:
+            changes = dict(changes)
+            if event:
+                changes["last_update_id"] = self.state["last_update_id"] + 1
+            self.state.update(changes)
+            self.seq += 1
+            message = {"type": "delta", "seq": self.seq, "changes": copy.deepcopy(changes)}
+            self._history.append(message)
+            subscribers = list(self._subscribers)
+
+        for queue in subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Client too slow to keep up: replace its backlog with a snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.snapshot())
+        return message["seq"]
+
+    def _on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    # ---------- subscribing ----------
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"type": "snapshot", "seq": self.seq, "state": copy.deepcopy(self.state)}
+
+    def subscribe(self, since: int | None = None) -> tuple[asyncio.Queue, list[dict]]:
+        """
+        Register a subscriber. Returns (queue, backlog) where backlog is either
+        the deltas after `since` or a single snapshot message.
+        """
+        queue = asyncio.Queue(maxsize=self.max_pending)
+        with self._lock:
+            self._subscribers.add(queue)
+            oldest = self._history[0]["seq"] if self._history else self.seq + 1
+            if since is not None and since <= self.seq and since + 1 >= oldest:
+                backlog = [m for m in self._history if m["seq"] > since]
+            else:
+                backlog = [{"type": "snapshot", "seq": self.seq, "state": copy.deepcopy(self.state)}]
+        return queue, backlog
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers.discard(queue)
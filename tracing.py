@@ -0,0 +1,145 @@
+"""
+Request tracing + per-stage latency stats shared by the orchestrator and the AI services.
+
+The orchestrator mints a trace id per shopper turn and sends it as the
+X-Trace-Id header; each service picks it up in middleware, records spans for
+its internal stages and exposes p50/p95/p99 per stage on GET /metrics.
+
+Stdlib only, so it runs in every service venv. There is one copy, here at
+the repo root: each service's main.py appends the root to sys.path.
+"""
+import contextvars
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+TRACE_HEADER = "X-Trace-Id"
+
+_current_trace = contextvars.ContextVar("trace_id", default=None)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id():
+    return _current_trace.get()
+
+
+def set_trace_id(trace_id):
+    """Bind a trace id to the current context (asyncio task / thread). Returns a reset token."""
+    return _current_trace.set(trace_id)
+
+
+def trace_headers() -> dict:
+    trace_id = current_trace_id()
+    return {TRACE_HEADER: trace_id} if trace_id else {}
+
+
+def _percentile(sorted_values, q):
+    # nearest-rank
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class StageStats:
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)  # rolling window of ms for percentiles
+        self.count = 0
+        self.total_ms = 0.0
+
+    def add(self, ms: float):
+        self.samples.append(ms)
+        self.count += 1
+        self.total_ms += ms
+
+    def summary(self) -> dict:
+        values = sorted(self.samples)
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(_percentile(values, 50), 3),
+            "p95_ms": round(_percentile(values, 95), 3),
+            "p99_ms": round(_percentile(values, 99), 3),
+            "max_ms": round(values[-1], 3) if values else 0.0,
+        }
+
+
+class Tracer:
+    def __init__(self, service: str, window: int = 1024, recent: int = 512, verbose: bool = False):
+        """
+        service: name reported in /metrics ("STT", "RAG", ...)
+        window:  samples kept per stage for the percentiles
+        recent:  last N spans kept with their trace ids, for per-turn lookups
+        verbose: print every span as it closes
+        """
+        self.service = service
+        self.window = window
+        self.verbose = verbose
+        self._stages: dict[str, StageStats] = {}
+        self._recent = deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    # ---------- recording ----------
+
+    def record(self, stage: str, ms: float, trace_id=None):
+        trace_id = trace_id or current_trace_id()
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = StageStats(self.window)
+            stats.add(ms)
+            self._recent.append({"trace_id": trace_id, "stage": stage, "ms": round(ms, 3), "ts": time.time()})
+        if self.verbose:
+            print(f"[TRACE {trace_id or '-'}] {self.service}.{stage}: {ms:.1f} ms")
+
+    @contextmanager
+    def span(self, stage: str, trace_id=None):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - t0) * 1000.0, trace_id=trace_id)
+
+    # ---------- reporting ----------
+
+    def metrics(self, trace_id=None) -> dict:
+        with self._lock:
+            stages = {name: stats.summary() for name, stats in self._stages.items()}
+            spans = [s for s in self._recent if trace_id and s["trace_id"] == trace_id]
+        out = {"service": self.service, "window": self.window, "stages": stages}
+        if trace_id:
+            out["trace"] = {"trace_id": trace_id, "spans": spans}
+        return out
+
+    # ---------- FastAPI wiring ----------
+
+    def install(self, app, skip_prefixes=("/metrics",)):
+        """
+        Add trace-id middleware (one "request:<path>" span per call) and GET /metrics.
+        Paths starting with one of `skip_prefixes` still get a trace id but no span.
+        """
+        tracer = self
+
+        @app.middleware("http")
+        async def _trace_middleware(request, call_next):
+            trace_id = request.headers.get(TRACE_HEADER) or new_trace_id()
+            token = set_trace_id(trace_id)
+            t0 = time.perf_counter()
+            try:
+                response = await call_next(request)
+            finally:
+                if not request.url.path.startswith(skip_prefixes):
+                    tracer.record(f"request:{request.url.path}", (time.perf_counter() - t0) * 1000.0, trace_id)
+                _current_trace.reset(token)
+            response.headers[TRACE_HEADER] = trace_id
+            return response
+
+        @app.get("/metrics")
+        def _metrics(trace_id: str | None = None):
+            return tracer.metrics(trace_id)
@@ -0,0 +1,276 @@
+"""
+Pluggable transports for the orchestrator's stage calls.
+
+    http       every stage is a separate service process reached over HTTP
+               (service_client.ServiceClient, the default)
+    inprocess  "monolith" mode: RAG, LLM and TTS are imported into the
+               orchestrator process and called directly (DatabaseRouting /
+               ClusterSemanticRouter, the Phi-2 generator, XTTSEngine), so no
+               JSON encoding or loopback hop. Any other stage (STT) still uses HTTP.
+
+Both expose the same post_json / get_json / stream_text interface and raise
+httpx.HTTPError subclasses on failure, so run_stt/run_rag/run_llm/run_tts in
+main_orchestrator.py don't know which one they are talking to.
+
+In-process mode needs one interpreter with every loaded service's
+dependencies installed (normally each service has its own venv).
+"""
+import asyncio
+import importlib.util
+import sys
+import threading
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+from service_client import ServiceClient
+from tracing import current_trace_id
+
+HttpTransport = ServiceClient
+
+REPO_ROOT = Path(__file__).resolve().parent
+
+
+class InProcessError(httpx.HTTPError):
+    """A directly-called service failed (same role as a 5xx / timeout over HTTP)."""
+
+
+def load_service_module(service_dir: Path, alias: str):
+    """Import <service_dir>/main.py under a unique module name (every service has a main.py)."""
+    if alias in sys.modules:
+        return sys.modules[alias]
+    if str(service_dir) not in sys.path:
+        sys.path.insert(0, str(service_dir))  # for the service's sibling imports
+    spec = importlib.util.spec_from_file_location(alias, service_dir / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[alias] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException as e:  # services sys.exit(1) on boot failure
+        del sys.modules[alias]
+        raise RuntimeError(f"failed to load {service_dir.name}/main.py: {e!r}") from e
+    return module
+
+
+def _split(path: str) -> tuple[str, str | None]:
+    parts = urlsplit(path)
+    return parts.path, parse_qs(parts.query).get("trace_id", [None])[0]
+
+
+# ==========================================
+# SERVICE ADAPTERS
+# ==========================================
+
+class _Adapter:
+    """Maps one service's HTTP routes onto direct calls into its loaded module."""
+
+    name = ""
+
+    def __init__(self, module):
+        self.m = module
+
+    def ready(self) -> bool:
+        # Services that warm up after loading (RAG) expose a READY event; the rest are ready once imported
+        event = getattr(self.m, "READY", None)
+        return event is None or event.is_set()
+
+    async def post(self, path: str, json: dict) -> dict:
+        raise InProcessError(f"{self.name}: no in-process route for POST {path}")
+
+    def stream(self, path: str, json: dict):
+        raise InProcessError(f"{self.name}: no in-process stream for {path}")
+
+    async def get(self, path: str) -> dict:
+        route, trace_id = _split(path)
+        if route == "/metrics":
+            return self.m.TRACER.metrics(trace_id)
+        raise InProcessError(f"{self.name}: no in-process route for GET {path}")
+
+
+class RagAdapter(_Adapter):
+    name = "RAG"
+
+    async def post(self, path, json):
+        if path == "/get_context":
+            request = self.m.RAGRequest(**json)
+            return await asyncio.to_thread(self.m.get_context, request)
+        if path == "/get_context_batch":
+            request = self.m.RAGBatchRequest(**json)
+            return await asyncio.to_thread(self.m.get_context_batch, request)
+        return await super().post(path, json)
+
+    async def get(self, path):
+        route = _split(path)[0]
+        if route == "/version":
+            return await asyncio.to_thread(self.m.get_version)
+        if route == "/startup":
+            return self.m.startup_report()
+        return await super().get(path)
+
+
+class LlmAdapter(_Adapter):
+    name = "LLM"
+
+    async def post(self, path, json):
+        if path == "/chat":
+            return await self.m.generate_reply(json.get("context", "N/A"), json.get("query", ""), current_trace_id())
+        if path == "/cancel":
+            return {"status": "cancelled" if self.m.cancel_by_trace(json.get("trace_id")) else "not_found"}
+        return await super().post(path, json)
+
+    def stream(self, path, json):
+        if path == "/chat_stream":
+            return self.m.stream_reply(json.get("context", "N/A"), json.get("query", ""), current_trace_id())
+        return super().stream(path, json)
+
+    def on_timeout(self):
+        self.m.cancel_by_trace(current_trace_id())
+
+
+class TtsAdapter(_Adapter):
+    name = "TTS"
+
+    def __init__(self, module):
+        super().__init__(module)
+        # Over HTTP the (async, blocking) endpoint ran one synthesis at a time; keep that
+        self._lock = threading.Lock()
+
+    def _speak(self, text, cache):
+        with self._lock:
+            return self.m.speech_files(text, cache=cache)
+
+    async def post(self, path, json):
+        if path == "/generate_speech":
+            text = json.get("text", "")
+            if not text:
+                return {"error": "No text provided"}
+            return await asyncio.to_thread(self._speak, text, bool(json.get("cache")))
+        return await super().post(path, json)
+
+
+ADAPTERS = {"RAG": RagAdapter, "LLM": LlmAdapter, "TTS": TtsAdapter}
+
+
+# ==========================================
+# TRANSPORT
+# ==========================================
+
+class InProcessTransport:
+    def __init__(self, services: dict, in_process=("RAG", "LLM", "TTS"), root: Path = REPO_ROOT, **http_kwargs):
+        """
+        services:   the orchestrator's AI_SERVICES dict (uses "dir", "url", "timeout")
+        in_process: stages to load into this process; the rest go through HTTP
+        """
+        unknown = set(in_process) - set(ADAPTERS)
+        if unknown:
+            raise ValueError(f"no in-process adapter for: {sorted(unknown)}")
+        self.services = services
+        self.in_process = tuple(n for n in in_process if n in services)
+        self.root = Path(root)
+        self.http = ServiceClient(services, **http_kwargs)
+        self._adapters: dict[str, _Adapter] = {}
+        self._loading = None
+
+    # ---------- lifecycle ----------
+
+    def _load_all(self):
+        # One at a time: model loads compete for the same GPU memory
+        for name in self.in_process:
+            service_dir = (self.root / self.services[name]["dir"]).resolve()
+            print(f"[MONOLITH] Loading {name} from {service_dir} ...")
+            module = load_service_module(service_dir, f"puma_{name.lower()}_service")
+            self._adapters[name] = ADAPTERS[name](module)
+            print(f"[MONOLITH] {name} ready.")
+
+    async def start(self, names=None):
+        """Open HTTP pools and start loading the in-process engines in the background."""
+        await self.http.start([n for n in (names or self.services) if n not in self.in_process])
+        if self._loading is None:
+            self._loading = asyncio.create_task(asyncio.to_thread(self._load_all))
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    def is_ready(self, name: str) -> bool:
+        adapter = self._adapters.get(name)
+        return adapter is not None and adapter.ready()
+
+    async def _adapter(self, name: str) -> _Adapter:
+        if name not in self._adapters:
+            if self._loading is None:
+                await self.start()
+            try:
+                await asyncio.shield(self._loading)
+            except Exception as e:
+                raise InProcessError(f"{name}: in-process load failed: {e!r}") from e
+        return self._adapters[name]
+
+    def _timeout(self, name: str, timeout: float | None) -> float:
+        return timeout if timeout is not None else self.services[name].get("timeout", self.http.default_timeout)
+
+    # ---------- requests (same signatures as ServiceClient) ----------
+
+    async def post_json(self, name: str, json=None, content: bytes | None = None,
+                        path: str | None = None, timeout: float | None = None) -> dict:
+        if name not in self.in_process:
+            return await self.http.post_json(name, json=json, content=content, path=path, timeout=timeout)
+        adapter = await self._adapter(name)
+        route = self.http._path(name, path)
+        try:
+            with adapter.m.TRACER.span(f"request:{route}"):
+                return await asyncio.wait_for(adapter.post(route, json or {}), self._timeout(name, timeout))
+        except InProcessError:
+            raise
+        except asyncio.TimeoutError as e:
+            if hasattr(adapter, "on_timeout"):
+                adapter.on_timeout()
+            raise InProcessError(f"{name} {route}: timed out") from e
+        except Exception as e:
+            raise InProcessError(f"{name} {route}: {e!r}") from e
+
+    async def get_json(self, name: str, path: str, timeout: float | None = None) -> dict:
+        if name not in self.in_process:
+            return await self.http.get_json(name, path, timeout=timeout)
+        adapter = await self._adapter(name)
+        try:
+            return await asyncio.wait_for(adapter.get(path), self._timeout(name, timeout))
+        except InProcessError:
+            raise
+        except Exception as e:
+            raise InProcessError(f"{name} {path}: {e!r}") from e
+
+    async def stream_text(self, name: str, path: str, json=None, timeout: float | None = None):
+        if name not in self.in_process:
+            async for piece in self.http.stream_text(name, path, json=json, timeout=timeout):
+                yield piece
+            return
+        adapter = await self._adapter(name)
+        stream = adapter.stream(path, json or {})
+        # Per piece, like httpx's read timeout on the HTTP path
+        limit = self._timeout(name, timeout)
+        try:
+            while True:
+                try:
+                    piece = await asyncio.wait_for(stream.__anext__(), limit)
+                except StopAsyncIteration:
+                    return
+                if piece:
+                    yield piece
+        except asyncio.TimeoutError as e:
+            if hasattr(adapter, "on_timeout"):
+                adapter.on_timeout()
+            raise InProcessError(f"{name} {path}: no data for {limit:g}s") from e
+        except Exception as e:
+            raise InProcessError(f"{name} {path}: {e!r}") from e
+        finally:
+            await stream.aclose()  # early exit (barge-in) stops generation
+
+
+def build_transport(services: dict, mode: str = "http", in_process=("RAG", "LLM", "TTS")):
+    """mode: "http" (separate service processes) or "inprocess" (monolith)."""
+    if mode == "http":
+        return HttpTransport(services)
+    if mode == "inprocess":
+        return InProcessTransport(services, in_process=in_process)
+    raise ValueError(f"unknown transport {mode!r} (expected 'http' or 'inprocess')")